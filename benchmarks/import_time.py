@@ -0,0 +1,56 @@
+"""
+Import-time regression benchmark: compares the cold-start cost of importing :mod:`mlexp.nbutils`
+with the cost of importing numpy alone, each measured in a fresh interpreter.
+
+    python benchmarks/import_time.py --repeat 10 --max-overhead 0.05
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMER = "import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)"
+
+def time_import(module, repeat):
+    """ Times importing a module in `repeat` fresh interpreters
+
+    Arguments:
+        module {str} -- module to import
+        repeat {int} -- number of interpreters
+
+    Returns:
+        numpy array -- seconds per import
+    """
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    times = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', TIMER % module], env=env)
+        times.append(float(output.decode().strip().splitlines()[-1]))
+    return np.array(times)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help="fresh interpreters per module")
+    parser.add_argument('--max-overhead', type=float, default=0.05,
+                        help="seconds mlexp.nbutils may add on top of numpy before the run fails")
+    args = parser.parse_args(argv)
+
+    baseline = np.median(time_import('numpy', args.repeat))
+    nbutils = np.median(time_import('mlexp.nbutils', args.repeat))
+    print("numpy\t%0.4f s" % baseline)
+    print("mlexp.nbutils\t%0.4f s" % nbutils)
+    print("overhead\t%0.4f s" % (nbutils - baseline))
+
+    if nbutils - baseline > args.max_overhead:
+        print("REGRESSION: importing mlexp.nbutils costs %0.4f s more than numpy (limit %0.4f s)"
+              % (nbutils - baseline, args.max_overhead))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Performance benchmark suite: times and measures the peak memory of the metric functions,
+`get_metrics`, `plot_roc`, `plot_confusion_matrix` and `grid_search_optimization` on synthetic
+`make_classification` data, and compares the results with a stored baseline.
+
+    python benchmarks/suite.py --save-baseline baseline.json              # record a baseline
+    python benchmarks/suite.py --baseline baseline.json --threshold 0.2   # fail on >20% regressions
+    python benchmarks/suite.py --rows 1e3 1e5 1e7 --classes 2 10 50 --cases metrics get_metrics
+
+The default grid stops at 1e5 rows; pass --rows up to 1e7 for the full sweep (which needs a few GB
+of memory). Time is the median over --repeat runs, memory the tracemalloc peak of one extra run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mlexp import nbutils
+
+# models are fit on at most this many rows, outside of the timed code
+MAX_FIT_ROWS = 10000
+
+# grid searches refit the pipeline for every candidate and fold, so they stop at this many rows
+MAX_SEARCH_ROWS = 10**5
+
+def make_data(n_rows, n_classes, random_state=0):
+    """ Makes a synthetic classification problem with few features, so large row counts fit in memory
+
+    Arguments:
+        n_rows {int} -- number of samples
+        n_classes {int} -- number of classes
+
+    Keyword Arguments:
+        random_state {int} -- seed (default: {0})
+
+    Returns:
+        tuple -- (X, y)
+    """
+
+    from sklearn.datasets import make_classification
+
+    X, y = make_classification(n_samples=n_rows, n_features=10, n_informative=8, n_redundant=0,
+                               n_classes=n_classes, n_clusters_per_class=1, random_state=random_state)
+    return X.astype(np.float32), y
+
+def _fit_model(X, y):
+    from sklearn.linear_model import LogisticRegression
+
+    return LogisticRegression(max_iter=200).fit(X[:MAX_FIT_ROWS], y[:MAX_FIT_ROWS])
+
+def _scoring_list(n_classes):
+    from sklearn.metrics import accuracy_score, make_scorer
+
+    scoring_list = {'accuracy': make_scorer(accuracy_score)}
+    if n_classes == 2:
+        for metric in (nbutils.specificity, nbutils.negative_predictive_value, nbutils.weighted_accuracy,
+                       nbutils.weighted_ppv, nbutils.weighted_npv):
+            scoring_list[metric.__name__] = make_scorer(metric)
+    return scoring_list
+
+def setup_metrics(X, y, n_classes):
+    model = _fit_model(X, y)
+    y_pred = model.predict(X)
+    if n_classes == 2:
+        metrics = [nbutils.specificity, nbutils.negative_predictive_value, nbutils.weighted_accuracy,
+                   nbutils.weighted_sensitivity, nbutils.weighted_specificity, nbutils.weighted_ppv, nbutils.weighted_npv]
+        return lambda: [metric(y, y_pred) for metric in metrics]
+    return lambda: nbutils.multiclass_scores(y, y_pred, average='macro')
+
+def setup_get_metrics(X, y, n_classes):
+    model = _fit_model(X, y)
+    scoring_list = _scoring_list(n_classes)
+    return lambda: nbutils.get_metrics(model, X, y, scoring_list)
+
+def setup_plot_roc(X, y, n_classes):
+    model = _fit_model(X, y)
+
+    def run():
+        nbutils.plot_roc(model, X, y, verbose=True, show_plot=True)
+        nbutils._pyplot().close('all')
+    return run
+
+def setup_plot_confusion_matrix(X, y, n_classes):
+    cm = nbutils.get_confusion_matrix(y, _fit_model(X, y).predict(X))
+
+    def run():
+        nbutils.plot_confusion_matrix(cm, classes=list(range(n_classes)), show_plot=True, print_matrix=True)
+        nbutils._pyplot().close('all')
+    return run
+
+def setup_grid_search_optimization(X, y, n_classes):
+    from imblearn.pipeline import Pipeline
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    pipeline = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression(max_iter=200))])
+    parameters_to_tune = {'classifier__C': [0.01, 0.1, 1.0, 10.0]}
+    return lambda: nbutils.grid_search_optimization(pipeline, parameters_to_tune, X, y, X, y, cv=3, n_jobs=1,
+                                                    verbose=True)
+
+# name -> (setup(X, y, n_classes) -> run(), whether a (rows, classes) pair applies)
+CASES = {
+    'metrics': (setup_metrics, lambda n_rows, n_classes: True),
+    'get_metrics': (setup_get_metrics, lambda n_rows, n_classes: True),
+    'plot_roc': (setup_plot_roc, lambda n_rows, n_classes: n_classes == 2),
+    'plot_confusion_matrix': (setup_plot_confusion_matrix, lambda n_rows, n_classes: True),
+    'grid_search_optimization': (setup_grid_search_optimization, lambda n_rows, n_classes: n_rows <= MAX_SEARCH_ROWS),
+}
+
+def measure(run, repeat):
+    """ Times a benchmark and measures its peak memory, discarding everything it prints
+
+    Arguments:
+        run {callable} -- benchmark body
+        repeat {int} -- number of timed runs
+
+    Returns:
+        dict -- 'time' (median seconds) and 'memory' (peak traced bytes)
+    """
+
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            run()
+            memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'time': float(np.median(times)), 'memory': int(memory)}
+
+def run_suite(cases, rows, classes, repeat):
+    """ Runs every applicable (case, rows, classes) benchmark
+
+    Returns:
+        dict -- '<case>/rows=<n>/classes=<k>' -> measurement
+    """
+
+    results = {}
+    for n_rows in rows:
+        for n_classes in classes:
+            data = None
+            for case in cases:
+                setup, applies = CASES[case]
+                if not applies(n_rows, n_classes):
+                    continue
+                if data is None:
+                    data = make_data(n_rows, n_classes)
+                key = '%s/rows=%d/classes=%d' % (case, n_rows, n_classes)
+                results[key] = measure(setup(*data, n_classes=n_classes), repeat)
+                print("%s\t%0.4f s\t%0.1f MB" % (key, results[key]['time'], results[key]['memory'] / 2.0**20))
+                sys.stdout.flush()
+    return results
+
+def compare(results, baseline, threshold):
+    """ Lists the benchmarks that got slower or use more memory than the baseline by more than `threshold`
+
+    Arguments:
+        results {dict} -- measurements of this run
+        baseline {dict} -- stored measurements
+        threshold {float} -- allowed relative increase, e.g. 0.2 for 20%
+
+    Returns:
+        list(str) -- one message per regression
+    """
+
+    regressions = []
+    for key in sorted(set(results) & set(baseline)):
+        for measurement in ('time', 'memory'):
+            before, after = baseline[key][measurement], results[key][measurement]
+            if before > 0 and after > before * (1 + threshold):
+                regressions.append("%s %s: %0.4g -> %0.4g (+%0.0f%%)"
+                                   % (key, measurement, before, after, 100.0 * (after / before - 1)))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=sorted(CASES), help="benchmarks to run")
+    parser.add_argument('--rows', nargs='+', type=float, default=[1e3, 1e4, 1e5], help="row counts, up to 1e7")
+    parser.add_argument('--classes', nargs='+', type=int, default=[2, 10, 50], help="class counts")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument('--baseline', help="JSON baseline to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative slowdown or memory increase over the baseline that fails the run")
+    parser.add_argument('--save-baseline', help="write this run's measurements to a JSON baseline")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.cases, [int(n_rows) for n_rows in args.rows], args.classes, args.repeat)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION: %s" % regression)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
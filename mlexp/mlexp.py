@@ -1,3 +1,25 @@
+"""
+The :mod:`mlexp.mlexp` module implements the `mlexp` command: a local scoring server for a fitted
+pipeline (e.g. one returned by `grid_search_optimization` and saved with `joblib.dump`).
+
+    mlexp model.joblib --port 8000 --max-batch-size 256 --max-latency 5
+    curl -d '{"instances": [[1.0, 2.0]]}' localhost:8000/predict_proba
+
+Concurrent requests are coalesced into micro-batches, so the model is called once per batch
+instead of once per request.
+"""
+import argparse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import queue
+import socketserver
+import sys
+import threading
+import time
+
+import numpy as np
+
 def mirror(name):
     """
     Print the reverse of a name.
@@ -7,4 +29,313 @@ def mirror(name):
         None
     """
 
-    print(name[::-1])
\ No newline at end of file
+    print(name[::-1])
+
+class _Request(object):
+    """ One caller's rows waiting in a :class:`MicroBatcher` """
+
+    def __init__(self, method, rows):
+        self.method = method
+        self.rows = rows
+        self.arrival = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def _concatenate(rows):
+    if any(hasattr(part, 'iloc') for part in rows):
+        import pandas as pd
+        return pd.concat(rows, ignore_index=True)
+    return np.concatenate(rows)
+
+class MicroBatcher(object):
+    """
+    Coalesces concurrent prediction requests into batches that a background thread passes to the
+    model in one call. A batch is closed when it holds `max_batch_size` rows or its first request
+    has waited `max_latency` seconds, whichever comes first.
+    Args:
+        model (sklearn estimator): fitted estimator or pipeline
+        max_batch_size (int): rows per batch before it is scored right away
+        max_latency (float): seconds the first request of a batch waits for others
+        window (int): number of recent requests the latency percentiles are taken over
+    """
+
+    methods = ('predict', 'predict_proba')
+
+    def __init__(self, model, max_batch_size=256, max_latency=0.005, window=10000):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.n_requests = self.n_rows = self.n_batches = 0
+        self._thread = threading.Thread(target=self._run, name='mlexp-batcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, method, rows):
+        """
+        Scores rows as part of the next batch, blocking until they are scored.
+        Args:
+            method (str): 'predict' or 'predict_proba'
+            rows (array-like or DataFrame): one row per instance
+        Returns:
+            numpy array: the model's output for the rows
+        """
+
+        if method not in self.methods:
+            raise ValueError("Unknown method %r. Use 'predict' or 'predict_proba'" % method)
+        request = _Request(method, self.check_rows(rows))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def check_rows(self, rows):
+        """
+        Rejects rows that can't be stacked with other requests' before they join a batch.
+        Args:
+            rows (array-like or DataFrame): one row per instance
+        Returns:
+            numpy array or DataFrame: the rows
+        Raises:
+            ValueError: if the rows aren't 2D or don't have as many features as the model
+        """
+
+        rows = rows if hasattr(rows, 'iloc') else np.asarray(rows)
+        if rows.ndim != 2:
+            raise ValueError("Expected a 2D array of rows, got %d dimensions" % rows.ndim)
+        n_features = getattr(self.model, 'n_features_in_', None)
+        if n_features is not None and rows.shape[1] != n_features:
+            raise ValueError("Expected %d features per row, got %d" % (n_features, rows.shape[1]))
+        return rows
+
+    def _collect(self):
+        """ Blocks for a first request, then gathers others until the batch is full or its deadline passes """
+
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch, n_rows = [first], len(first.rows)
+        deadline = first.arrival + self.max_latency
+        while n_rows < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+            n_rows += len(request.rows)
+        return batch
+
+    def _predict(self, method, requests):
+        """ Scores requests in one model call. If the call fails, every request is retried on its own,
+        so a bad request only fails itself and not the others it was batched with """
+
+        try:
+            output = getattr(self.model, method)(_concatenate([request.rows for request in requests]))
+        except Exception as error:
+            if len(requests) == 1:
+                requests[0].error = error
+            else:
+                for request in requests:
+                    self._predict(method, [request])
+            return
+        start = 0
+        for request in requests:
+            request.result = output[start:start + len(request.rows)]
+            start += len(request.rows)
+
+    def _score(self, batch):
+        for method in self.methods:
+            requests = [request for request in batch if request.method == method]
+            if requests:
+                self._predict(method, requests)
+
+        finished = time.perf_counter()
+        with self._lock:
+            self.n_batches += 1
+            self.n_requests += len(batch)
+            self.n_rows += sum(len(request.rows) for request in batch)
+            self._latencies.extend(finished - request.arrival for request in batch)
+        for request in batch:
+            request.done.set()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._score(batch)
+
+    def stats(self):
+        """
+        Summarizes the traffic so far.
+        Returns:
+            dict: request, row and batch counts, mean batch size, throughput in rows per second and
+            the p50/p90/p99 request latency in milliseconds
+        """
+
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            n_requests, n_rows, n_batches = self.n_requests, self.n_rows, self.n_batches
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) else (np.nan,) * 3
+        return {
+            'requests': n_requests,
+            'rows': n_rows,
+            'batches': n_batches,
+            'mean_batch_size': n_rows / float(n_batches) if n_batches else 0.0,
+            'throughput': n_rows / (time.perf_counter() - self._started),
+            'latency_p50_ms': float(p50),
+            'latency_p90_ms': float(p90),
+            'latency_p99_ms': float(p99),
+        }
+
+    def close(self):
+        """ Stops the background thread once the queued requests are scored """
+
+        self._queue.put(None)
+        self._thread.join()
+
+def _parse_instances(body):
+    instances = json.loads(body.decode('utf-8'))['instances']
+    if instances and isinstance(instances[0], dict):
+        import pandas as pd
+        return pd.DataFrame(instances)
+    return np.asarray(instances)
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+class _ScoringHandler(BaseHTTPRequestHandler):
+    """ POST /predict and /predict_proba with {"instances": [...]}, GET /stats and /health """
+
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, default=_json_value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            self._reply(200, self.server.batcher.stats())
+        else:
+            self._reply(404, {'error': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        method = self.path.strip('/')
+        if method not in MicroBatcher.methods:
+            self._reply(404, {'error': 'unknown path %s' % self.path})
+            return
+        try:
+            instances = _parse_instances(body)
+        except (ValueError, KeyError, TypeError) as error:
+            self._reply(400, {'error': 'expected a JSON object with "instances": %s' % error})
+            return
+        try:
+            instances = self.server.batcher.check_rows(instances)
+        except ValueError as error:
+            self._reply(400, {'error': str(error)})
+            return
+        # anything that fails from here on failed inside the model
+        try:
+            output = self.server.batcher.submit(method, instances)
+        except Exception as error:
+            self._reply(500, {'error': str(error)})
+            return
+        self._reply(200, {'predictions': np.asarray(output).tolist()})
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class _TCPScoringServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixScoringServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+def make_server(model, host='127.0.0.1', port=8000, unix_socket=None, max_batch_size=256, max_latency=0.005,
+                verbose=False):
+    """
+    Creates a scoring server for a fitted model. Call `serve_forever()` on it to serve, and
+    `shutdown()`, `server_close()` and `batcher.close()` to stop.
+    Args:
+        model (sklearn estimator): fitted estimator or pipeline
+        host (str): interface to listen on
+        port (int): TCP port, 0 for any free one (see `server_address`)
+        unix_socket (str): path of a Unix socket to listen on instead of TCP
+        max_batch_size (int): see :class:`MicroBatcher`
+        max_latency (float): see :class:`MicroBatcher`
+        verbose (bool): log every request to stderr
+    Returns:
+        socketserver server: the server, with its :class:`MicroBatcher` as `batcher`
+    """
+
+    if unix_socket is not None:
+        server = _UnixScoringServer(unix_socket, _ScoringHandler)
+    else:
+        server = _TCPScoringServer((host, port), _ScoringHandler)
+    server.batcher = MicroBatcher(model, max_batch_size=max_batch_size, max_latency=max_latency)
+    server.verbose = verbose
+    return server
+
+def main(argv=None):
+    """
+    Entry point of the `mlexp` command: serves a model saved with `joblib.dump`.
+    Args:
+        argv (list(str)): command line arguments (default: sys.argv)
+    Returns:
+        int: exit status
+    """
+
+    parser = argparse.ArgumentParser(prog='mlexp', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', help="fitted pipeline saved with joblib.dump")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on")
+    parser.add_argument('--port', type=int, default=8000, help="TCP port to listen on")
+    parser.add_argument('--unix-socket', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--max-batch-size', type=int, default=256, help="rows per micro-batch")
+    parser.add_argument('--max-latency', type=float, default=5.0,
+                        help="milliseconds a request waits for others to join its batch")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    import joblib
+    model = joblib.load(args.model)
+    server = make_server(model, host=args.host, port=args.port, unix_socket=args.unix_socket,
+                         max_batch_size=args.max_batch_size, max_latency=args.max_latency / 1000.0,
+                         verbose=args.verbose)
+    print("Serving %s on %s" % (args.model, args.unix_socket or 'http://%s:%d' % server.server_address[:2]))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,17 +2,36 @@
 The :mod:`mlexp.nbutils` module implements severals methods that are used for machine
 learning experiments in jupyter notebooks.
 """
-import itertools
+from collections import OrderedDict
+import contextlib
+import hashlib
 import os
+import sys
+import tempfile
 
-from sklearn.model_selection import GridSearchCV
-from sklearn.metrics import accuracy_score, confusion_matrix, make_scorer, roc_curve, classification_report
 import numpy as np
-import matplotlib as mpl
-if os.environ.get('DISPLAY','') == '':
-   print('no display found. Using non-interactive Agg backend')
-   mpl.use('Agg')
-import matplotlib.pyplot as plt
+
+from mlexp import profiling
+
+# matplotlib and sklearn's model selection are imported on first use, so that importing this module
+# for its metrics costs little more than importing numpy
+
+def _pyplot():
+    """ Imports pyplot, using the non-interactive Agg backend if there is no display and pyplot
+    hasn't been set up already (e.g. by a notebook) """
+
+    import matplotlib
+    if os.environ.get('DISPLAY','') == '' and 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+# largest label range that is encoded with bincount rather than a sort
+_MAX_BINCOUNT_SPAN = 1 << 16
+
+# cells (rows x features) of the buffer of permuted copies of X that each permutation_importance
+# worker predicts at once, about 80 MB of float64
+_PERMUTATION_BUFFER_CELLS = 10**7
 
 def group_classes(data, grouping):
     """ Wrapper for backwards compatibility. See :func:`<nbutils.reassign_classes>`"""
@@ -20,20 +39,348 @@ def group_classes(data, grouping):
 
 def reassign_classes(data, grouping, group_col):
         """
-        Returns a subset of the data with new class labels
+        Returns a subset of the data with new class labels. Only the group column is read and
+        rewritten; the other columns are never scanned
         ----------
-        data : DataFrame
+        data : DataFrame, or an iterable of DataFrame chunks (e.g. `pd.read_csv(..., chunksize=n)`)
         grouping : dict, keys = classes to keep, values = new labels of classes
+        group_col : str, name of the column with the class labels
         Returns
         -------
-        data_subset : DataFrame
+        data_subset : DataFrame, or a generator of DataFrame chunks for chunked data
             subset of data, where only rows with class labels that are keys in grouping 
             are kept and whose new class labels are the corresponding values in grouping
         """
-        classes_to_keep = grouping.keys()
-        data_to_keep = data.loc[data[group_col].isin(classes_to_keep)]
-        classes_to_change = {k:grouping[k] for k in classes_to_keep if k!= grouping[k]}
-        return data_to_keep.replace(classes_to_change)
+        if not hasattr(data, 'columns'):
+            return (_reassign_frame_classes(chunk, grouping, group_col) for chunk in data)
+        return _reassign_frame_classes(data, grouping, group_col)
+
+def _reassign_frame_classes(data, grouping, group_col):
+    """ See :func:`reassign_classes`. Maps the group column to positions in the grouping (-1 for
+    classes to drop) with a single hash lookup, and uses those codes both to filter the rows and to
+    look up the new labels """
+
+    import pandas as pd
+
+    codes = pd.Index(list(grouping)).get_indexer(data[group_col])
+    keep = codes >= 0
+    new_labels = pd.Index(list(grouping.values())).take(codes[keep])
+    if keep.all():
+        # without copy-on-write, setting a column of a shallow copy writes into the caller's frame
+        data_to_keep = data.copy(deep=not _copy_on_write())
+    else:
+        # .loc already copied the rows; the shallow copy only detaches it from data, so setting the
+        # group column doesn't warn about writing to a copy
+        data_to_keep = data.loc[keep].copy(deep=False)
+    data_to_keep[group_col] = np.asarray(new_labels)
+    return data_to_keep
+
+def _copy_on_write():
+    """ Whether pandas copies shared column data on write (always from pandas 3, opt-in before) """
+
+    import pandas as pd
+
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (AttributeError, KeyError):
+        return False
+
+def _encode_labels(y_true, y_pred):
+    """ Integer-encodes true and predicted labels against the sorted union of both
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred {array-like} -- predicted classes
+    
+    Returns:
+        labels {numpy array} -- sorted unique labels
+        true_codes {numpy array} -- index into labels of each true class
+        pred_codes {numpy array} -- index into labels of each predicted class
+    """
+
+    y_true, y_pred = np.asarray(y_true).ravel(), np.asarray(y_pred).ravel()
+    if y_true.shape[0] != y_pred.shape[0]:
+        raise ValueError("Found input variables with inconsistent numbers of samples: [%d, %d]"
+                         % (y_true.shape[0], y_pred.shape[0]))
+
+    if y_true.size and y_true.dtype.kind in 'biu' and y_pred.dtype.kind in 'biu':
+        low = int(min(y_true.min(), y_pred.min()))
+        high = int(max(y_true.max(), y_pred.max()))
+        if high - low < _MAX_BINCOUNT_SPAN and high <= np.iinfo(np.intp).max:
+            # small integer labels: offsets are already codes, no sort required
+            true_offsets = y_true.astype(np.intp) - low
+            pred_offsets = y_pred.astype(np.intp) - low
+            span = high - low + 1
+            present = (np.bincount(true_offsets, minlength=span) + np.bincount(pred_offsets, minlength=span)) > 0
+            lookup = np.cumsum(present) - 1
+            return np.flatnonzero(present) + low, lookup[true_offsets], lookup[pred_offsets]
+
+    labels, codes = np.unique(np.concatenate([y_true, y_pred]), return_inverse=True)
+    codes = codes.ravel()
+    return labels, codes[:y_true.shape[0]], codes[y_true.shape[0]:]
+
+def get_confusion_matrix(y_true, y_pred):
+    """ Calculates the confusion matrix with a single bincount over integer-encoded labels.
+    Gives the same result as sklearn's `confusion_matrix` with its default labels
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred {array-like} -- predicted classes
+    
+    Returns:
+        numpy array -- confusion matrix, true classes in rows and predicted classes in columns
+    """
+
+    return _confusion_matrix_and_labels(y_true, y_pred)[0]
+
+def _confusion_matrix_and_labels(y_true, y_pred):
+    labels, true_codes, pred_codes = _encode_labels(y_true, y_pred)
+    n_labels = len(labels)
+    cm = np.bincount(true_codes * n_labels + pred_codes, minlength=n_labels * n_labels)
+    return cm.reshape(n_labels, n_labels), labels
+
+def _weighted_rates(tn, fp, fn, tp):
+    tp_weighted = tp / (tp + fn)
+    fp_weighted = fp / (tn + fp)
+    fn_weighted = fn / (tp + fn)
+    tn_weighted = tn / (tn + fp)
+
+    return tp_weighted, fp_weighted, fn_weighted, tn_weighted
+
+def _accuracy_from_counts(tn, fp, fn, tp):
+    return (tn + tp) / (tn + fp + fn + tp)
+
+def _specificity_from_counts(tn, fp, fn, tp):
+    return tn / (tn + fp)
+
+def _negative_predictive_value_from_counts(tn, fp, fn, tp):
+    return tn / (tn + fn)
+
+def _weighted_accuracy_from_counts(tn, fp, fn, tp):
+    tpw, fpw, fnw, tnw = _weighted_rates(tn, fp, fn, tp)
+    return (tpw + tnw) / (tpw + fpw + fnw + tnw)
+
+def _weighted_sensitivity_from_counts(tn, fp, fn, tp):
+    tpw, _, fnw, _ = _weighted_rates(tn, fp, fn, tp)
+    return tpw / (tpw + fnw)
+
+def _weighted_specificity_from_counts(tn, fp, fn, tp):
+    _, fpw, _, tnw = _weighted_rates(tn, fp, fn, tp)
+    return tnw / (tnw + fpw)
+
+def _weighted_ppv_from_counts(tn, fp, fn, tp):
+    tpw, fpw, _, _ = _weighted_rates(tn, fp, fn, tp)
+    return tpw / (tpw + fpw)
+
+def _weighted_npv_from_counts(tn, fp, fn, tp):
+    _, _, fnw, tnw = _weighted_rates(tn, fp, fn, tp)
+    return tnw / (tnw + fnw)
+
+# metrics that only depend on the (tn, fp, fn, tp) counts, keyed by the name of the nbutils function
+# (or sklearn scorer). Every function works elementwise, so the counts may be scalars or arrays.
+_COUNT_METRICS = {
+    'accuracy': _accuracy_from_counts,
+    'specificity': _specificity_from_counts,
+    'negative_predictive_value': _negative_predictive_value_from_counts,
+    'weighted_accuracy': _weighted_accuracy_from_counts,
+    'weighted_sensitivity': _weighted_sensitivity_from_counts,
+    'weighted_specificity': _weighted_specificity_from_counts,
+    'weighted_ppv': _weighted_ppv_from_counts,
+    'weighted_npv': _weighted_npv_from_counts,
+}
+
+def _count_metric_name(metric):
+    """ Returns the name of a count-based metric given either its name or the nbutils function """
+
+    name = getattr(metric, '__name__', metric)
+    if name not in _COUNT_METRICS:
+        raise ValueError("%r cannot be derived from confusion matrix counts. Choose from %s"
+                         % (metric, sorted(_COUNT_METRICS)))
+    return name
+
+class ConfusionStats(object):
+    """ Cached confusion matrix that every confusion-matrix metric in this module
+    can be derived from, so the labels only have to be counted once per (y_true, y_pred) pair.
+    Binary metrics treat the second class as the positive class. Multi-class matrices are
+    scored one-vs-rest with :meth:`per_class_scores` and :meth:`averaged_scores`
+    
+    Arguments:
+        confusion_matrix {numpy array} -- KxK confusion matrix, true classes in rows. A stack of
+        matrices with shape (n_sets, K, K) gives one score per matrix
+    
+    Keyword Arguments:
+        labels {array-like} -- class label of each row/column (default: {None})
+    """
+
+    def __init__(self, confusion_matrix, labels=None):
+        self.confusion_matrix = np.asarray(confusion_matrix)
+        self.labels = labels
+
+    @classmethod
+    def from_predictions(cls, y_true, y_pred):
+        """ Counts the predictions once with :func:`get_confusion_matrix`
+        
+        Arguments:
+            y_true {array-like} -- true classes
+            y_pred {array-like} -- predicted classes
+        
+        Returns:
+            ConfusionStats -- stats for the predictions
+        """
+
+        cm, labels = _confusion_matrix_and_labels(y_true, y_pred)
+        return cls(cm, labels=labels)
+
+    @property
+    def counts(self):
+        """ tuple -- (true negatives, false positives, false negatives, true positives) of a binary matrix """
+
+        cm = self.confusion_matrix
+        if cm.shape[-2:] != (2, 2):
+            raise ValueError("Binary metrics need a 2x2 confusion matrix, got shape %r. "
+                             "Use multiclass_scores for one-vs-rest scores of multi-class predictions" % (cm.shape,))
+        return cm[...,0,0], cm[...,0,1], cm[...,1,0], cm[...,1,1]
+
+    def weighted_confusion_matrix(self):
+        """ See :func:`get_weighted_confusion_matrix` """
+
+        return _weighted_rates(*self.counts)
+
+    def score(self, metric):
+        """ Calculates a single metric from the cached counts
+        
+        Arguments:
+            metric {str or function} -- metric name or nbutils metric function (e.g. `weighted_ppv`)
+        
+        Returns:
+            float -- metric value
+        """
+
+        return _COUNT_METRICS[_count_metric_name(metric)](*self.counts)
+
+    def scores(self, metrics=None):
+        """ Calculates several metrics from the cached counts
+        
+        Keyword Arguments:
+            metrics {list(str or function)} -- metrics to calculate (default: {None} - all of them)
+        
+        Returns:
+            dict -- metric name (str) -> score (float)
+        """
+
+        if metrics is None:
+            metrics = list(_COUNT_METRICS)
+        return {_count_metric_name(metric): self.score(metric) for metric in metrics}
+
+    def one_vs_rest_counts(self):
+        """ Counts of every class against the rest, all read off the one KxK matrix
+        
+        Returns:
+            tuple -- (true negatives, false positives, false negatives, true positives), one array
+            entry per class
+        """
+
+        cm = self.confusion_matrix
+        tp = np.diagonal(cm, axis1=-2, axis2=-1)
+        fn = cm.sum(axis=-1) - tp
+        fp = cm.sum(axis=-2) - tp
+        tn = cm.sum(axis=(-2, -1))[..., np.newaxis] - tp - fn - fp
+        return tn, fp, fn, tp
+
+    def per_class_scores(self, metrics=None):
+        """ Calculates metrics one-vs-rest for every class at once. For a binary matrix the
+        second class gives the same scores as :meth:`scores`
+        
+        Keyword Arguments:
+            metrics {list(str or function)} -- metrics to calculate (default: {None} - all of them)
+        
+        Returns:
+            dict -- metric name (str) -> scores (array of float, one per class)
+        """
+
+        if metrics is None:
+            metrics = list(_COUNT_METRICS)
+        counts = self.one_vs_rest_counts()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {_count_metric_name(metric): _COUNT_METRICS[_count_metric_name(metric)](*counts) for metric in metrics}
+
+    def averaged_scores(self, metrics=None, average='macro'):
+        """ Averages the one-vs-rest scores of the classes, ignoring undefined (NaN) class scores
+        
+        Keyword Arguments:
+            metrics {list(str or function)} -- metrics to calculate (default: {None} - all of them)
+            average {str} -- 'macro' for the unweighted mean of the classes, 'weighted' to weight
+            each class by its number of true samples (default: {'macro'})
+        
+        Returns:
+            dict -- metric name (str) -> averaged score (float)
+        """
+
+        if average == 'macro':
+            weights = np.ones(self.confusion_matrix.shape[-1])
+        elif average == 'weighted':
+            weights = self.confusion_matrix.sum(axis=-1)
+        else:
+            raise ValueError("Unknown average %r. Use 'macro' or 'weighted'" % average)
+
+        averages = {}
+        for name, scores in self.per_class_scores(metrics).items():
+            defined = ~np.isnan(scores)
+            averages[name] = np.sum(np.where(defined, scores, 0) * weights, axis=-1) / np.sum(defined * weights, axis=-1)
+        return averages
+
+    def accuracy(self):
+        """ Fraction of correct predictions, the trace over the total of each matrix of any size
+        
+        Returns:
+            float -- accuracy (array of float for a stack of matrices)
+        """
+
+        cm = self.confusion_matrix
+        return np.trace(cm, axis1=-2, axis2=-1) / cm.sum(axis=(-2, -1))
+
+    def summary_scores(self, metrics=None, average='macro'):
+        """ One score per metric for a matrix of any size: binary matrices are scored with :meth:`scores`,
+        multi-class ones with :meth:`averaged_scores`, except for 'accuracy', which is the overall
+        fraction of correct predictions (:meth:`accuracy`) rather than an average of one-vs-rest accuracies
+        
+        Keyword Arguments:
+            metrics {list(str or function)} -- metrics to calculate (default: {None} - all of them)
+            average {str} -- 'macro' or 'weighted', see :meth:`averaged_scores` (default: {'macro'})
+        
+        Returns:
+            dict -- metric name (str) -> score (float)
+        """
+
+        if self.confusion_matrix.shape[-2:] == (2, 2):
+            return self.scores(metrics)
+        scores = self.averaged_scores(metrics, average=average)
+        if 'accuracy' in scores:
+            scores['accuracy'] = self.accuracy()
+        return scores
+
+def multiclass_scores(y_true, y_pred, metrics=None, average=None):
+    """ Calculates one-vs-rest confusion-matrix metrics for every class from a single KxK
+    confusion matrix, without relabelling the data per class
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred {array-like} -- predicted classes
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to calculate (default: {None} - all confusion-matrix metrics)
+        average {str} -- None for per-class scores, or 'macro'/'weighted' (default: {None})
+    
+    Returns:
+        dict -- metric name (str) -> scores (array of float in the sorted label order), or averaged score (float)
+    """
+
+    stats = ConfusionStats.from_predictions(y_true, y_pred)
+    if average is None:
+        return stats.per_class_scores(metrics)
+    return stats.averaged_scores(metrics, average=average)
 
 def specificity(y_true, y_pred):
     """ Calculates the specificity (Selectivity, True Negative Rate)
@@ -46,7 +393,7 @@ def specificity(y_true, y_pred):
         float -- specificity
     """
 
-    cm = confusion_matrix(y_true, y_pred)
+    cm = get_confusion_matrix(y_true, y_pred)
     return cm[0,0] / cm[0,:].sum()
 
 def negative_predictive_value(y_true, y_pred):
@@ -60,7 +407,7 @@ def negative_predictive_value(y_true, y_pred):
         float -- negative_predictive_value
     """
 
-    cm = confusion_matrix(y_true, y_pred)
+    cm = get_confusion_matrix(y_true, y_pred)
     return cm[0,0] / cm[:,0].sum()
 
 def get_weighted_confusion_matrix(y_true, y_pred):
@@ -78,18 +425,7 @@ def get_weighted_confusion_matrix(y_true, y_pred):
         tn_weighted -- weighted true negatives
     """
 
-    cm = confusion_matrix(y_true, y_pred)
-    tn = cm[0,0]
-    tp = cm[1,1]
-    fp = cm[0,1]
-    fn = cm[1,0]
-    
-    tp_weighted = tp / (tp + fn)
-    fp_weighted = fp / (tn + fp)
-    fn_weighted = fn / (tp + fn)
-    tn_weighted = tn / (tn + fp)
-    
-    return tp_weighted, fp_weighted, fn_weighted, tn_weighted
+    return ConfusionStats.from_predictions(y_true, y_pred).weighted_confusion_matrix()
 
 def weighted_accuracy(y_true, y_pred):
     """ Calculates the weighted accuracy of the predictions
@@ -102,10 +438,8 @@ def weighted_accuracy(y_true, y_pred):
         float -- weighted_accuracy
     """
 
-    tpw, fpw, fnw, tnw = get_weighted_confusion_matrix(y_true, y_pred)
-    
-    return (tpw + tnw) / (tpw + fpw + fnw + tnw)
-    
+    return ConfusionStats.from_predictions(y_true, y_pred).score('weighted_accuracy')
+
 def weighted_sensitivity(y_true, y_pred):
     """ Calculates the weighted sensitivity (aka True Postiive Rate, Recall) of the predictions
     
@@ -117,10 +451,8 @@ def weighted_sensitivity(y_true, y_pred):
         float -- weighted_sensitivity
     """
 
-    tpw, _, fnw, _ = get_weighted_confusion_matrix(y_true, y_pred)
+    return ConfusionStats.from_predictions(y_true, y_pred).score('weighted_sensitivity')
 
-    return tpw / (tpw + fnw)
-    
 def weighted_specificity(y_true, y_pred):
     """ Calculates the weighted specificity (aka Selectivity, True Negative Rate) of the predictions
     
@@ -132,10 +464,8 @@ def weighted_specificity(y_true, y_pred):
         float -- weighted_specificity
     """
 
-    _, fpw, _, tnw = get_weighted_confusion_matrix(y_true, y_pred)
+    return ConfusionStats.from_predictions(y_true, y_pred).score('weighted_specificity')
 
-    return tnw / (tnw + fpw)
-    
 def weighted_ppv(y_true, y_pred):
     """ Calculates the weighted positive predictive value (aka Precision) of the predictions
     
@@ -147,9 +477,7 @@ def weighted_ppv(y_true, y_pred):
         float -- weighted_ppv
     """
 
-    tpw, fpw, _, _ = get_weighted_confusion_matrix(y_true, y_pred)
-    
-    return tpw / (tpw + fpw)
+    return ConfusionStats.from_predictions(y_true, y_pred).score('weighted_ppv')
 
 def weighted_npv(y_true, y_pred):
     """ Calculates the weighted negative predictive value of the predictions
@@ -162,23 +490,684 @@ def weighted_npv(y_true, y_pred):
         float -- weighted_npv
     """
 
-    _, _, fnw, tnw = get_weighted_confusion_matrix(y_true, y_pred)
+    return ConfusionStats.from_predictions(y_true, y_pred).score('weighted_npv')
+
+def get_batch_confusion_matrices(y_true, y_pred, labels=None):
+    """ Calculates the binary confusion matrix of many prediction sets at once with
+    vectorized reductions instead of a Python loop over the sets
     
-    return tnw / (tnw + fnw)
+    Arguments:
+        y_true {array-like} -- true classes, either shared (n_samples,) or one row per set (n_sets, n_samples)
+        y_pred {array-like} -- predicted classes, one row per set (n_sets, n_samples)
+    
+    Keyword Arguments:
+        labels {array-like} -- the (negative, positive) labels. Inferred from the data when not given (default: {None})
+    
+    Returns:
+        numpy array -- confusion matrices with shape (n_sets, 2, 2)
+    """
+
+    y_true, y_pred = np.asarray(y_true), np.atleast_2d(y_pred)
+    if y_true.shape[-1] != y_pred.shape[-1]:
+        raise ValueError("Found input variables with inconsistent numbers of samples: [%d, %d]"
+                         % (y_true.shape[-1], y_pred.shape[-1]))
+    if labels is None:
+        labels = np.union1d(np.unique(y_true), np.unique(y_pred))
+    if len(labels) != 2:
+        raise ValueError("Batch metrics need exactly two labels, got %r" % (list(labels),))
+
+    true_positive = y_true == labels[1]
+    pred_positive = y_pred == labels[1]
+    n_samples = y_pred.shape[-1]
+    positives = np.count_nonzero(true_positive, axis=-1)
+    predicted_positives = np.count_nonzero(pred_positive, axis=-1)
+    tp = np.count_nonzero(true_positive & pred_positive, axis=-1)
+    fn = positives - tp
+    fp = predicted_positives - tp
+    tn = n_samples - positives - fp
+
+    return np.stack([tn, fp, fn, tp], axis=-1).reshape(-1, 2, 2)
+
+def batch_scores(y_true, y_pred, metrics=None, labels=None):
+    """ Calculates confusion-matrix metrics for many prediction sets (CV folds, bootstrap
+    replicates, model variants) at once. Undefined scores are NaN, so the result can be
+    passed straight to :func:`print_score_summaries`
+    
+    Arguments:
+        y_true {array-like} -- true classes, either shared (n_samples,) or one row per set (n_sets, n_samples)
+        y_pred {array-like} -- predicted classes, one row per set (n_sets, n_samples)
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to calculate (default: {None} - all confusion-matrix metrics)
+        labels {array-like} -- the (negative, positive) labels. Inferred from the data when not given (default: {None})
+    
+    Returns:
+        dict -- metric name (str) -> scores (array of float, one per set)
+    """
+
+    stats = ConfusionStats(get_batch_confusion_matrices(y_true, y_pred, labels=labels))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return stats.scores(metrics)
+
+def get_threshold_table(y_true, y_score, metrics=None, thresholds=None, pos_label=None):
+    """ Calculates confusion-matrix metrics at every distinct score threshold (or at the requested
+    thresholds). The scores are sorted once, so the whole table costs O(n log n) instead of O(n)
+    per threshold. Samples are predicted positive when their score is at or above the threshold
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_score {array-like} -- scores of the positive class, e.g. `predict_proba(X)[:,1]`
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to calculate (default: {None} - all confusion-matrix metrics)
+        thresholds {array-like} -- thresholds to evaluate (default: {None} - every distinct score)
+        pos_label {int or str} -- label of the positive class (default: {None} - the larger label)
+    
+    Returns:
+        dict -- column name (str) -> array, with columns 'threshold', 'tn', 'fp', 'fn', 'tp' and one per metric
+    """
+
+    y_true, y_score = np.asarray(y_true), np.asarray(y_score)
+    if pos_label is None:
+        pos_label = np.unique(y_true)[-1]
+    is_positive = y_true == pos_label
+    positives = np.count_nonzero(is_positive)
+    negatives = len(y_true) - positives
+
+    if thresholds is None:
+        # like sklearn's roc_curve: an infinite threshold (nothing predicted positive), then every distinct score
+        thresholds = np.concatenate([[np.inf], np.unique(y_score)[::-1]])
+    else:
+        thresholds = np.asarray(thresholds, dtype=float)
+    # counting with searchsorted rather than from roc_curve rates keeps the counts exact when y_true
+    # has no positives or no negatives, where the rates are undefined
+    tp = positives - np.searchsorted(np.sort(y_score[is_positive]), thresholds, side='left')
+    fp = negatives - np.searchsorted(np.sort(y_score[~is_positive]), thresholds, side='left')
+    tn, fn = negatives - fp, positives - tp
+
+    table = {'threshold': thresholds, 'tn': tn, 'fp': fp, 'fn': fn, 'tp': tp}
+    stats = ConfusionStats(np.stack([tn, fp, fn, tp], axis=-1).reshape(-1, 2, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table.update(stats.scores(metrics))
+    return table
+
+def optimize_threshold(y_true, y_score, metric=weighted_accuracy, thresholds=None, pos_label=None):
+    """ Finds the score threshold that maximizes a confusion-matrix metric. See :func:`get_threshold_table`
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_score {array-like} -- scores of the positive class, e.g. `predict_proba(X)[:,1]`
+    
+    Keyword Arguments:
+        metric {str or function} -- metric to maximize (default: {weighted_accuracy})
+        thresholds {array-like} -- candidate thresholds (default: {None} - every distinct score)
+        pos_label {int or str} -- label of the positive class (default: {None} - the larger label)
+    
+    Returns:
+        threshold {float} -- best threshold
+        score {float} -- metric value at the best threshold
+    """
+
+    name = _count_metric_name(metric)
+    table = get_threshold_table(y_true, y_score, metrics=[name], thresholds=thresholds, pos_label=pos_label)
+    best = np.nanargmax(table[name])
+    return table['threshold'][best], table[name][best]
+
+def _check_random_state(random_state):
+    if isinstance(random_state, np.random.RandomState):
+        return random_state
+    return np.random.RandomState(random_state)
+
+def _threshold_predictions(y_true, y_score, threshold):
+    """ Predicts the larger of the two labels in y_true where the score reaches the threshold """
+
+    labels = np.unique(y_true)
+    if len(labels) != 2:
+        raise ValueError("Bootstrapping needs exactly two classes, got %d in y_true" % len(labels))
+    return labels[(np.asarray(y_score) >= threshold).astype(int)]
+
+def bootstrap_scores(y_true, y_pred, metrics=None, n_bootstraps=10000, threshold=None, random_state=None, chunk_size=None):
+    """ Calculates bootstrap replicates of confusion-matrix metrics. Resampling rows with replacement
+    only changes the confusion matrix counts, so each replicate is drawn directly as multinomial
+    counts over the four cells instead of materializing a resampled copy of the data
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred {array-like} -- predicted classes, or scores when `threshold` is given
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to calculate (default: {None} - all confusion-matrix metrics)
+        n_bootstraps {int} -- number of bootstrap replicates (default: {10000})
+        threshold {float} -- scores at or above the threshold are predicted as the positive class (default: {None})
+        random_state {int or RandomState} -- seed for reproducible replicates (default: {None})
+        chunk_size {int} -- number of replicates drawn at once, to cap memory (default: {None} - all at once)
+    
+    Returns:
+        dict -- metric name (str) -> replicate scores (array of float), ready for :func:`print_score_summaries`
+    """
+
+    if threshold is not None:
+        y_pred = _threshold_predictions(y_true, y_pred, threshold)
+    cm = get_confusion_matrix(y_true, y_pred)
+    if cm.shape != (2, 2):
+        raise ValueError("Bootstrapping needs exactly two classes, got a %dx%d confusion matrix" % cm.shape)
+
+    rng = _check_random_state(random_state)
+    n_samples = cm.sum()
+    cell_probabilities = cm.ravel() / n_samples
+    chunk_size = chunk_size or n_bootstraps
+
+    chunks = []
+    for start in range(0, n_bootstraps, chunk_size):
+        size = min(chunk_size, n_bootstraps - start)
+        counts = rng.multinomial(n_samples, cell_probabilities, size=size).reshape(size, 2, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chunks.append(ConfusionStats(counts).scores(metrics))
+
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+def bootstrap_confidence_intervals(y_true, y_pred, metrics=None, n_bootstraps=10000, confidence=0.95, threshold=None,
+                                   random_state=None, chunk_size=None):
+    """ Calculates percentile bootstrap confidence intervals of confusion-matrix metrics.
+    See :func:`bootstrap_scores` for how the replicates are drawn
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred {array-like} -- predicted classes, or scores when `threshold` is given
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to calculate (default: {None} - all confusion-matrix metrics)
+        n_bootstraps {int} -- number of bootstrap replicates (default: {10000})
+        confidence {float} -- confidence level of the interval (default: {0.95})
+        threshold {float} -- scores at or above the threshold are predicted as the positive class (default: {None})
+        random_state {int or RandomState} -- seed for reproducible intervals (default: {None})
+        chunk_size {int} -- number of replicates drawn at once, to cap memory (default: {None} - all at once)
+    
+    Returns:
+        dict -- metric name (str) -> (score, lower bound, upper bound)
+    """
+
+    if threshold is not None:
+        y_pred = _threshold_predictions(y_true, y_pred, threshold)
+    stats = ConfusionStats.from_predictions(y_true, y_pred)
+    replicates = bootstrap_scores(y_true, y_pred, metrics=metrics, n_bootstraps=n_bootstraps,
+                                  random_state=random_state, chunk_size=chunk_size)
+
+    tail = 100 * (1 - confidence) / 2
+    intervals = {}
+    for name, scores in replicates.items():
+        lower, upper = np.nanpercentile(scores, [tail, 100 - tail])
+        intervals[name] = (stats.score(name), lower, upper)
+    return intervals
+
+def _binary_confusion_matrix(y_true, y_pred, test):
+    cm = get_confusion_matrix(y_true, y_pred)
+    if cm.shape != (2, 2):
+        raise ValueError("%s needs exactly two classes, got a %dx%d confusion matrix" % ((test,) + cm.shape))
+    return cm
+
+def _chunk_sizes(n_permutations, chunk_size):
+    chunk_size = chunk_size or n_permutations
+    return [min(chunk_size, n_permutations - start) for start in range(0, n_permutations, chunk_size)]
+
+def _run_permutation_chunks(draw_chunk, args, n_permutations, random_state, chunk_size, n_jobs):
+    """ Draws the null scores chunk by chunk, each chunk seeded from `random_state` up front so the
+    result doesn't depend on the number of jobs """
+
+    rng = _check_random_state(random_state)
+    sizes = _chunk_sizes(n_permutations, chunk_size)
+    seeds = rng.randint(np.iinfo(np.int32).max, size=len(sizes))
+    if n_jobs == 1:
+        chunks = [draw_chunk(seed, size, *args) for seed, size in zip(seeds, sizes)]
+    else:
+        from joblib import Parallel, delayed
+        chunks = Parallel(n_jobs=n_jobs)(delayed(draw_chunk)(seed, size, *args) for seed, size in zip(seeds, sizes))
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+def _permutation_p_value(null_scores, observed, alternative):
+    """ Permutation p-value with the observed statistic counted as one of the permutations.
+    Undefined (NaN) null scores count as not extreme, and an undefined observed score has an undefined p-value """
+
+    if alternative not in ('greater', 'less', 'two-sided'):
+        raise ValueError("Unknown alternative %r. Use 'greater', 'less' or 'two-sided'" % alternative)
+    if np.isnan(observed):
+        return np.nan
+    n = len(null_scores)
+    greater = (1.0 + np.sum(null_scores >= observed)) / (1.0 + n)
+    less = (1.0 + np.sum(null_scores <= observed)) / (1.0 + n)
+    if alternative == 'greater':
+        return greater
+    elif alternative == 'less':
+        return less
+    return min(1.0, 2 * min(greater, less))
+
+def _label_permutation_chunk(seed, size, cm, metrics):
+    """ Null scores of `size` label permutations. Permuting the predictions keeps the number of true
+    and of predicted positives, so the true positives are hypergeometric and fix the other cells """
+
+    positives, negatives, predicted_positives = cm[1].sum(), cm[0].sum(), cm[:, 1].sum()
+    tp = np.random.RandomState(seed).hypergeometric(positives, negatives, predicted_positives, size=size)
+    fn = positives - tp
+    fp = predicted_positives - tp
+    tn = negatives - fp
+    counts = np.stack([tn, fp, fn, tp], axis=-1).reshape(size, 2, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return ConfusionStats(counts).scores(metrics)
+
+def permutation_test(y_true, y_pred, metrics=None, n_permutations=10000, alternative='greater', random_state=None,
+                     chunk_size=None, n_jobs=1):
+    """ Tests whether confusion-matrix metrics are better than chance with a label-permutation test.
+    Shuffling the predictions against the true classes keeps both margins of the confusion matrix, so
+    every permutation is drawn directly as a hypergeometric count of true positives and scored in
+    vectorized chunks, without shuffling any data
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred {array-like} -- predicted classes
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to test (default: {None} - all confusion-matrix metrics)
+        n_permutations {int} -- number of permutations (default: {10000})
+        alternative {str} -- 'greater' (better than chance), 'less' or 'two-sided' (default: {'greater'})
+        random_state {int or RandomState} -- seed for reproducible p-values (default: {None})
+        chunk_size {int} -- number of permutations drawn at once, to cap memory (default: {None} - all at once)
+        n_jobs {int} -- number of chunks scored in parallel (-1 is all available) (default: {1})
+    
+    Returns:
+        dict -- metric name (str) -> (score, p-value)
+    """
+
+    cm = _binary_confusion_matrix(y_true, y_pred, "A permutation test")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        observed = ConfusionStats(cm).scores(metrics)
+    null_scores = _run_permutation_chunks(_label_permutation_chunk, (cm, metrics), n_permutations, random_state,
+                                          chunk_size, n_jobs)
+    return {name: (observed[name], _permutation_p_value(null_scores[name], observed[name], alternative))
+            for name in observed}
+
+def _paired_counts(y_true, y_pred_a, y_pred_b):
+    """ Number of samples in each (true class, prediction of A, prediction of B) cell, as a 2x2x2 array """
+
+    y_true, y_pred_a, y_pred_b = [np.asarray(y).ravel() for y in (y_true, y_pred_a, y_pred_b)]
+    if not len(y_true) == len(y_pred_a) == len(y_pred_b):
+        raise ValueError("Found input variables with inconsistent numbers of samples: [%d, %d, %d]"
+                         % (len(y_true), len(y_pred_a), len(y_pred_b)))
+    labels, codes = np.unique(np.concatenate([y_true, y_pred_a, y_pred_b]), return_inverse=True)
+    if len(labels) != 2:
+        raise ValueError("A paired permutation test needs exactly two classes, got %d" % len(labels))
+    codes, n = codes.ravel(), len(y_true)
+    cells = codes[:n] * 4 + codes[n:2 * n] * 2 + codes[2 * n:]
+    return np.bincount(cells, minlength=8).reshape(2, 2, 2)
+
+def _paired_confusion_counts(cells, swapped_10, swapped_01):
+    """ Confusion matrices of models A and B after swapping the predictions of `swapped_10` of the samples
+    A predicts positive and B negative, and of `swapped_01` of the samples the other way round, per true class """
+
+    a_counts, b_counts = [], []
+    for true_class in (0, 1):
+        both_negative, b_only, a_only, both_positive = cells[true_class].ravel()
+        a_positive = both_positive + (a_only - swapped_10[true_class]) + swapped_01[true_class]
+        b_positive = both_positive + (b_only - swapped_01[true_class]) + swapped_10[true_class]
+        total = cells[true_class].sum()
+        a_counts.append((total - a_positive, a_positive))
+        b_counts.append((total - b_positive, b_positive))
+    # (tn, fp), (fn, tp)
+    a_cm = np.stack([a_counts[0][0], a_counts[0][1], a_counts[1][0], a_counts[1][1]], axis=-1)
+    b_cm = np.stack([b_counts[0][0], b_counts[0][1], b_counts[1][0], b_counts[1][1]], axis=-1)
+    return a_cm.reshape(-1, 2, 2), b_cm.reshape(-1, 2, 2)
+
+def _paired_swap_chunk(seed, size, cells, metrics):
+    """ Null score differences of `size` random swaps of the two models' predictions. Only samples the
+    models disagree on change, and the number swapped in each such cell is binomial """
+
+    rng = np.random.RandomState(seed)
+    swapped_10 = [rng.binomial(cells[true_class, 1, 0], 0.5, size=size) for true_class in (0, 1)]
+    swapped_01 = [rng.binomial(cells[true_class, 0, 1], 0.5, size=size) for true_class in (0, 1)]
+    a_cm, b_cm = _paired_confusion_counts(cells, swapped_10, swapped_01)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a_scores, b_scores = ConfusionStats(a_cm).scores(metrics), ConfusionStats(b_cm).scores(metrics)
+    return {name: a_scores[name] - b_scores[name] for name in a_scores}
+
+def paired_permutation_test(y_true, y_pred_a, y_pred_b, metrics=None, n_permutations=10000, alternative='greater',
+                            random_state=None, chunk_size=None, n_jobs=1):
+    """ Tests whether model A scores better than model B on the same samples with a paired permutation
+    test, which swaps the two predictions of each sample with probability 1/2. Only samples the models
+    disagree on are affected, so every permutation is drawn as binomial counts of swapped disagreements
+    and scored in vectorized chunks
+    
+    Arguments:
+        y_true {array-like} -- true classes
+        y_pred_a {array-like} -- classes predicted by model A
+        y_pred_b {array-like} -- classes predicted by model B
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to test (default: {None} - all confusion-matrix metrics)
+        n_permutations {int} -- number of permutations (default: {10000})
+        alternative {str} -- 'greater' (A beats B), 'less' or 'two-sided' (default: {'greater'})
+        random_state {int or RandomState} -- seed for reproducible p-values (default: {None})
+        chunk_size {int} -- number of permutations drawn at once, to cap memory (default: {None} - all at once)
+        n_jobs {int} -- number of chunks scored in parallel (-1 is all available) (default: {1})
+    
+    Returns:
+        dict -- metric name (str) -> (score of A minus score of B, p-value)
+    """
+
+    cells = _paired_counts(y_true, y_pred_a, y_pred_b)
+    no_swaps = [np.zeros(1, dtype=int)] * 2
+    a_cm, b_cm = _paired_confusion_counts(cells, no_swaps, no_swaps)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a_scores, b_scores = ConfusionStats(a_cm[0]).scores(metrics), ConfusionStats(b_cm[0]).scores(metrics)
+    observed = {name: a_scores[name] - b_scores[name] for name in a_scores}
+    null_scores = _run_permutation_chunks(_paired_swap_chunk, (cells, metrics), n_permutations, random_state,
+                                          chunk_size, n_jobs)
+    return {name: (observed[name], _permutation_p_value(null_scores[name], observed[name], alternative))
+            for name in observed}
+
+class MetricAccumulator(object):
+    """ Running confusion matrix and per-class score histograms that are updated chunk by chunk
+    and merged across workers, for data that doesn't fit in memory. Confusion-matrix metrics are
+    exact. The ROC curve and AUC are computed from the score histograms, so their resolution
+    is limited by the number of bins
+    
+    Keyword Arguments:
+        labels {array-like} -- every class label that can occur. With two labels the last one is the positive
+        class; with more, confusion-matrix metrics are averaged one-vs-rest (default: {(0, 1)})
+        n_bins {int} -- number of score histogram bins (default: {1000})
+        score_range {tuple(float)} -- range of the scores. Scores outside it fall in the edge bins (default: {(0.0, 1.0)})
+    """
+
+    def __init__(self, labels=(0, 1), n_bins=1000, score_range=(0.0, 1.0)):
+        self.labels = np.sort(np.asarray(labels))
+        self.n_bins = n_bins
+        self.score_range = score_range
+        self.confusion_matrix = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64)
+        self.score_histograms = np.zeros((len(self.labels), n_bins), dtype=np.int64)
+
+    def _encode(self, y):
+        y = np.asarray(y).ravel()
+        codes = np.minimum(np.searchsorted(self.labels, y), len(self.labels) - 1)
+        if not np.array_equal(self.labels[codes], y):
+            raise ValueError("Found labels that are not in %r" % (self.labels.tolist(),))
+        return codes
+
+    def update(self, y_true, y_pred=None, y_score=None):
+        """ Adds a chunk of predictions
+        
+        Arguments:
+            y_true {array-like} -- true classes
+        
+        Keyword Arguments:
+            y_pred {array-like} -- predicted classes (default: {None})
+            y_score {array-like} -- scores of the positive class, e.g. `predict_proba(X)[:,1]` (default: {None})
+        
+        Returns:
+            MetricAccumulator -- self
+        """
+
+        true_codes = self._encode(y_true)
+        n_labels = len(self.labels)
+        if y_pred is not None:
+            cells = true_codes * n_labels + self._encode(y_pred)
+            self.confusion_matrix += np.bincount(cells, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+        if y_score is not None:
+            low, high = self.score_range
+            bins = ((np.asarray(y_score, dtype=float).ravel() - low) / (high - low) * self.n_bins).astype(np.intp)
+            cells = true_codes * self.n_bins + np.clip(bins, 0, self.n_bins - 1)
+            self.score_histograms += np.bincount(cells, minlength=n_labels * self.n_bins).reshape(n_labels, self.n_bins)
+        return self
+
+    def merge(self, other):
+        """ Adds the counts of another accumulator, e.g. one filled by a different worker
+        
+        Arguments:
+            other {MetricAccumulator} -- accumulator with the same labels and bins
+        
+        Returns:
+            MetricAccumulator -- self
+        """
+
+        if (not np.array_equal(self.labels, other.labels) or self.n_bins != other.n_bins
+                or tuple(self.score_range) != tuple(other.score_range)):
+            raise ValueError("Only accumulators with the same labels, bins and score range can be merged")
+        self.confusion_matrix += other.confusion_matrix
+        self.score_histograms += other.score_histograms
+        return self
+
+    def scores(self, metrics=None, average='macro'):
+        """ Calculates confusion-matrix metrics from the accumulated counts. See :meth:`ConfusionStats.summary_scores` """
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ConfusionStats(self.confusion_matrix).summary_scores(metrics, average=average)
+
+    def roc_curve(self):
+        """ Calculates the ROC curve with one threshold per histogram bin edge
+        
+        Returns:
+            fpr {numpy array} -- false positive rates
+            tpr {numpy array} -- true positive rates
+            thresholds {numpy array} -- decreasing score thresholds
+        """
+
+        if len(self.labels) != 2:
+            raise ValueError("The ROC curve needs exactly two labels")
+        negatives, positives = self.score_histograms[:, ::-1].cumsum(axis=1)
+        fpr = np.concatenate([[0.0], negatives / negatives[-1]])
+        tpr = np.concatenate([[0.0], positives / positives[-1]])
+        edges = np.linspace(self.score_range[0], self.score_range[1], self.n_bins + 1)
+        thresholds = np.concatenate([[np.inf], edges[-2::-1]])
+        return fpr, tpr, thresholds
+
+    def roc_auc(self):
+        """ Calculates the area under the binned ROC curve with the trapezoidal rule
+        
+        Returns:
+            float -- roc auc
+        """
+
+        fpr, tpr, _ = self.roc_curve()
+        return np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2)
+
+def _is_table(results):
+    return hasattr(results, 'columns') or not all(hasattr(value, 'keys') for value in results.values())
+
+def write_results(results, path, format=None):
+    """ Writes report results to disk in one go. A table is a dict of equal-length columns
+    (column name -> array-like) or a DataFrame; several tables are given as a dict of tables.
+    NPZ keeps every column of every table in one archive (as '<table>/<column>'), while CSV and
+    Parquet write one file per table, named '<path stem>_<table><extension>'. Parquet needs pyarrow
+    or fastparquet
+    
+    Arguments:
+        results {dict or DataFrame} -- a table, or table name (str) -> table
+        path {str} -- file to write
+    
+    Keyword Arguments:
+        format {str} -- 'csv', 'npz' or 'parquet' (default: {None} - taken from the extension of path)
+    
+    Returns:
+        list(str) -- the files written
+    """
+
+    tables = OrderedDict([(None, results)]) if _is_table(results) else results
+    root, extension = os.path.splitext(path)
+    format = (format or extension.lstrip('.')).lower()
 
-def print_score_summaries(scores_dict):
+    if format == 'npz':
+        arrays = OrderedDict()
+        for table_name, table in tables.items():
+            for column in table:
+                key = column if table_name is None else '%s/%s' % (table_name, column)
+                arrays[key] = np.asarray(table[column])
+        np.savez(path, **arrays)
+        return [path]
+
+    if format not in ('csv', 'parquet'):
+        raise ValueError("Unknown format %r. Use 'csv', 'npz' or 'parquet'" % format)
+    import pandas as pd
+    paths = []
+    for table_name, table in tables.items():
+        table_path = path if table_name is None else '%s_%s%s' % (root, table_name, extension)
+        frame = table if hasattr(table, 'columns') else pd.DataFrame(OrderedDict(table))
+        if format == 'csv':
+            frame.to_csv(table_path, index=False)
+        else:
+            frame.to_parquet(table_path, index=False)
+        paths.append(table_path)
+    return paths
+
+def _print_rows(*columns, **kwargs):
+    """ Prints equal-length columns with a single write instead of one print per row. The
+    columns are converted to text by numpy, which is much faster than formatting every value """
+
+    separator = kwargs.pop('separator', ' ')
+    text_columns = [np.asarray(column).astype(str) for column in columns]
+    lines = [separator.join(row) for row in zip(*text_columns)]
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+def print_score_summaries(scores_dict, output=None, store=None):
     """ Prints out the mean and stddev of scores, dropping any NaN values in the calculation
     
     Arguments:
         scores_dict {dict(name(str) -> scores(float))} -- A dictionary that maps the name of a score value (e.g. "specificity")
         to an array of those scores
+    
+    Keyword Arguments:
+        output {str} -- file to also write the summary table to, see :func:`write_results` (default: {None})
+        store {ExperimentStore or str} -- experiment store (or its database file) to log the mean scores and every
+        individual score (e.g. per fold) to as a run, see :mod:`mlexp.store` (default: {None})
+    
+    Returns:
+        OrderedDict -- summary table with 'score', 'mean' and 'std' columns
     """
 
+    names, means, stds = [], [], []
     for score_name in scores_dict:
-        scores = scores_dict[score_name]
-        print("%s\t%s\t%s" %(score_name, np.mean(scores[~np.isnan(scores)]), np.std(scores[~np.isnan(scores)])))
+        scores = np.asarray(scores_dict[score_name], dtype=float)
+        names.append(score_name)
+        means.append(np.mean(scores[~np.isnan(scores)]))
+        stds.append(np.std(scores[~np.isnan(scores)]))
+
+    summary = OrderedDict([('score', names), ('mean', np.array(means)), ('std', np.array(stds))])
+    _print_rows(names, summary['mean'], summary['std'], separator='\t')
+    if output is not None:
+        write_results(summary, output)
+    if store is not None:
+        from mlexp.store import opened_store
+        with opened_store(store) as opened:
+            opened.log_run(metrics=OrderedDict(zip(names, means)),
+                           fold_scores=OrderedDict((name, scores_dict[name]) for name in names),
+                           artifacts={'output': output} if output is not None else {})
+    return summary
+
+def _fingerprint(X):
+    """ Returns a hashable fingerprint of the contents of X. Object arrays (e.g. mixed-type
+    DataFrames) can't be hashed cheaply and fall back to the identity of X """
+
+    values = np.asarray(X)
+    if values.dtype.hasobject:
+        return ('id', id(X))
+    digest = hashlib.blake2b(np.ascontiguousarray(values), digest_size=16).hexdigest()
+    return (values.shape, values.dtype.str, digest)
+
+class PredictionCache(object):
+    """ Bounded least-recently-used cache of model outputs (predict, predict_proba, decision_function)
+    keyed by the identity of the model, the method and a fingerprint of X. Pass the same cache to
+    :func:`get_metrics` and :func:`plot_roc` to run inference once per (model, X). Entries hold a
+    reference to their model, so create a new cache (or :meth:`clear` it) after refitting a model in place
+    
+    Keyword Arguments:
+        maxsize {int} -- maximum number of cached outputs before the least recently used is evicted (default: {16})
+    """
+
+    cached_methods = ('predict', 'predict_proba', 'decision_function')
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, model, method, X, fingerprint=None):
+        """ Returns `model.<method>(X)`, calling the model only if the output isn't cached
+        
+        Arguments:
+            model {sklearn estimator} -- fitted estimator
+            method {str} -- name of the prediction method
+            X {array-like} -- data features
+        
+        Keyword Arguments:
+            fingerprint {tuple} -- precomputed fingerprint of X (default: {None})
+        
+        Returns:
+            array -- model output
+        """
+
+        fingerprint = fingerprint if fingerprint is not None else _fingerprint(X)
+        key = (id(model), method, fingerprint)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is model:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[2]
 
-def get_metrics(model, X, y, scoring_list={'accuracy':make_scorer(accuracy_score)}):
+        self.misses += 1
+        with profiling.phase('predict', method):
+            output = getattr(model, method)(X)
+        # keep X alive for identity fingerprints so its id can't be reused by another array
+        self._entries[key] = (model, X if fingerprint[0] == 'id' else None, output)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return output
+
+    def wrap(self, model):
+        """ Returns a view of the model whose prediction methods go through this cache, which can be
+        passed to sklearn scorers in place of the model
+        
+        Arguments:
+            model {sklearn estimator} -- fitted estimator
+        
+        Returns:
+            object -- cached view of the model
+        """
+
+        return _CachedModel(model, self)
+
+    def clear(self):
+        """ Removes every cached output """
+
+        self._entries.clear()
+
+class _CachedModel(object):
+    """ Delegates to a fitted model, serving its prediction methods from a :class:`PredictionCache` """
+
+    def __init__(self, model, cache):
+        self._model = model
+        self._cache = cache
+        self._last_X = None
+        self._last_fingerprint = None
+
+    def _cached_call(self, method, X):
+        # scorers pass the same X object again and again, so only hash it once
+        if X is not self._last_X:
+            self._last_X, self._last_fingerprint = X, _fingerprint(X)
+        return self._cache.get(self._model, method, X, fingerprint=self._last_fingerprint)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._model, name)
+        if name not in PredictionCache.cached_methods:
+            return attribute
+
+        def cached_method(X):
+            return self._cached_call(name, X)
+        # sklearn scorers look at the name of the prediction method they were given
+        cached_method.__name__ = name
+        return cached_method
+
+def get_metrics(model, X, y, scoring_list=None, cache=None, output=None, store=None):
     """Get a dictionary of calculated metrics given a model and known data
     
     Arguments:
@@ -186,21 +1175,443 @@ def get_metrics(model, X, y, scoring_list={'accuracy':make_scorer(accuracy_score
         X {array-like(float)} -- data's features
         y {int} -- data's class
         scoring_list {dict(scorer_name(str) -> sklearn scorer)} -- dictionary of all scores you would like
-        to calculate on the data/model combination
+        to calculate on the data/model combination (default: accuracy only)
+        cache {PredictionCache} -- cache shared with other calls on the same model and data. The model
+        is called at most once per prediction method even without one (default: {None})
+        output {str} -- file to also write the scores to as a one-row table, see :func:`write_results` (default: {None})
+        store {ExperimentStore or str} -- experiment store (or its database file) to log the scores and the model's
+        parameters to as a run, see :mod:`mlexp.store` (default: {None})
 
     Returns:
         dict -- scorer name (str) -> score (float) 
     """
 
-    metrics = {}
-    for metric in scoring_list:
-        score = scoring_list[metric](model, X, y)
-        metrics[metric] = score
-        print("%s\t%s" %(metric, score))
+    if scoring_list is None:
+        from sklearn.metrics import accuracy_score, make_scorer
+        scoring_list = {'accuracy':make_scorer(accuracy_score)}
+
+    metrics = _score_model(model, X, y, scoring_list, cache=cache)
+    _print_rows(list(metrics), [metrics[metric] for metric in metrics], separator='\t')
+    if output is not None:
+        write_results(OrderedDict((metric, [metrics[metric]]) for metric in metrics), output)
+    if store is not None:
+        from mlexp.store import loggable_params, opened_store
+        with opened_store(store) as opened:
+            opened.log_run(params=loggable_params(model), metrics=metrics,
+                           artifacts={'output': output} if output is not None else {})
 
     return metrics
 
-def plot_roc(model, X_test, Y_test, verbose=False, show_plot=True):
+def _score_model(model, X, y, scoring_list, cache=None):
+    """ Applies every scorer to a cached view of the model. See :func:`get_metrics` """
+
+    model = (cache if cache is not None else PredictionCache()).wrap(model)
+    scores = {}
+    for metric in scoring_list:
+        with profiling.phase('score', metric):
+            scores[metric] = scoring_list[metric](model, X, y)
+    return scores
+
+def evaluate_models(models, X, y, scoring_list=None, n_jobs=-1):
+    """Scores many fitted models on the same data in parallel worker processes. X and y are
+    shared with the workers through memory-mapped files (see :mod:`mlexp.parallel`) rather than
+    pickled to each of them
+    
+    Arguments:
+        models {dict(name(str) -> sklearn Estimator) or list(sklearn Estimator)} -- fitted models
+        X {array-like(float)} -- data's features
+        y {array-like} -- data's classes
+    
+    Keyword Arguments:
+        scoring_list {dict(scorer_name(str) -> sklearn scorer)} -- scores to calculate, e.g. include
+        `get_scorer('roc_auc')` for the area under the ROC curve (default: {None} - accuracy only)
+        n_jobs {int} -- number of worker processes (-1 is all available) (default: {-1})
+    
+    Returns:
+        DataFrame -- one row per model, in the order given, and one column per scorer
+    """
+
+    import pandas as pd
+    from joblib import Parallel, delayed
+    from mlexp.parallel import shared_arrays
+
+    if scoring_list is None:
+        from sklearn.metrics import accuracy_score, make_scorer
+        scoring_list = {'accuracy':make_scorer(accuracy_score)}
+    names = list(models) if hasattr(models, 'keys') else list(range(len(models)))
+    models = [models[name] for name in names] if hasattr(models, 'keys') else list(models)
+
+    with shared_arrays(X, y) as (X_shared, y_shared):
+        rows = Parallel(n_jobs=n_jobs)(delayed(_score_model)(model, X_shared, y_shared, scoring_list) for model in models)
+
+    return pd.DataFrame(rows, index=pd.Index(names, name='model'), columns=list(scoring_list))
+
+def _fit_fold_predictions(model, X, y, train, test):
+    """ Fits a clone of the model on the training part of a fold and returns its predictions and
+    scores (positive-class probability or decision value) on the test part """
+
+    from sklearn.base import clone
+    from mlexp.search import _take
+
+    model = clone(model).fit(_take(X, train), _take(y, train))
+    X_test = _take(X, test)
+    y_pred = model.predict(X_test)
+    if hasattr(model, 'predict_proba'):
+        y_score = model.predict_proba(X_test)
+    elif hasattr(model, 'decision_function'):
+        y_score = model.decision_function(X_test)
+    else:
+        return y_pred, None, None
+    return y_pred, y_score, np.asarray(model.classes_)
+
+class CrossValidatedPredictions(object):
+    """ Compact out-of-fold predictions of a cross-validated model, from which every fold's
+    confusion-matrix metrics, ROC AUC and ROC curve are derived without predicting again.
+    Classes are stored as small integer codes and scores as float32, concatenated over the folds
+    in test-index order. See :func:`cross_validate_metrics`
+    
+    Arguments:
+        classes {array} -- sorted class labels
+        indices {array(int)} -- row of every out-of-fold prediction, fold after fold
+        fold_offsets {array(int)} -- start of every fold in `indices`, followed by its length
+        true_codes {array(int)} -- true class code of every prediction
+        pred_codes {array(int)} -- predicted class code of every prediction
+    
+    Keyword Arguments:
+        scores {array(float)} -- positive-class score of every prediction for binary problems, or
+        one column per class (default: {None} - the model has no scores)
+    """
+
+    def __init__(self, classes, indices, fold_offsets, true_codes, pred_codes, scores=None):
+        self.classes = classes
+        self.indices = indices
+        self.fold_offsets = fold_offsets
+        self.true_codes = true_codes
+        self.pred_codes = pred_codes
+        self.scores = scores
+
+    @property
+    def n_folds(self):
+        """ int -- number of folds """
+
+        return len(self.fold_offsets) - 1
+
+    @property
+    def y_true(self):
+        """ array -- true class of every out-of-fold prediction """
+
+        return self.classes[self.true_codes]
+
+    @property
+    def y_pred(self):
+        """ array -- predicted class of every out-of-fold prediction """
+
+        return self.classes[self.pred_codes]
+
+    def _fold_slice(self, fold):
+        return slice(self.fold_offsets[fold], self.fold_offsets[fold + 1])
+
+    def fold_confusion_matrices(self):
+        """ Counts the confusion matrix of every fold in a single pass
+        
+        Returns:
+            array(int) -- stack of KxK confusion matrices with shape (n_folds, K, K)
+        """
+
+        n_classes = len(self.classes)
+        folds = np.repeat(np.arange(self.n_folds), np.diff(self.fold_offsets))
+        cells = (folds * n_classes + self.true_codes) * n_classes + self.pred_codes
+        counts = np.bincount(cells, minlength=self.n_folds * n_classes * n_classes)
+        return counts.reshape(self.n_folds, n_classes, n_classes)
+
+    def fold_roc_auc(self):
+        """ Calculates the ROC AUC of every binary fold, NaN for folds with a single class
+        
+        Returns:
+            array(float) -- ROC AUC per fold
+        """
+
+        from sklearn.metrics import roc_auc_score
+
+        if self.scores is None or len(self.classes) != 2:
+            raise ValueError("ROC AUC needs the scores of a binary classifier")
+        aucs = np.full(self.n_folds, np.nan)
+        for fold in range(self.n_folds):
+            fold_slice = self._fold_slice(fold)
+            if len(np.unique(self.true_codes[fold_slice])) == 2:
+                aucs[fold] = roc_auc_score(self.true_codes[fold_slice], self.scores[fold_slice])
+        return aucs
+
+    def fold_scores(self, metrics=None, average='macro'):
+        """ Calculates metrics for every fold, in the form :func:`print_score_summaries` takes
+        
+        Keyword Arguments:
+            metrics {list(str or function)} -- confusion-matrix metrics, and/or 'roc_auc' (default: {None} -
+            all confusion-matrix metrics, plus 'roc_auc' for binary classifiers with scores)
+            average {str} -- how multi-class metrics average the one-vs-rest class scores, 'macro' or
+            'weighted'. Multi-class 'accuracy' is the overall accuracy, see :meth:`ConfusionStats.summary_scores`
+            (default: {'macro'})
+        
+        Returns:
+            dict -- metric name (str) -> scores (array of float, one per fold)
+        """
+
+        if metrics is None:
+            metrics = list(_COUNT_METRICS)
+            if self.scores is not None and len(self.classes) == 2:
+                metrics.append('roc_auc')
+        count_metrics = [metric for metric in metrics if metric != 'roc_auc']
+
+        stats = ConfusionStats(self.fold_confusion_matrices(), labels=self.classes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            count_scores = stats.summary_scores(count_metrics, average=average)
+
+        scores = OrderedDict()
+        for metric in metrics:
+            if metric == 'roc_auc':
+                scores['roc_auc'] = self.fold_roc_auc()
+            else:
+                scores[_count_metric_name(metric)] = np.asarray(count_scores[_count_metric_name(metric)], dtype=float)
+        return scores
+
+    def roc_curve(self, fold=None):
+        """ Calculates the ROC curve of a binary classifier from its out-of-fold scores
+        
+        Keyword Arguments:
+            fold {int} -- fold to use (default: {None} - the scores of every fold pooled)
+        
+        Returns:
+            tuple -- (false positive rates, true positive rates, thresholds)
+        """
+
+        from sklearn.metrics import roc_curve
+
+        if self.scores is None or len(self.classes) != 2:
+            raise ValueError("A ROC curve needs the scores of a binary classifier")
+        fold_slice = slice(None) if fold is None else self._fold_slice(fold)
+        return roc_curve(self.true_codes[fold_slice], self.scores[fold_slice])
+
+def cross_validate_metrics(model, X, y, metrics=None, cv=5, n_jobs=-1):
+    """ Cross-validates the confusion-matrix metrics (and ROC AUC) of a model. Each fold is fit once,
+    in parallel, and predicts its test part once; every metric is then derived from those
+    out-of-fold predictions instead of a predict pass per scorer. Prints the mean and stddev of
+    every metric over the folds
+    
+    Arguments:
+        model {sklearn estimator} -- unfitted estimator or pipeline
+        X {array-like} -- data features
+        y {array-like} -- data classes
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- metrics to report, see :meth:`CrossValidatedPredictions.fold_scores`
+        (default: {None} - all of them)
+        cv {int or cross-validation generator} -- folds, as for sklearn's `cross_validate` (default: {5})
+        n_jobs {int} -- number of folds fit in parallel (-1 is all available) (default: {-1})
+    
+    Returns:
+        CrossValidatedPredictions -- the out-of-fold predictions, e.g. for `fold_scores()` or `roc_curve()`
+    """
+
+    from joblib import Parallel, delayed
+    from sklearn.base import is_classifier
+    from sklearn.model_selection import check_cv
+    from mlexp.search import _as_indexable
+
+    X, y = _as_indexable(X), np.asarray(y)
+    folds = list(check_cv(cv, y, classifier=is_classifier(model)).split(X, y))
+    outputs = Parallel(n_jobs=n_jobs)(delayed(_fit_fold_predictions)(model, X, y, train, test) for train, test in folds)
+
+    classes = np.unique(y)
+    code_dtype = np.min_scalar_type(len(classes) - 1)
+    indices = np.concatenate([test for _, test in folds]).astype(np.min_scalar_type(max(len(y) - 1, 0)))
+    fold_offsets = np.concatenate([[0], np.cumsum([len(test) for _, test in folds])])
+    true_codes = np.searchsorted(classes, y[indices]).astype(code_dtype)
+    pred_codes = np.concatenate([np.searchsorted(classes, y_pred) for y_pred, _, _ in outputs]).astype(code_dtype)
+
+    scores = None
+    if all(y_score is not None for _, y_score, _ in outputs):
+        fold_scores = []
+        for (_, y_score, fold_classes), (_, test) in zip(outputs, folds):
+            y_score = np.asarray(y_score, dtype=np.float32)
+            if y_score.ndim == 1:
+                # binary decision function
+                fold_scores.append(y_score if len(classes) == 2 else None)
+                continue
+            # a fold that lacks a class has no column for it
+            full = np.zeros((len(test), len(classes)), dtype=np.float32)
+            full[:, np.searchsorted(classes, fold_classes)] = y_score
+            fold_scores.append(full[:, 1] if len(classes) == 2 else full)
+        if all(fold_score is not None for fold_score in fold_scores):
+            scores = np.concatenate(fold_scores)
+
+    predictions = CrossValidatedPredictions(classes, indices, fold_offsets, true_codes, pred_codes, scores=scores)
+    print_score_summaries(predictions.fold_scores(metrics))
+    return predictions
+
+class _BatchedOutputs(object):
+    """ Runs a prediction method of a model once over a buffer of stacked copies of X, and serves
+    each copy's rows of the output to the scorer of that copy """
+
+    def __init__(self, model, buffer, n_rows):
+        self.model, self.buffer, self.n_rows = model, buffer, n_rows
+        self._outputs = {}
+
+    def output(self, method, block):
+        if method not in self._outputs:
+            self._outputs[method] = getattr(self.model, method)(self.buffer)
+        return self._outputs[method][block * self.n_rows:(block + 1) * self.n_rows]
+
+class _BlockModel(object):
+    """ Stands in for a fitted model in a scorer call, answering its prediction methods from one
+    block of a :class:`_BatchedOutputs` """
+
+    def __init__(self, outputs, block):
+        self._outputs, self._block = outputs, block
+
+    def __getattr__(self, name):
+        attribute = getattr(self._outputs.model, name)
+        if name not in PredictionCache.cached_methods:
+            return attribute
+
+        def block_method(X):
+            return self._outputs.output(name, self._block)
+        # sklearn scorers look at the name of the prediction method they were given
+        block_method.__name__ = name
+        return block_method
+
+def _stack_copies(X, n_copies):
+    """ Returns a writable buffer of n_copies of X stacked by rows """
+
+    if hasattr(X, 'iloc'):
+        import pandas as pd
+        return pd.concat([X] * n_copies, ignore_index=True)
+    return np.tile(np.asarray(X), (n_copies, 1))
+
+def _set_column(buffer, rows, column, values):
+    if hasattr(buffer, 'iloc'):
+        buffer.iloc[rows, column] = values
+    else:
+        buffer[rows, column] = values
+
+def _column(X, column):
+    return np.asarray(X.iloc[:, column]) if hasattr(X, 'iloc') else X[:, column]
+
+def _permutation_importance_chunk(model, X, y, scorer, features, seeds, n_repeats, batch_size):
+    """ Scores the model with each of the features permuted `n_repeats` times. The permuted copies
+    are written into one reusable buffer of `batch_size` stacked copies of X, so each prediction
+    call covers `batch_size` (feature, repeat) pairs, and only the permuted column of a copy is
+    rewritten and restored """
+
+    n_rows = len(y)
+    rngs = [np.random.RandomState(seed) for seed in seeds]
+    tasks = [(position, feature, repeat, rngs[position]) for position, feature in enumerate(features) for repeat in range(n_repeats)]
+    scores = np.empty((len(features), n_repeats))
+    buffer = _stack_copies(X, min(batch_size, len(tasks)))
+    columns = {}
+    for start in range(0, len(tasks), batch_size):
+        batch = tasks[start:start + batch_size]
+        for block, (_, feature, _, rng) in enumerate(batch):
+            column = columns.setdefault(feature, np.array(_column(X, feature)))
+            _set_column(buffer, slice(block * n_rows, (block + 1) * n_rows), feature, column[rng.permutation(n_rows)])
+        # a short final batch only scores its own blocks
+        outputs = _BatchedOutputs(model, buffer if len(batch) * n_rows == len(buffer) else buffer[:len(batch) * n_rows],
+                                  n_rows)
+        for block, (position, feature, repeat, _) in enumerate(batch):
+            scores[position, repeat] = scorer(_BlockModel(outputs, block), X, y)
+        for block, (_, feature, _, _) in enumerate(batch):
+            _set_column(buffer, slice(block * n_rows, (block + 1) * n_rows), feature, columns[feature])
+    return scores
+
+def permutation_importance(model, X, y, scoring=None, n_repeats=5, n_jobs=-1, batch_size=None, random_state=None):
+    """ Calculates the permutation importance of every feature of any fitted estimator: how much its
+    score drops when the values of the feature are shuffled. The features are spread over worker
+    processes that share X and y through memory-mapped files (see :mod:`mlexp.parallel`); each worker
+    permutes columns in place in one reusable buffer and predicts many permuted copies per call
+    
+    Arguments:
+        model {sklearn estimator} -- fitted estimator or pipeline
+        X {array-like} -- data features
+        y {array-like} -- data classes
+    
+    Keyword Arguments:
+        scoring {str or sklearn scorer} -- sklearn scorer name, or scorer such as `make_scorer(weighted_accuracy)`
+        (default: {None} - accuracy)
+        n_repeats {int} -- number of permutations per feature (default: {5})
+        n_jobs {int} -- number of worker processes (-1 is all available) (default: {-1})
+        batch_size {int} -- number of permuted copies of X predicted per call. Each worker holds a buffer of
+        this many copies (default: {None} - as many as fit in 10 million cells, i.e. rows x features, and at least one)
+        random_state {int or RandomState} -- seed for reproducible permutations, whatever the number of jobs (default: {None})
+    
+    Returns:
+        OrderedDict -- 'importances_mean' and 'importances_std' (one value per feature), 'importances'
+        (features x repeats) and 'baseline_score'. Pass `importances_mean` to :func:`plot_coefficients`
+        or :func:`print_feature_importance` in place of coefficients
+    """
+
+    from joblib import Parallel, delayed
+    from sklearn.metrics import accuracy_score, get_scorer, make_scorer
+    from mlexp.parallel import shared_arrays
+    from mlexp.search import _as_indexable
+
+    if scoring is None:
+        scorer = make_scorer(accuracy_score)
+    else:
+        scorer = get_scorer(scoring) if isinstance(scoring, str) else scoring
+    X, y = _as_indexable(X), np.asarray(y)
+    n_rows, n_features = X.shape
+    batch_size = batch_size or max(1, _PERMUTATION_BUFFER_CELLS // max(n_rows * n_features, 1))
+
+    rng = _check_random_state(random_state)
+    seeds = rng.randint(np.iinfo(np.int32).max, size=n_features)
+    n_workers = n_jobs if n_jobs > 0 else max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    chunks = [chunk for chunk in np.array_split(np.arange(n_features), min(n_workers, n_features)) if len(chunk)]
+
+    baseline_score = scorer(model, X, y)
+    with shared_arrays(X, y) as (X_shared, y_shared):
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_permutation_importance_chunk)(model, X_shared, y_shared, scorer, chunk, seeds[chunk], n_repeats,
+                                                   batch_size)
+            for chunk in chunks)
+
+    importances = baseline_score - np.concatenate(scores)
+    return OrderedDict([('importances_mean', importances.mean(axis=1)), ('importances_std', importances.std(axis=1)),
+                        ('importances', importances), ('baseline_score', baseline_score)])
+
+def get_streaming_metrics(model, batches, metrics=('accuracy',), labels=(0, 1), n_bins=1000):
+    """Get a dictionary of calculated metrics from an iterator of data chunks, so memory is
+    bounded by the chunk size rather than the size of the data. See :class:`MetricAccumulator`
+    
+    Arguments:
+        model {sklearn Estimator} -- A fitted sklearn estimator
+        batches {iterable((X_chunk, y_chunk))} -- chunks of data features and classes
+    
+    Keyword Arguments:
+        metrics {list(str or function)} -- confusion-matrix metrics to calculate, and/or 'roc_auc' (default: {('accuracy',)})
+        labels {array-like} -- every class label that can occur. With more than two, confusion-matrix metrics
+        are macro-averaged one-vs-rest and accuracy is the overall accuracy (default: {(0, 1)})
+        n_bins {int} -- number of score histogram bins used for 'roc_auc' (default: {1000})
+    
+    Returns:
+        dict -- metric name (str) -> score (float)
+    """
+
+    needs_scores = 'roc_auc' in metrics
+    count_metrics = [metric for metric in metrics if metric != 'roc_auc']
+    accumulator = MetricAccumulator(labels=labels, n_bins=n_bins)
+    for X_chunk, y_chunk in batches:
+        y_score = model.predict_proba(X_chunk)[:,1] if needs_scores else None
+        accumulator.update(y_chunk, model.predict(X_chunk), y_score=y_score)
+
+    scores = accumulator.scores(count_metrics)
+    metrics_dict = {}
+    for metric in metrics:
+        score = accumulator.roc_auc() if metric == 'roc_auc' else scores[_count_metric_name(metric)]
+        metrics_dict[getattr(metric, '__name__', metric)] = score
+        print("%s\t%s" %(getattr(metric, '__name__', metric), score))
+
+    return metrics_dict
+
+def plot_roc(model, X_test, Y_test, verbose=False, show_plot=True, cache=None, output=None, figure_path=None):
     """Diplays the roc curve given the model and test data
     
     Arguments:
@@ -210,8 +1621,17 @@ def plot_roc(model, X_test, Y_test, verbose=False, show_plot=True):
     
     Keyword Arguments:
         verbose {bool} -- [If true, diplays optional classification information and raw data] (default: {False})
+        cache {PredictionCache} -- cache shared with other calls on the same model and data (default: {None})
+        output {str} -- file to write the returned tables to, see :func:`write_results` (default: {None})
+        figure_path {str} -- PNG or SVG file to render the curve to without pyplot (default: {None})
+    
+    Returns:
+        dict -- 'probabilities' table (y_true, y_pred, y_score) and 'roc' table (fpr, tpr, thresholds)
     """
 
+    from sklearn.metrics import classification_report, roc_curve
+
+    model = (cache if cache is not None else PredictionCache()).wrap(model)
     y_true, y_pred = Y_test, model.predict(X_test)
     if verbose:
         print("CLASSIFICATION REPORT")
@@ -219,63 +1639,171 @@ def plot_roc(model, X_test, Y_test, verbose=False, show_plot=True):
 
     y_pred_prob = model.predict_proba(X_test)[:,1]
 
-    fpr, tpr, _ = roc_curve(Y_test, y_pred_prob)
+    fpr, tpr, thresholds = roc_curve(Y_test, y_pred_prob)
 
     if verbose:
         print("TESTING PROBABILITIES:")
-        for a,b in zip(Y_test,y_pred_prob):
-            print(a,b)
+        _print_rows(Y_test, y_pred_prob)
     
     if show_plot:
-        plt.plot([0,1],[0,1], 'k--')
-        plt.plot(fpr, tpr, label='Linear SVC')
-        plt.xlabel('False Positive Rate')
-        plt.ylabel('True Positive Rate')
-        plt.title('Linear SVC ROC Curve')
-        plt.show(block=False)
+        with profiling.phase('plot', 'roc'):
+            from mlexp.render import draw_roc
+            plt = _pyplot()
+            draw_roc(plt.gca(), fpr, tpr)
+            plt.show(block=False)
+    if figure_path is not None:
+        with profiling.phase('plot', 'roc'):
+            from mlexp.render import figure_roc, save_figure
+            save_figure(figure_roc(fpr, tpr), figure_path)
     
     if verbose:
         print("ROC RAW DATA:")
-        for a,b in zip(fpr, tpr):
-            print(a,b)
+        _print_rows(fpr, tpr)
+
+    results = OrderedDict([
+        ('probabilities', OrderedDict([('y_true', np.asarray(Y_test)), ('y_pred', np.asarray(y_pred)), ('y_score', y_pred_prob)])),
+        ('roc', OrderedDict([('fpr', fpr), ('tpr', tpr), ('thresholds', thresholds)])),
+    ])
+    if output is not None:
+        write_results(results, output)
+    return results
+
+def _coefficient_row(coef, class_index):
+    """ Returns one row of a coefficient vector or matrix as (values, feature indices, number of features).
+    Sparse rows only return their stored entries """
+
+    shape = coef.shape
+    n_rows = 1 if len(shape) == 1 else shape[0]
+    if class_index is None:
+        if n_rows != 1:
+            raise ValueError("coef has %d rows (one per class). Pick one with class_index, or use "
+                             "per_class_top_coefficients" % n_rows)
+        class_index = 0
+    if hasattr(coef, 'tocsr'):
+        row = coef.tocsr()[class_index:class_index + 1]
+        return np.asarray(row.data), np.asarray(row.indices), shape[-1]
+    values = coef if len(shape) == 1 else coef[class_index]
+    return values, None, shape[-1]
+
+def _smallest(values, k):
+    """ Positions of the k smallest values in ascending order of value, with a partial sort """
+
+    if k >= len(values):
+        return np.argsort(values, kind='mergesort')
+    positions = np.argpartition(values, k - 1)[:k]
+    return positions[np.argsort(values[positions], kind='mergesort')]
+
+def top_coefficients(coef, top_features=20, class_index=None):
+    """ Selects the most negative and most positive coefficients with a partial sort instead of sorting
+    all of them. Sparse coefficients (scipy matrices) are never densified: only their stored entries,
+    plus as many implicit zeros as could make the top, are ranked
+    
+    Arguments:
+        coef {array-like, sparse matrix or fitted linear model} -- coefficient vector, or one row per class
+    
+    Keyword Arguments:
+        top_features {int} -- number of features to select at each end (default: {20})
+        class_index {int} -- row of a multi-class coefficient matrix to rank (default: {None} - the only row)
+    
+    Returns:
+        tuple -- (feature indices, coefficients): the `top_features` most negative coefficients then the
+        `top_features` most positive ones, both in ascending order. Pass `np.asarray(feature_names)[indices]`
+        and the coefficients to :func:`print_feature_importance`
+    """
+
+    coef = getattr(coef, 'coef_', coef)
+    if not hasattr(coef, 'tocsr'):
+        coef = np.asarray(coef)
+    values, indices, n_features = _coefficient_row(coef, class_index)
+    values = np.asarray(values, dtype=float)
 
-def plot_coefficients(classifier, feature_names, top_features=20, show_plot=True):
+    if indices is not None:
+        # the lowest unstored features stand in for every implicit zero that could make the top
+        n_zeros = min(top_features, n_features - len(indices))
+        zeros = np.setdiff1d(np.arange(len(indices) + n_zeros), indices)[:n_zeros]
+        values = np.concatenate([values, np.zeros(n_zeros)])
+        indices = np.concatenate([indices, zeros])
+    else:
+        indices = np.arange(len(values))
+
+    negative = _smallest(values, top_features)
+    positive = _smallest(-values, top_features)[::-1]
+    selected = np.concatenate([negative, positive])
+    return indices[selected], values[selected]
+
+def per_class_top_coefficients(coef, top_features=20):
+    """ Runs :func:`top_coefficients` for every row (class) of a coefficient matrix
+    
+    Arguments:
+        coef {array-like, sparse matrix or fitted linear model} -- coefficients, one row per class
+    
+    Keyword Arguments:
+        top_features {int} -- number of features to select at each end (default: {20})
+    
+    Returns:
+        list(tuple) -- (feature indices, coefficients) of every class
+    """
+
+    coef = getattr(coef, 'coef_', coef)
+    if not hasattr(coef, 'tocsr'):
+        coef = np.atleast_2d(np.asarray(coef))
+    return [top_coefficients(coef, top_features, class_index) for class_index in range(coef.shape[0])]
+
+def plot_coefficients(classifier, feature_names, top_features=20, show_plot=True, class_index=None, figure_path=None):
     """Creates a barplot of the top most important features
     
     Arguments:
-        classifier {sklearn estimator} -- fitted estimator
+        classifier {sklearn estimator or array-like} -- fitted linear estimator, or its (possibly sparse) coefficients
         feature_names {array-like(str)} -- list of names of the features to display in plot
     
     Keyword Arguments:
         top_features {int} -- The number of features to display on chart (default: {20})
+        class_index {int} -- class to plot for multi-class coefficients (default: {None})
+        figure_path {str} -- PNG or SVG file to render the plot to without pyplot (default: {None})
+    
+    Returns:
+        tuple -- (feature indices, coefficients) of the plotted features, see :func:`top_coefficients`
     """
 
-    coef = classifier.coef_.ravel()
-    top_positive_coefficients = np.argsort(coef)[-top_features:]
-    top_negative_coefficients = np.argsort(coef)[:top_features]
-    top_coefficients = np.hstack([top_negative_coefficients, top_positive_coefficients])
+    top_indices, top_values = top_coefficients(classifier, top_features, class_index)
+    top_names = np.asarray(feature_names)[top_indices]
     if show_plot:
-        # create plot
-        plt.figure(figsize=(15, 5))
-        colors = ['red' if c < 0 else 'blue' for c in coef[top_coefficients]]
-        plt.bar(np.arange(2 * top_features), coef[top_coefficients], color=colors)
-        feature_names = np.array(feature_names)
-        plt.xticks(np.arange(1, 1 + 2 * top_features), feature_names[top_coefficients], rotation=60, ha='right')
-        plt.show()
-
-def print_feature_importance(feature_names, coefs):
+        with profiling.phase('plot', 'coefficients'):
+            from mlexp.render import draw_coefficients
+            # create plot
+            plt = _pyplot()
+            plt.figure(figsize=(15, 5))
+            draw_coefficients(plt.gca(), top_values, top_names)
+            plt.show()
+    if figure_path is not None:
+        with profiling.phase('plot', 'coefficients'):
+            from mlexp.render import figure_coefficients, save_figure
+            save_figure(figure_coefficients(top_values, top_names), figure_path)
+    return top_indices, top_values
+
+def print_feature_importance(feature_names, coefs, output=None):
     """Helper method to pair and print feature name/important
     
     Arguments:
         feature_names {array-like(str)} -- feature names
         coefs {array-like(float)} -- feature coeficients
+    
+    Keyword Arguments:
+        output {str} -- file to also write the table to, see :func:`write_results` (default: {None})
+    
+    Returns:
+        OrderedDict -- table with 'feature' and 'coefficient' columns
     """
 
     assert len(feature_names) == len(coefs), "Arrays have difference lengths. Something went wrong"
-    for feature, coef in zip(feature_names, coefs):
-        print("%s\t%s" %(feature, coef))
+    table = OrderedDict([('feature', np.asarray(feature_names)), ('coefficient', np.asarray(coefs))])
+    _print_rows(table['feature'], table['coefficient'], separator='\t')
+    if output is not None:
+        write_results(table, output)
+    return table
 
-def plot_confusion_matrix(cm, classes=[0,1], normalize=False, title='Confusion matrix', print_matrix=False, show_plot=True):
+def plot_confusion_matrix(cm, classes=[0,1], normalize=False, title='Confusion matrix', print_matrix=False, show_plot=True,
+                          figure_path=None):
     """This function prints and plots the confusion matrix.
     Normalization can be applied by setting `normalize=True`.
     
@@ -287,6 +1815,8 @@ def plot_confusion_matrix(cm, classes=[0,1], normalize=False, title='Confusion m
         normalize {bool} -- should the confusion matrix be normalized (default: {False})
         title {str} -- plot title (default: {'Confusion matrix'})
         print_matrix {bool} -- should the raw confusion matrix be printed (default: {False})
+        figure_path {str} -- PNG or SVG file to render the matrix to without pyplot. Large matrices are
+        drawn with fewer annotations, see :func:`mlexp.render.draw_confusion_matrix` (default: {None})
     """
 
     if normalize:
@@ -299,25 +1829,19 @@ def plot_confusion_matrix(cm, classes=[0,1], normalize=False, title='Confusion m
         print(cm)
 
     if show_plot:
-        plt.imshow(cm, interpolation='nearest')
-        plt.title(title)
-        plt.colorbar()
-        tick_marks = np.arange(len(classes))
-        plt.xticks(tick_marks, classes, rotation=45)
-        plt.yticks(tick_marks, classes)
-
-        fmt = '.2f' if normalize else 'd'
-        thresh = cm.max() / 2.
-        for i, j in itertools.product(range(cm.shape[0]), range(cm.shape[1])):
-            plt.text(j, i, format(cm[i, j], fmt),
-                    horizontalalignment="center",
-                    color="white" if cm[i, j] > thresh else "black")
-
-        plt.ylabel('True label')
-        plt.xlabel('Predicted label')
-        plt.tight_layout()
-
-def grid_search_optimization(pipeline, parameters_to_tune, X, y, Xh, yh, cv=5, scoring='accuracy', verbose=False, n_jobs=-1):
+        with profiling.phase('plot', 'confusion_matrix'):
+            from mlexp.render import draw_confusion_matrix
+            plt = _pyplot()
+            draw_confusion_matrix(plt.gcf(), plt.gca(), cm, classes, title=title, normalize=normalize)
+            plt.tight_layout()
+    if figure_path is not None:
+        with profiling.phase('plot', 'confusion_matrix'):
+            from mlexp.render import figure_confusion_matrix, save_figure
+            save_figure(figure_confusion_matrix(cm, classes, title=title, normalize=normalize), figure_path)
+
+def grid_search_optimization(pipeline, parameters_to_tune, X, y, Xh, yh, cv=5, scoring='accuracy', verbose=False, n_jobs=-1,
+                             search='exhaustive', cache=None, shared_data=False, transformer_cache=None,
+                             transformer_cache_bytes=None, output=None, store=None, **search_params):
     """ Performs a grid-search optimization with cross validation with the provided hyperparameters
     and outputs a report
     
@@ -334,16 +1858,61 @@ def grid_search_optimization(pipeline, parameters_to_tune, X, y, Xh, yh, cv=5, s
         n_jobs {int} -- number of cores to use in optimization (-1 is all available) (default: {-1})
         scoring {str} -- name of scorer to use for optimization (default: {'accuracy'})
         verbose {bool} -- show additional information? (default: {False})
+        search {str} -- 'exhaustive' for sklearn's `GridSearchCV`, 'halving' for a budgeted search with
+        :func:`mlexp.search.successive_halving_search`, or 'path' for a warm-started walk along the
+        `C`/`alpha` grid with :func:`mlexp.search.regularization_path_search` (default: {'exhaustive'})
+        cache {SearchCache or str} -- on-disk store of (candidate, fold) scores, or its directory. Pairs found
+        in it are loaded instead of refit, so interrupted or extended searches resume. Not supported by 'path'
+        (default: {None})
+        shared_data {bool} -- back X and y with memory-mapped files that all workers read in place instead of
+        receiving copies (see :mod:`mlexp.parallel`), and report the peak RSS of every worker (default: {False})
+        transformer_cache {bool or str} -- memoize the fitted transformers of each CV fold, so candidates that
+        only change later steps don't refit them. True for a temporary cache, or a directory that keeps it
+        across searches (see :func:`mlexp.search.cached_transformers`) (default: {None})
+        transformer_cache_bytes {int or str} -- size the transformer cache is kept under during the search, e.g. '1G'
+        (default: {None} - unlimited)
+        output {str} -- file to write a 'grid_scores' table (mean/std score and params of every candidate) and a
+        'training_probabilities' table of the best estimator to, see :func:`write_results` (default: {None})
+        store {ExperimentStore or str} -- experiment store (or its database file) to log every candidate to as a
+        run with its fold scores and timings, plus the holdout scores when verbose, see :mod:`mlexp.store` (default: {None})
+        search_params -- extra keyword arguments of the search, e.g. `factor` or `time_budget` for 'halving'
     
     Returns:
         [sklearn estimator] -- fitted pipeline
     """
 
+    from sklearn.metrics import classification_report
+
     print("# Tuning hyper-parameters for %s" %scoring)
     print()
 
-    clf = GridSearchCV(pipeline, parameters_to_tune, cv=cv, n_jobs = n_jobs, scoring=scoring, verbose=verbose)
-    clf.fit(X, y)
+    with contextlib.ExitStack() as stack:
+        if transformer_cache:
+            from mlexp.search import cached_transformers
+            location = transformer_cache if isinstance(transformer_cache, str) else None
+            pipeline = stack.enter_context(cached_transformers(pipeline, location, transformer_cache_bytes))
+
+        if shared_data:
+            from mlexp.parallel import PeakRSSScorer, read_peak_rss, shared_arrays
+            from sklearn.metrics import check_scoring
+
+            with shared_arrays(X, y) as (X_shared, y_shared), tempfile.TemporaryDirectory(prefix='mlexp-rss-') as rss_dir:
+                scorer = PeakRSSScorer(check_scoring(pipeline, scoring=scoring), rss_dir)
+                clf = _run_search(pipeline, parameters_to_tune, X_shared, y_shared, cv, scorer, verbose, n_jobs, search,
+                                  cache, search_params)
+                clf.worker_peak_rss_ = read_peak_rss(rss_dir)
+            # the report directory is gone, so the result scores with the plain scorer
+            clf.scorer_ = scorer.scorer
+            print("Peak RSS per worker (MB):")
+            for pid in sorted(clf.worker_peak_rss_):
+                print("%s\t%0.1f" %(pid, clf.worker_peak_rss_[pid] / 2.0**20))
+            print()
+        else:
+            clf = _run_search(pipeline, parameters_to_tune, X, y, cv, scoring, verbose, n_jobs, search, cache, search_params)
+
+        if transformer_cache:
+            # the refit pipeline must not keep pointing at a temporary cache
+            clf.best_estimator_.set_params(memory=None)
 
     print("Best parameters set found on development set:")
     print()
@@ -365,15 +1934,66 @@ def grid_search_optimization(pipeline, parameters_to_tune, X, y, Xh, yh, cv=5, s
         print("The model is trained on the full development set.")
         print("The scores are computed on the full evaluation set.")
         print()
-        y_true, y_pred = yh, clf.predict(Xh)
+        prediction_cache = PredictionCache()
+        best_estimator = prediction_cache.wrap(clf.best_estimator_)
+        y_true, y_pred = yh, best_estimator.predict(Xh)
         print(classification_report(y_true, y_pred))
         print()
-        plot_confusion_matrix(confusion_matrix(y_true, y_pred)) 
+        plot_confusion_matrix(get_confusion_matrix(y_true, y_pred)) 
         print()
-        get_metrics(clf.best_estimator_, Xh, yh)
+        get_metrics(clf.best_estimator_, Xh, yh, cache=prediction_cache, store=store)
     
         print("TRAINNG PROBABILITIES")
-        for a,b in zip(y, clf.predict_proba(X)[:,1]):
-            print(a,b)
-    
-    return clf
\ No newline at end of file
+        _print_rows(y, best_estimator.predict_proba(X)[:,1])
+
+    if output is not None:
+        tables = OrderedDict([('grid_scores', OrderedDict([
+            ('mean_test_score', clf.cv_results_['mean_test_score']),
+            ('std_test_score', clf.cv_results_['std_test_score']),
+            ('params', np.array([repr(params) for params in clf.cv_results_['params']])),
+        ]))])
+        if hasattr(clf.best_estimator_, 'predict_proba'):
+            y_score = (best_estimator if verbose else clf.best_estimator_).predict_proba(X)[:,1]
+            tables['training_probabilities'] = OrderedDict([('y_true', np.asarray(y)), ('y_score', y_score)])
+        write_results(tables, output)
+
+    if store is not None:
+        from mlexp.store import opened_store
+        with opened_store(store) as opened:
+            opened.log_search(clf, scoring=scoring if isinstance(scoring, str) else 'score')
+
+    return clf
+
+def _run_search(pipeline, parameters_to_tune, X, y, cv, scoring, verbose, n_jobs, search, cache, search_params):
+    """ Runs the search picked in :func:`grid_search_optimization` and returns the fitted search object.
+    The search and its fits are recorded to the active profiler, if any (see :mod:`mlexp.profiling`) """
+
+    with profiling.phase('search', search):
+        clf = _fit_search(pipeline, parameters_to_tune, X, y, cv, scoring, verbose, n_jobs, search, cache, search_params)
+    profiling.record_search(clf)
+    return clf
+
+def _fit_search(pipeline, parameters_to_tune, X, y, cv, scoring, verbose, n_jobs, search, cache, search_params):
+
+    from sklearn.model_selection import GridSearchCV
+    from mlexp.search import SearchCache, cached_grid_search, regularization_path_search, successive_halving_search
+
+    if search == 'path' and cache is not None:
+        # warm-started fits depend on the previous point of the path, so they can't be cached one by one
+        raise ValueError("cache is not supported by the 'path' search")
+    if cache is not None and not isinstance(cache, SearchCache):
+        cache = SearchCache(cache)
+
+    if search == 'exhaustive' and cache is not None:
+        return cached_grid_search(pipeline, parameters_to_tune, X, y, cache, cv=cv, scoring=scoring, n_jobs=n_jobs,
+                                  verbose=verbose, **search_params)
+    elif search == 'exhaustive':
+        clf = GridSearchCV(pipeline, parameters_to_tune, cv=cv, n_jobs = n_jobs, scoring=scoring, verbose=verbose, **search_params)
+        return clf.fit(X, y)
+    elif search == 'halving':
+        return successive_halving_search(pipeline, parameters_to_tune, X, y, cv=cv, scoring=scoring, n_jobs=n_jobs,
+                                         cache=cache, verbose=verbose, **search_params)
+    elif search == 'path':
+        return regularization_path_search(pipeline, parameters_to_tune, X, y, cv=cv, scoring=scoring, n_jobs=n_jobs,
+                                          verbose=verbose, **search_params)
+    raise ValueError("Unknown search %r. Use 'exhaustive', 'halving' or 'path'" % search)
@@ -0,0 +1,117 @@
+"""
+The :mod:`mlexp.parallel` module shares large arrays with worker processes through memory-mapped
+files, so that every worker reads the same pages in place instead of receiving a pickled copy.
+joblib passes memory-mapped arrays to its workers by file name.
+"""
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+def _shared_memory_folder():
+    """ Returns /dev/shm when it's usable, so the mapped files live in memory rather than on disk """
+
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return None
+
+def memmap_array(array, path):
+    """ Writes an array to a .npy file and maps it back read-only. Arrays that are already
+    memory-mapped, DataFrames (whose column names pipelines may rely on) and object arrays
+    are returned unchanged
+
+    Arguments:
+        array {array-like} -- data to share
+        path {str} -- .npy file to write
+
+    Returns:
+        array-like -- read-only memory-mapped array, or the input
+    """
+
+    if isinstance(array, np.memmap) or hasattr(array, 'iloc'):
+        return array
+    values = np.asarray(array)
+    if values.dtype.hasobject:
+        return array
+    np.save(path, values)
+    return np.load(path, mmap_mode='r')
+
+@contextlib.contextmanager
+def shared_arrays(*arrays, **kwargs):
+    """ Context manager that backs arrays with memory-mapped files for the duration of a parallel job.
+    The files are removed on exit
+
+        with shared_arrays(X, y) as (X_shared, y_shared):
+            Parallel(n_jobs=-1)(delayed(work)(X_shared, y_shared) for ...)
+
+    Arguments:
+        arrays {array-like} -- data to share
+
+    Keyword Arguments:
+        folder {str} -- where to write the files (default: {None} - /dev/shm if available, else the temp folder)
+
+    Returns:
+        list -- the memory-mapped arrays, in the order given
+    """
+
+    folder = kwargs.pop('folder', None) or _shared_memory_folder()
+    directory = tempfile.mkdtemp(prefix='mlexp-', dir=folder)
+    try:
+        yield [memmap_array(array, os.path.join(directory, '%d.npy' % i)) for i, array in enumerate(arrays)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def peak_rss():
+    """ Returns the peak resident set size of the current process in bytes, or None where the
+    `resource` module isn't available (Windows) """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class PeakRSSScorer(object):
+    """ Wraps a scorer so that every call also records the peak RSS of the process it runs in, in
+    one file per process id under `report_dir`. Since CV workers score every fold they fit, this
+    reports the peak memory of each worker. See :func:`read_peak_rss`
+
+    Arguments:
+        scorer {callable} -- scorer(estimator, X, y)
+        report_dir {str} -- directory the workers write to
+    """
+
+    def __init__(self, scorer, report_dir):
+        self.scorer = scorer
+        self.report_dir = report_dir
+
+    def __call__(self, estimator, X, y, **kwargs):
+        score = self.scorer(estimator, X, y, **kwargs)
+        rss = peak_rss()
+        if rss is not None:
+            # the peak only grows, so the last write of a process is its maximum
+            with open(os.path.join(self.report_dir, '%d.rss' % os.getpid()), 'w') as report:
+                report.write(str(rss))
+        return score
+
+def read_peak_rss(report_dir):
+    """ Reads the peak RSS recorded by :class:`PeakRSSScorer`
+
+    Arguments:
+        report_dir {str} -- directory the workers wrote to
+
+    Returns:
+        dict -- process id (int) -> peak RSS in bytes (int)
+    """
+
+    peaks = {}
+    for name in os.listdir(report_dir):
+        if name.endswith('.rss'):
+            with open(os.path.join(report_dir, name)) as report:
+                peaks[int(name[:-len('.rss')])] = int(report.read())
+    return peaks
@@ -0,0 +1,218 @@
+"""
+The :mod:`mlexp.profiling` module implements opt-in timing and memory instrumentation of the
+evaluation functions in :mod:`mlexp.nbutils`. Nothing is recorded unless a :class:`Profiler`
+is active:
+
+    with profile() as profiler:
+        grid_search_optimization(pipeline, parameters_to_tune, X, y, Xh, yh, verbose=True)
+    profiler.print_summary()
+
+Instrumented phases are 'search' (the whole search), 'fit' (every candidate/fold fit, read
+from the search results since they run in worker processes), 'refit', 'score' (every scorer),
+'predict' (every predict/predict_proba/decision_function call that isn't cached) and 'plot'.
+"""
+from collections import OrderedDict, namedtuple
+import contextlib
+import os
+import sys
+import time
+
+import numpy as np
+
+from mlexp.parallel import peak_rss
+
+PhaseEvent = namedtuple('PhaseEvent', ['phase', 'name', 'wall_time', 'cpu_time', 'peak_memory', 'pid'])
+PhaseEvent.__doc__ = """ Record of one instrumented phase. `cpu_time` (seconds) and `peak_memory` (bytes) are
+None, like `pid`, for phases measured in other processes, e.g. the fits of a parallel search """
+
+class Profiler(object):
+    """ Collects :class:`PhaseEvent` records and passes every one of them to its hooks as it is recorded.
+    Peak memory is the process peak RSS at the end of the phase, or with `trace_memory` the peak
+    of the Python allocations made during the phase (through `tracemalloc`, which slows them down)
+
+    Keyword Arguments:
+        hooks {list(callable)} -- functions called with every event, e.g. a logger (default: {None})
+        trace_memory {bool} -- measure the peak allocations of each phase rather than of the process (default: {False})
+    """
+
+    def __init__(self, hooks=None, trace_memory=False):
+        self.hooks = list(hooks or [])
+        self.trace_memory = trace_memory
+        self.events = []
+        # traced peak of each open phase from before its last nested phase reset the tracemalloc peak
+        self._outer_peaks = []
+
+    def add_hook(self, hook):
+        """ Calls `hook(event)` for every event recorded from now on """
+
+        self.hooks.append(hook)
+
+    def record(self, phase, name, wall_time, cpu_time=None, peak_memory=None, pid=None):
+        """ Records a phase measured elsewhere
+
+        Arguments:
+            phase {str} -- kind of phase, e.g. 'fit'
+            name {str} -- what ran in the phase, e.g. the candidate parameters
+            wall_time {float} -- elapsed seconds
+
+        Keyword Arguments:
+            cpu_time {float} -- CPU seconds (default: {None})
+            peak_memory {int} -- peak memory in bytes (default: {None})
+            pid {int} -- process the phase ran in (default: {None} - unknown)
+
+        Returns:
+            PhaseEvent -- the recorded event
+        """
+
+        event = PhaseEvent(phase, name, wall_time, cpu_time, peak_memory, pid)
+        self.events.append(event)
+        for hook in self.hooks:
+            hook(event)
+        return event
+
+    @contextlib.contextmanager
+    def phase(self, phase, name=None):
+        """ Context manager measuring the wall time, CPU time and peak memory of its body
+
+        Arguments:
+            phase {str} -- kind of phase, e.g. 'predict'
+
+        Keyword Arguments:
+            name {str} -- what runs in the phase, e.g. 'predict_proba' (default: {None})
+        """
+
+        if self.trace_memory:
+            import tracemalloc
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            start_memory, enclosing_peak = tracemalloc.get_traced_memory()
+            if self._outer_peaks:
+                # resetting the peak below would lose the enclosing phase's peak so far
+                self._outer_peaks[-1] = max(self._outer_peaks[-1], enclosing_peak)
+            self._outer_peaks.append(0)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall_time, cpu_time = time.perf_counter() - start_wall, time.process_time() - start_cpu
+            if self.trace_memory:
+                peak_memory = max(tracemalloc.get_traced_memory()[1], self._outer_peaks.pop()) - start_memory
+                if started_tracing:
+                    tracemalloc.stop()
+            else:
+                peak_memory = peak_rss()
+            self.record(phase, name, wall_time, cpu_time, peak_memory, pid=os.getpid())
+
+    def summary(self, n=10):
+        """ Aggregates the events by (phase, name), hottest first
+
+        Keyword Arguments:
+            n {int} -- number of rows to keep (default: {10} - None for all)
+
+        Returns:
+            OrderedDict -- table with 'phase', 'name', 'count', 'wall_time', 'mean_wall_time', 'cpu_time' and
+            'peak_memory' columns, sorted by total wall time
+        """
+
+        groups = OrderedDict()
+        for event in self.events:
+            groups.setdefault((event.phase, event.name), []).append(event)
+
+        rows = []
+        for (phase, name), events in groups.items():
+            wall_time = sum(event.wall_time for event in events)
+            cpu_times = [event.cpu_time for event in events if event.cpu_time is not None]
+            memories = [event.peak_memory for event in events if event.peak_memory is not None]
+            rows.append((phase, name, len(events), wall_time, wall_time / len(events),
+                         sum(cpu_times) if cpu_times else np.nan, max(memories) if memories else np.nan))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        rows = rows[:n] if n is not None else rows
+
+        columns = ['phase', 'name', 'count', 'wall_time', 'mean_wall_time', 'cpu_time', 'peak_memory']
+        return OrderedDict((column, [row[i] for row in rows]) for i, column in enumerate(columns))
+
+    def print_summary(self, n=10):
+        """ Prints :meth:`summary` as a tab separated table, memory in MB """
+
+        table = self.summary(n)
+        lines = ["phase\tname\tcount\twall (s)\tmean wall (s)\tcpu (s)\tpeak memory (MB)"]
+        for row in zip(*table.values()):
+            phase, name, count, wall_time, mean_wall_time, cpu_time, peak_memory = row
+            lines.append("%s\t%s\t%d\t%0.4f\t%0.4f\t%0.4f\t%0.1f" % (phase, name, count, wall_time, mean_wall_time,
+                                                                    cpu_time, peak_memory / 2.0**20))
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+# the profiler phases are recorded to, if any
+_active_profiler = None
+
+@contextlib.contextmanager
+def profile(hooks=None, trace_memory=False):
+    """ Context manager that activates a :class:`Profiler` for its body, so the instrumented
+    nbutils functions record their phases to it
+
+    Keyword Arguments:
+        hooks {list(callable)} -- functions called with every event (default: {None})
+        trace_memory {bool} -- see :class:`Profiler` (default: {False})
+
+    Returns:
+        Profiler -- the active profiler
+    """
+
+    global _active_profiler
+    previous = _active_profiler
+    _active_profiler = Profiler(hooks=hooks, trace_memory=trace_memory)
+    try:
+        yield _active_profiler
+    finally:
+        _active_profiler = previous
+
+def active_profiler():
+    """ Returns the profiler activated by :func:`profile`, or None """
+
+    return _active_profiler
+
+@contextlib.contextmanager
+def _no_phase():
+    yield
+
+def phase(phase, name=None):
+    """ Measures its body as a phase of the active profiler, and does nothing if there is none
+
+        with phase('plot', 'roc'):
+            ...
+    """
+
+    if _active_profiler is None:
+        return _no_phase()
+    return _active_profiler.phase(phase, name)
+
+def record_search(search):
+    """ Records the candidate/fold fit times and refit time of a fitted search (`GridSearchCV` or a
+    :mod:`mlexp.search` result) to the active profiler. The fits ran in worker processes, so only
+    their wall time is known; searches that only report a mean fit time per candidate give one
+    event per candidate (or row, for successive halving) with the mean times its number of folds
+
+    Arguments:
+        search {fitted search} -- search with `cv_results_`
+    """
+
+    if _active_profiler is None:
+        return
+    cv_results = search.cv_results_
+    splits = sorted(int(key[len('split'):-len('_fit_time')]) for key in cv_results
+                    if key.startswith('split') and key.endswith('_fit_time'))
+    n_splits = len([key for key in cv_results if key.startswith('split') and key.endswith('_test_score')])
+    for candidate, params in enumerate(cv_results['params']):
+        if splits:
+            for split in splits:
+                _active_profiler.record('fit', '%r (fold %d)' % (params, split),
+                                        float(cv_results['split%d_fit_time' % split][candidate]))
+        elif 'mean_fit_time' in cv_results:
+            # successive halving evaluates each row on its own number of folds
+            n_folds = cv_results['n_folds'][candidate] if 'n_folds' in cv_results else max(n_splits, 1)
+            _active_profiler.record('fit', repr(params), float(cv_results['mean_fit_time'][candidate]) * n_folds)
+    if getattr(search, 'refit_time_', None) is not None:
+        _active_profiler.record('refit', repr(search.best_params_), search.refit_time_)
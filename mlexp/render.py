@@ -0,0 +1,254 @@
+"""
+The :mod:`mlexp.render` module draws the figures of :mod:`mlexp.nbutils` onto explicit matplotlib
+Figure objects instead of the global pyplot state, so they can be rendered headless and in
+parallel, e.g. for batch reports:
+
+    with BatchRenderer(n_workers=8) as renderer:
+        for name, model in models.items():
+            fpr, tpr, _ = roc_curve(y, model.predict_proba(X)[:,1])
+            renderer.submit('%s_roc.png' % name, figure_roc, fpr, tpr)
+
+The `draw_*` functions draw onto given axes and are also what the pyplot functions in
+:mod:`mlexp.nbutils` use. matplotlib is imported on first use.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+
+import numpy as np
+
+# confusion matrices with more cells than this only annotate their diagonal, and matrices with
+# more classes than this aren't annotated at all: one text artist per cell dominates the drawing time
+MAX_ANNOTATIONS = 400
+
+# at most this many class names are written along each axis of a confusion matrix
+MAX_TICK_LABELS = 50
+
+def new_figure(figsize=None):
+    """ Creates a figure with its own Agg canvas, outside of pyplot
+
+    Keyword Arguments:
+        figsize {tuple(float)} -- width and height in inches (default: {None} - matplotlib's default)
+
+    Returns:
+        matplotlib Figure -- figure that can be saved with `savefig`
+    """
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+def draw_roc(ax, fpr, tpr, label='Linear SVC', title='Linear SVC ROC Curve'):
+    """ Draws a ROC curve and the chance diagonal
+
+    Arguments:
+        ax {matplotlib Axes} -- axes to draw on
+        fpr {array-like(float)} -- false positive rates
+        tpr {array-like(float)} -- true positive rates
+
+    Keyword Arguments:
+        label {str} -- legend label of the curve (default: {'Linear SVC'})
+        title {str} -- axes title (default: {'Linear SVC ROC Curve'})
+    """
+
+    ax.plot([0,1],[0,1], 'k--')
+    ax.plot(fpr, tpr, label=label)
+    ax.set_xlabel('False Positive Rate')
+    ax.set_ylabel('True Positive Rate')
+    ax.set_title(title)
+
+def draw_coefficients(ax, values, names):
+    """ Draws a bar per coefficient, red for negative and blue for positive ones
+
+    Arguments:
+        ax {matplotlib Axes} -- axes to draw on
+        values {array-like(float)} -- coefficients, e.g. from :func:`mlexp.nbutils.top_coefficients`
+        names {array-like(str)} -- feature name of every coefficient
+    """
+
+    values = np.asarray(values)
+    positions = np.arange(len(values))
+    ax.bar(positions, values, color=np.where(values < 0, 'red', 'blue'))
+    ax.set_xticks(positions)
+    ax.set_xticklabels(names, rotation=60, ha='right')
+
+def _annotated_cells(n_classes, max_annotations):
+    """ Rows and columns of the cells of an n_classes x n_classes matrix that get a text annotation """
+
+    if n_classes * n_classes <= max_annotations:
+        rows, columns = np.divmod(np.arange(n_classes * n_classes), n_classes)
+        return rows, columns
+    if n_classes <= max_annotations:
+        diagonal = np.arange(n_classes)
+        return diagonal, diagonal
+    return np.array([], dtype=int), np.array([], dtype=int)
+
+def draw_confusion_matrix(figure, ax, cm, classes, title='Confusion matrix', normalize=False,
+                          max_annotations=MAX_ANNOTATIONS):
+    """ Draws a confusion matrix as an image with a colorbar. Small matrices annotate every cell with
+    its value; larger ones only their diagonal, or nothing, and thin out the class names
+
+    Arguments:
+        figure {matplotlib Figure} -- figure the colorbar is added to
+        ax {matplotlib Axes} -- axes to draw on
+        cm {numpy array} -- KxK confusion matrix, true classes in rows (already normalized if `normalize`)
+        classes {array-like} -- class names
+
+    Keyword Arguments:
+        title {str} -- axes title (default: {'Confusion matrix'})
+        normalize {bool} -- whether the matrix holds rates rather than counts (default: {False})
+        max_annotations {int} -- most cells to annotate (default: {MAX_ANNOTATIONS})
+    """
+
+    cm = np.asarray(cm)
+    image = ax.imshow(cm, interpolation='nearest')
+    ax.set_title(title)
+    figure.colorbar(image, ax=ax)
+
+    step = max(1, int(np.ceil(len(classes) / float(MAX_TICK_LABELS))))
+    tick_marks = np.arange(0, len(classes), step)
+    ax.set_xticks(tick_marks)
+    ax.set_xticklabels(np.asarray(classes)[tick_marks], rotation=45)
+    ax.set_yticks(tick_marks)
+    ax.set_yticklabels(np.asarray(classes)[tick_marks])
+
+    fmt = '.2f' if normalize else 'd'
+    thresh = cm.max() / 2.
+    rows, columns = _annotated_cells(cm.shape[0], max_annotations)
+    for i, j in zip(rows, columns):
+        ax.text(j, i, format(cm[i, j], fmt),
+                horizontalalignment="center",
+                color="white" if cm[i, j] > thresh else "black")
+
+    ax.set_ylabel('True label')
+    ax.set_xlabel('Predicted label')
+
+def figure_roc(fpr, tpr, **kwargs):
+    """ Returns a new figure with a ROC curve, see :func:`draw_roc` """
+
+    figure = new_figure()
+    draw_roc(figure.add_subplot(1, 1, 1), fpr, tpr, **kwargs)
+    return figure
+
+def figure_coefficients(values, names):
+    """ Returns a new figure with a coefficient bar plot, see :func:`draw_coefficients` """
+
+    figure = new_figure(figsize=(15, 5))
+    draw_coefficients(figure.add_subplot(1, 1, 1), values, names)
+    figure.tight_layout()
+    return figure
+
+def figure_confusion_matrix(cm, classes, **kwargs):
+    """ Returns a new figure with a confusion matrix, see :func:`draw_confusion_matrix` """
+
+    figure = new_figure()
+    draw_confusion_matrix(figure, figure.add_subplot(1, 1, 1), cm, classes, **kwargs)
+    figure.tight_layout()
+    return figure
+
+def save_figure(figure, path, dpi=None):
+    """ Writes a figure to a file, as PNG or SVG depending on the extension of path
+
+    Arguments:
+        figure {matplotlib Figure} -- figure to write
+        path {str} -- file to write
+
+    Keyword Arguments:
+        dpi {int} -- resolution of raster formats (default: {None} - the figure's)
+
+    Returns:
+        str -- path
+    """
+
+    figure.savefig(path, dpi=dpi)
+    return path
+
+def render_figure(path, figure_function, *args, **kwargs):
+    """ Builds a figure with `figure_function(*args, **kwargs)` and writes it to path
+
+    Returns:
+        str -- path
+    """
+
+    return save_figure(figure_function(*args, **kwargs), path)
+
+class BatchRenderer(object):
+    """ Background pool that builds and writes figures while the caller carries on. Every figure is
+    its own Figure object, so no global pyplot state is shared between workers. Threads suit most
+    reports, since drawing and PNG encoding partly release the GIL; processes scale further but
+    need picklable figure functions and arguments (e.g. the `figure_*` functions of this module)
+
+    Keyword Arguments:
+        n_workers {int} -- number of workers (default: {None} - the number of CPUs)
+        processes {bool} -- use worker processes rather than threads (default: {False})
+    """
+
+    def __init__(self, n_workers=None, processes=False):
+        n_workers = n_workers or os.cpu_count() or 1
+        self._executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=n_workers)
+        self.futures = []
+
+    def submit(self, path, figure_function, *args, **kwargs):
+        """ Queues a figure, see :func:`render_figure`
+
+        Returns:
+            Future -- resolves to the path once the file is written
+        """
+
+        future = self._executor.submit(render_figure, path, figure_function, *args, **kwargs)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """ Waits for every queued figure, raising the first error of any of them
+
+        Returns:
+            list(str) -- written paths, in submission order
+        """
+
+        return [future.result() for future in self.futures]
+
+    def close(self):
+        """ Waits for every queued figure and stops the workers
+
+        Returns:
+            list(str) -- written paths, in submission order
+        """
+
+        try:
+            return self.wait()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=False)
+
+def render_figures(jobs, n_workers=None, processes=False):
+    """ Renders many figures in parallel
+
+        render_figures([('roc.png', figure_roc, (fpr, tpr), {}),
+                        ('cm.svg', figure_confusion_matrix, (cm, classes), {'normalize': True})])
+
+    Arguments:
+        jobs {iterable(tuple)} -- (path, figure function, args, kwargs) of every figure
+
+    Keyword Arguments:
+        n_workers {int} -- number of workers (default: {None} - the number of CPUs)
+        processes {bool} -- use worker processes rather than threads (default: {False})
+
+    Returns:
+        list(str) -- written paths, in order
+    """
+
+    with BatchRenderer(n_workers=n_workers, processes=processes) as renderer:
+        for path, figure_function, args, kwargs in jobs:
+            renderer.submit(path, figure_function, *args, **kwargs)
+    return renderer.wait()
@@ -0,0 +1,597 @@
+"""
+The :mod:`mlexp.search` module implements the hyper-parameter search strategies that
+:func:`mlexp.nbutils.grid_search_optimization` offers besides sklearn's exhaustive `GridSearchCV`.
+"""
+import contextlib
+import functools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from joblib import Memory, Parallel, delayed, hash as joblib_hash
+from sklearn.base import clone, is_classifier
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, check_cv
+
+from mlexp.parallel import PeakRSSScorer
+
+def _as_indexable(X):
+    """ Returns X as something that can be indexed by rows (DataFrames are kept as is) """
+
+    return X if hasattr(X, 'iloc') else np.asarray(X)
+
+def _take(X, indices):
+    return X.iloc[indices] if hasattr(X, 'iloc') else X[indices]
+
+def _fit_and_score(pipeline, params, X, y, train, test, scorer):
+    """ Fits a clone of the pipeline with the candidate parameters on the training part of a fold
+    and scores it on the test part
+
+    Returns:
+        score {float} -- test score
+        fit_time {float} -- seconds spent fitting
+    """
+
+    estimator = clone(pipeline).set_params(**params)
+    start = time.time()
+    estimator.fit(_take(X, train), y[train])
+    fit_time = time.time() - start
+    return scorer(estimator, _take(X, test), y[test]), fit_time
+
+class SearchCache(object):
+    """ Persistent on-disk store of (candidate, fold) scores, so that a restarted or extended search
+    only fits the candidates and folds it hasn't seen. Entries are keyed by a content hash of the
+    pipeline definition, the candidate parameters, the scorer, the data and the fold indices, and are
+    written as soon as each fit finishes, so an interrupted search resumes where it stopped.
+    Once the store grows beyond `max_bytes`, the least recently used entries are evicted
+
+    Arguments:
+        directory {str} -- directory of the store, created if needed
+
+    Keyword Arguments:
+        max_bytes {int} -- size limit of the store (default: {None} - unlimited)
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def key(self, *parts):
+        """ Returns the content hash of the given parts (pipeline, parameters, fold indices, ...) """
+
+        return joblib_hash(parts)
+
+    def get(self, key):
+        """ Returns the stored result for a key, or None """
+
+        path = self._path(key)
+        try:
+            with open(path) as result_file:
+                result = json.load(result_file)
+            # reading counts as a use for the least-recently-used eviction
+            os.utime(path, None)
+            return result
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        """ Stores a JSON-serializable result for a key """
+
+        path = self._path(key)
+        temporary_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary_path, 'w') as result_file:
+            json.dump(result, result_file)
+        # atomic, so readers and concurrent workers never see a partial entry
+        os.replace(temporary_path, path)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def size(self):
+        """ Returns the number of bytes used by the stored results """
+
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """ Removes the least recently used results until the store fits in `max_bytes` """
+
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """ Removes every stored result """
+
+        for _, _, name in self._entries():
+            os.remove(os.path.join(self.directory, name))
+
+def _cached_fit_and_score(cache, key, pipeline, params, X, y, train, test, scorer):
+    """ :func:`_fit_and_score` that loads the result from the cache when it's there and stores it otherwise """
+
+    if cache is not None:
+        result = cache.get(key)
+        if result is not None:
+            return result['score'], result['fit_time'], True
+    score, fit_time = _fit_and_score(pipeline, params, X, y, train, test, scorer)
+    if cache is not None:
+        cache.put(key, {'score': float(score), 'fit_time': fit_time})
+    return score, fit_time, False
+
+def _key_scorer(scorer):
+    """ The scorer cache entries are keyed on: a :class:`mlexp.parallel.PeakRSSScorer` only adds memory
+    reports to the scores, in a report directory that changes every run, so it is keyed on the scorer it wraps """
+
+    return scorer.scorer if isinstance(scorer, PeakRSSScorer) else scorer
+
+def _key_pipeline(pipeline):
+    """ The pipeline definition cache entries are keyed on, without the `memory` set by :func:`cached_transformers`,
+    which only memoizes fits and (for a temporary memo) lives in a new directory every run """
+
+    pipeline = clone(pipeline)
+    if 'memory' in pipeline.get_params(deep=False):
+        pipeline.set_params(memory=None)
+    return pipeline
+
+class _FoldRunner(object):
+    """ Fits and scores (candidate, fold) pairs in parallel, going through a :class:`SearchCache` if there is one """
+
+    def __init__(self, pipeline, X, y, scorer, n_jobs, cache=None):
+        self.pipeline, self.y, self.scorer, self.n_jobs, self.cache = pipeline, y, scorer, n_jobs, cache
+        self.n_loaded = 0
+        if cache is not None:
+            self._static_key = cache.key(_key_pipeline(pipeline), _key_scorer(scorer), X, y)
+
+    def run(self, candidate_params, X, y, folds, rows=None):
+        """ Returns the (score, fit_time) of every (candidate, fold) pair, candidates varying fastest.
+        X and y are the data the folds split, and `rows` their positions in the full data (default: all of it) """
+
+        rows = np.arange(len(self.y)) if rows is None else rows
+        tasks = []
+        for train, test in folds:
+            for params in candidate_params:
+                key = None
+                if self.cache is not None:
+                    key = self.cache.key(self._static_key, params, rows[train], rows[test])
+                tasks.append(delayed(_cached_fit_and_score)(self.cache, key, self.pipeline, params, X, y, train, test, self.scorer))
+        results = Parallel(n_jobs=self.n_jobs)(tasks)
+        if self.cache is not None:
+            self.cache.evict()
+        self.n_loaded += sum(loaded for _, _, loaded in results)
+        return [(score, fit_time) for score, fit_time, _ in results]
+
+@contextlib.contextmanager
+def cached_transformers(pipeline, location=None, bytes_limit=None):
+    """ Context manager yielding a clone of the pipeline whose fitted transformer (and imblearn sampler)
+    steps are memoized on disk with the pipeline's `memory`. The memo is keyed by the step's parameters
+    and its training data, so within a search every CV fold fits its preprocessing once and candidates
+    that only change later steps reuse it. With `bytes_limit`, the memo is trimmed back to the limit after
+    every memoized fit, by the worker that made it, evicting the least recently used entries. A temporary
+    location is removed on exit
+
+        with cached_transformers(pipeline, bytes_limit='1G') as cached_pipeline:
+            GridSearchCV(cached_pipeline, parameters_to_tune).fit(X, y)
+
+    Arguments:
+        pipeline {sklearn or imblearn pipeline} -- unfitted pipeline
+
+    Keyword Arguments:
+        location {str} -- directory of the memo, kept for later searches (default: {None} - a temporary directory)
+        bytes_limit {int or str} -- size the memo is kept under during the search, e.g. '1G' (default: {None} - unlimited)
+
+    Returns:
+        sklearn or imblearn pipeline -- clone of the pipeline that uses the memo
+    """
+
+    if 'memory' not in pipeline.get_params(deep=False):
+        raise ValueError("%s has no memory to cache its transformers in" % type(pipeline).__name__)
+    temporary = location is None
+    location = tempfile.mkdtemp(prefix='mlexp-transformers-') if temporary else location
+    if bytes_limit is None:
+        memory = Memory(location, verbose=0)
+    else:
+        memory = _BoundedMemory(location, bytes_limit, verbose=0)
+    try:
+        yield clone(pipeline).set_params(memory=memory)
+    finally:
+        if temporary:
+            shutil.rmtree(location, ignore_errors=True)
+
+class _BoundedMemory(Memory):
+    """ joblib Memory that trims itself to `limit` bytes after every call it memoizes. The pipeline (and
+    this memory with it) is pickled to the search workers, so each worker trims right after its own fits
+    and the memo stays bounded while the search runs. A worker whose entry is evicted while it loads
+    it recomputes the step """
+
+    def __init__(self, location, limit, **kwargs):
+        Memory.__init__(self, location, **kwargs)
+        self.limit = limit
+
+    def cache(self, func=None, **kwargs):
+        if func is None:
+            return functools.partial(self.cache, **kwargs)
+        memoized = Memory.cache(self, func, **kwargs)
+
+        @functools.wraps(func)
+        def bounded(*args, **call_kwargs):
+            try:
+                return memoized(*args, **call_kwargs)
+            finally:
+                _reduce_memory_size(self, self.limit)
+        return bounded
+
+def _reduce_memory_size(memory, bytes_limit):
+    try:
+        memory.reduce_size(bytes_limit=bytes_limit)
+    except TypeError:
+        # joblib < 1.3 takes the limit in the constructor
+        memory.bytes_limit = bytes_limit
+        memory.reduce_size()
+
+class SearchResult(object):
+    """ Outcome of a search run by this module. Exposes the parts of `GridSearchCV`'s interface
+    that :func:`mlexp.nbutils.grid_search_optimization` reports on, and predicts with the best estimator
+
+    Arguments:
+        best_estimator {sklearn estimator} -- best candidate refit on all of the data
+        best_params {dict} -- parameters of the best candidate
+        best_score {float} -- mean cross-validated score of the best candidate
+        cv_results {dict(str -> array)} -- one entry per evaluated candidate, including 'params',
+        'mean_test_score' and 'std_test_score'
+        scorer {callable} -- scorer used to rank the candidates
+    """
+
+    def __init__(self, best_estimator, best_params, best_score, cv_results, scorer):
+        self.best_estimator_ = best_estimator
+        self.best_params_ = best_params
+        self.best_score_ = best_score
+        self.cv_results_ = cv_results
+        self.scorer_ = scorer
+
+    @property
+    def classes_(self):
+        return self.best_estimator_.classes_
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.best_estimator_.predict_proba(X)
+
+    def decision_function(self, X):
+        return self.best_estimator_.decision_function(X)
+
+    def score(self, X, y):
+        return self.scorer_(self.best_estimator_, X, y)
+
+def _undominated(candidates, fold_scores, n_keep, margin):
+    """ Drops the candidates whose upper confidence bound (mean + margin * standard error of their
+    fold scores) is below the lower bound of at least `n_keep` other candidates, as they can't
+    plausibly make the cut """
+
+    if len(candidates) <= n_keep:
+        return candidates
+    scores = [np.asarray(fold_scores[c]) for c in candidates]
+    means = np.array([s.mean() for s in scores])
+    errors = np.array([s.std() / np.sqrt(len(s)) for s in scores]) * margin
+    cutoff = np.sort(means - errors)[-n_keep]
+    return [c for c, upper in zip(candidates, means + errors) if upper >= cutoff]
+
+def successive_halving_search(pipeline, parameters_to_tune, X, y, cv=5, scoring='accuracy', n_jobs=-1, factor=3,
+                              resource='n_samples', min_resources=None, max_resources=None, prune_margin=2.0,
+                              time_budget=None, random_state=None, cache=None, verbose=False):
+    """ Searches the parameter grid with successive halving: every candidate is cross-validated on a
+    small budget of samples (or iterations), and only the best 1/`factor` of them go on to the next
+    round with `factor` times the budget. Within a round the folds are raced: after each fold,
+    candidates that are clearly dominated by the fold scores seen so far are not evaluated further
+
+    Arguments:
+        pipeline {sklearn pipeline} -- unfitted pipeline of transformations and estimator
+        parameters_to_tune {dict(named parameter(str) -> array-like (any))} -- parameter grid
+        X {array-like} -- data - features to fit
+        y {array-like} -- data - classes to fit
+
+    Keyword Arguments:
+        cv {int or cross-validation generator} -- number of cross-validation folds (default: {5})
+        scoring {str or callable} -- scorer to use for optimization (default: {'accuracy'})
+        n_jobs {int} -- number of cores to use (-1 is all available) (default: {-1})
+        factor {int} -- budget multiplier and inverse of the proportion of candidates kept per round (default: {3})
+        resource {str} -- 'n_samples', or the name of an integer parameter such as 'classifier__max_iter' (default: {'n_samples'})
+        min_resources {int} -- budget of the first round (default: {None} - chosen so the last round uses `max_resources`)
+        max_resources {int} -- budget of the last round (default: {None} - the number of samples; required for parameters)
+        prune_margin {float} -- standard errors a candidate must be behind by to be pruned mid-round,
+        None to disable pruning (default: {2.0})
+        time_budget {float} -- seconds after which no new folds are started. The best candidate so far
+        is refit on all of the data (default: {None} - no limit)
+        random_state {int} -- seed of the sample subsets (default: {None})
+        cache {SearchCache} -- store of already evaluated (candidate, fold) pairs (default: {None})
+        verbose {bool} -- print a line per round? (default: {False})
+
+    Returns:
+        SearchResult -- search result with the best candidate refit on all of the data
+    """
+
+    start_time = time.time()
+    candidates = list(ParameterGrid(parameters_to_tune))
+    scorer = check_scoring(pipeline, scoring=scoring)
+    X, y = _as_indexable(X), np.asarray(y)
+    # the last round, on the full budget, is left with at most `factor` candidates
+    n_rounds = max(int(np.ceil(np.log(len(candidates)) / np.log(factor) - 1e-9)), 1)
+    if resource == 'n_samples':
+        max_resources = max_resources or len(y)
+    elif max_resources is None:
+        raise ValueError("max_resources is required when the resource is a parameter (%s)" % resource)
+    if min_resources is None:
+        min_resources = max(max_resources // factor ** (n_rounds - 1), 1)
+        if resource == 'n_samples':
+            # every class needs a few samples per fold
+            n_splits = check_cv(cv, y, classifier=is_classifier(pipeline)).get_n_splits()
+            min_resources = min(max(min_resources, 2 * n_splits * len(np.unique(y))), max_resources)
+    sample_order = np.random.RandomState(random_state).permutation(len(y))
+    runner = _FoldRunner(pipeline, X, y, scorer, n_jobs, cache=cache)
+
+    rows = []
+    survivors = list(range(len(candidates)))
+    out_of_time = False
+    n_fits = 0
+    for iteration in range(n_rounds):
+        n_resources = int(min(max_resources, min_resources * factor ** iteration))
+        if iteration == n_rounds - 1:
+            n_resources = max_resources
+        if resource == 'n_samples':
+            subset = np.sort(sample_order[:n_resources])
+            X_round, y_round, extra_params = _take(X, subset), y[subset], {}
+        else:
+            subset, X_round, y_round, extra_params = None, X, y, {resource: n_resources}
+        folds = check_cv(cv, y_round, classifier=is_classifier(pipeline)).split(X_round, y_round)
+
+        n_keep = max(int(np.ceil(len(survivors) / float(factor))), 1)
+        fold_scores = {c: [] for c in survivors}
+        fit_times = {c: [] for c in survivors}
+        active = list(survivors)
+        for train, test in folds:
+            if time_budget is not None and n_fits and time.time() - start_time > time_budget:
+                out_of_time = True
+                break
+            results = runner.run([dict(candidates[c], **extra_params) for c in active], X_round, y_round,
+                                 [(train, test)], rows=subset)
+            n_fits += len(active)
+            for c, (score, fit_time) in zip(active, results):
+                fold_scores[c].append(score)
+                fit_times[c].append(fit_time)
+            if prune_margin is not None and len(fold_scores[active[0]]) >= 2:
+                active = _undominated(active, fold_scores, n_keep, prune_margin)
+
+        evaluated = [c for c in survivors if fold_scores[c]]
+        if not evaluated:
+            break
+        for c in evaluated:
+            rows.append({'iter': iteration, 'n_resources': n_resources, 'params': dict(candidates[c], **extra_params),
+                         'candidate': c, 'mean_test_score': np.mean(fold_scores[c]),
+                         'std_test_score': np.std(fold_scores[c]), 'n_folds': len(fold_scores[c]),
+                         'mean_fit_time': np.mean(fit_times[c])})
+        # candidates that raced to the end rank ahead of pruned ones
+        ranked = sorted(evaluated, key=lambda c: (c in active, np.mean(fold_scores[c])), reverse=True)
+        if verbose:
+            print("iter %d: %d candidates, %d %s, best score %0.3f"
+                  % (iteration, len(evaluated), n_resources, resource, np.mean(fold_scores[ranked[0]])))
+        survivors = ranked[:n_keep]
+        if out_of_time or len(survivors) == 1:
+            break
+
+    best = ranked[0]
+    best_row = [row for row in rows if row['candidate'] == best][-1]
+    best_params = dict(candidates[best])
+    if resource != 'n_samples':
+        best_params[resource] = max_resources
+    start = time.time()
+    best_estimator = clone(pipeline).set_params(**best_params).fit(X, y)
+    refit_time = time.time() - start
+
+    cv_results = {key: np.array([row[key] for row in rows]) for key in rows[0] if key != 'params'}
+    cv_results['params'] = [row['params'] for row in rows]
+    result = SearchResult(best_estimator, best_params, best_row['mean_test_score'], cv_results, scorer)
+    result.refit_time_ = refit_time
+    return result
+
+def cached_grid_search(pipeline, parameters_to_tune, X, y, cache, cv=5, scoring='accuracy', n_jobs=-1, verbose=False):
+    """ Exhaustive grid search like `GridSearchCV` that loads the (candidate, fold) scores found in
+    a :class:`SearchCache` instead of refitting them, and stores the ones it has to fit
+
+    Arguments:
+        pipeline {sklearn pipeline} -- unfitted pipeline of transformations and estimator
+        parameters_to_tune {dict(named parameter(str) -> array-like (any))} -- parameter grid
+        X {array-like} -- data - features to fit
+        y {array-like} -- data - classes to fit
+        cache {SearchCache or str} -- the store, or the directory of one
+
+    Keyword Arguments:
+        cv {int or cross-validation generator} -- number of cross-validation folds (default: {5})
+        scoring {str or callable} -- scorer to use for optimization (default: {'accuracy'})
+        n_jobs {int} -- number of cores to use (-1 is all available) (default: {-1})
+        verbose {bool} -- print how many fits were loaded from the cache? (default: {False})
+
+    Returns:
+        SearchResult -- search result with the best candidate refit on all of the data
+    """
+
+    if not isinstance(cache, SearchCache):
+        cache = SearchCache(cache)
+    candidates = list(ParameterGrid(parameters_to_tune))
+    scorer = check_scoring(pipeline, scoring=scoring)
+    X, y = _as_indexable(X), np.asarray(y)
+    folds = list(check_cv(cv, y, classifier=is_classifier(pipeline)).split(X, y))
+
+    runner = _FoldRunner(pipeline, X, y, scorer, n_jobs, cache=cache)
+    results = runner.run(candidates, X, y, folds)
+    if verbose:
+        print("%d of %d fits were loaded from the cache" % (runner.n_loaded, len(results)))
+    scores = np.array([score for score, _ in results]).reshape(len(folds), len(candidates)).T
+    fit_times = np.array([fit_time for _, fit_time in results]).reshape(len(folds), len(candidates)).T
+    return _grid_search_result(pipeline, candidates, scores, fit_times, X, y, scorer)
+
+def _grid_search_result(pipeline, candidates, scores, fit_times, X, y, scorer):
+    """ Builds `GridSearchCV`-style results from the (candidate, fold) scores and fit times,
+    and refits the best candidate on all of the data """
+
+    cv_results = {'params': candidates, 'mean_test_score': scores.mean(axis=1), 'std_test_score': scores.std(axis=1),
+                  'mean_fit_time': fit_times.mean(axis=1)}
+    cv_results['rank_test_score'] = np.argsort(np.argsort(-cv_results['mean_test_score'], kind='mergesort')) + 1
+    for split in range(scores.shape[1]):
+        cv_results['split%d_test_score' % split] = scores[:, split]
+        cv_results['split%d_fit_time' % split] = fit_times[:, split]
+
+    best = int(np.argmax(cv_results['mean_test_score']))
+    start = time.time()
+    best_estimator = clone(pipeline).set_params(**candidates[best]).fit(X, y)
+    result = SearchResult(best_estimator, candidates[best], cv_results['mean_test_score'][best], cv_results, scorer)
+    result.refit_time_ = time.time() - start
+    return result
+
+# regularization parameters a warm-started path can walk, and whether the path goes from
+# strong to weak regularization with increasing (C) or decreasing (alpha) values
+_PATH_PARAMETERS = {'C': False, 'alpha': True}
+
+def _fit_transform_steps(steps, X, y):
+    """ Fits clones of the transformer (and imblearn sampler) steps of a pipeline on training data
+
+    Returns:
+        fitted {list} -- fitted steps
+        X {array-like} -- transformed (and resampled) features
+        y {array-like} -- (resampled) classes
+    """
+
+    fitted = []
+    for _, step in steps:
+        if step is None or step == 'passthrough':
+            continue
+        step = clone(step)
+        if hasattr(step, 'fit_resample'):
+            X, y = step.fit_resample(X, y)
+        else:
+            X = step.fit_transform(X, y)
+        fitted.append(step)
+    return fitted, X, y
+
+def _transform_steps(fitted, X):
+    """ Applies fitted steps to new data. Samplers only act while fitting, so they are skipped """
+
+    for step in fitted:
+        if not hasattr(step, 'fit_resample'):
+            X = step.transform(X)
+    return X
+
+def _split_final_step(pipeline):
+    """ Returns the prefix steps, the final estimator and the parameter prefix of the final estimator """
+
+    if hasattr(pipeline, 'steps'):
+        name, final = pipeline.steps[-1]
+        return pipeline.steps[:-1], final, name + '__'
+    return [], pipeline, ''
+
+def _walk_path(pipeline, group_params, path_param, path_values, X, y, train, test, scorer):
+    """ Fits the transformers of one fold once, then fits the final estimator along the regularization
+    path with warm starts, each fit starting from the previous coefficients
+
+    Returns:
+        list -- (score, fit_time) per path value
+    """
+
+    steps, final, _ = _split_final_step(clone(pipeline).set_params(**group_params))
+    start = time.time()
+    fitted, X_train, y_train = _fit_transform_steps(steps, _take(X, train), y[train])
+    prefix_time = time.time() - start
+    X_test = _transform_steps(fitted, _take(X, test))
+
+    final.set_params(warm_start=True)
+    results = []
+    for value in path_values:
+        final.set_params(**{path_param: value})
+        start = time.time()
+        final.fit(X_train, y_train)
+        fit_time = time.time() - start + prefix_time / len(path_values)
+        results.append((scorer(final, X_test, y[test]), fit_time))
+    return results
+
+def regularization_path_search(pipeline, parameters_to_tune, X, y, cv=5, scoring='accuracy', n_jobs=-1, verbose=False):
+    """ Grid search for pipelines whose final estimator supports `warm_start` (e.g. `LogisticRegression`
+    with a non-liblinear solver, or `SGDClassifier` for linear SVMs). Per fold and per combination of
+    the other parameters, the transformers are fitted once and the final estimator walks the `C` (or
+    `alpha`) grid from strong to weak regularization, starting each fit from the previous coefficients.
+    The best candidate is refit cold on all of the data, with the pipeline's own `warm_start` setting
+
+    Arguments:
+        pipeline {sklearn pipeline} -- unfitted pipeline of transformations and estimator
+        parameters_to_tune {dict(named parameter(str) -> array-like (any))} -- parameter grid, with a
+        `C` or `alpha` grid for the final estimator
+        X {array-like} -- data - features to fit
+        y {array-like} -- data - classes to fit
+
+    Keyword Arguments:
+        cv {int or cross-validation generator} -- number of cross-validation folds (default: {5})
+        scoring {str or callable} -- scorer to use for optimization (default: {'accuracy'})
+        n_jobs {int} -- number of cores to use (-1 is all available) (default: {-1})
+        verbose {bool} -- print the parameter the path walks? (default: {False})
+
+    Returns:
+        SearchResult -- search result with `GridSearchCV`-style `cv_results_` and the best candidate refit
+    """
+
+    _, final, prefix = _split_final_step(pipeline)
+    if 'warm_start' not in final.get_params():
+        raise ValueError("%s doesn't support warm_start" % type(final).__name__)
+    path_keys = [prefix + name for name in _PATH_PARAMETERS if prefix + name in parameters_to_tune]
+    if len(path_keys) != 1:
+        raise ValueError("The grid needs exactly one of %s" % [prefix + name for name in _PATH_PARAMETERS])
+    path_key = path_keys[0]
+    path_param = path_key[len(prefix):]
+    path_values = sorted(parameters_to_tune[path_key], reverse=_PATH_PARAMETERS[path_param])
+    if verbose:
+        print("Warm-starting %s along %s" % (type(final).__name__, path_values))
+
+    scorer = check_scoring(pipeline, scoring=scoring)
+    X, y = _as_indexable(X), np.asarray(y)
+    folds = list(check_cv(cv, y, classifier=is_classifier(pipeline)).split(X, y))
+    groups = list(ParameterGrid({key: values for key, values in parameters_to_tune.items() if key != path_key}))
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_walk_path)(pipeline, group, path_param, path_values, X, y, train, test, scorer)
+        for train, test in folds for group in groups)
+
+    # put the (group, path value) results back in the order of the full parameter grid
+    positions = {}
+    for g, group in enumerate(groups):
+        for v, value in enumerate(path_values):
+            positions[repr(sorted(dict(group, **{path_key: value}).items()))] = (g, v)
+    candidates = list(ParameterGrid(parameters_to_tune))
+    scores = np.empty((len(candidates), len(folds)))
+    fit_times = np.empty((len(candidates), len(folds)))
+    for c, params in enumerate(candidates):
+        g, v = positions[repr(sorted(params.items()))]
+        for f in range(len(folds)):
+            scores[c, f], fit_times[c, f] = results[f * len(groups) + g][v]
+
+    return _grid_search_result(pipeline, candidates, scores, fit_times, X, y, scorer)
@@ -0,0 +1,294 @@
+"""
+The :mod:`mlexp.store` module implements a local SQLite store of experiment runs: their parameters,
+metrics, per-fold scores, timings and artifact paths. Runs are written in bulk transactions and the
+metric and parameter tables are indexed, so ranking queries stay fast over many thousands of runs:
+
+    store = ExperimentStore('experiments.db', dataset='holdout-2019')
+    grid_search_optimization(pipeline, parameters_to_tune, X, y, Xh, yh, store=store)
+    store.top_runs('weighted_sensitivity', n=20)
+"""
+import contextlib
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT,
+    dataset TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS params (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    dataset TEXT,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS fold_scores (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    fold INTEGER NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    phase TEXT NOT NULL,
+    seconds REAL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_dataset ON runs (dataset, experiment);
+CREATE INDEX IF NOT EXISTS params_by_value ON params (name, value, run_id);
+CREATE INDEX IF NOT EXISTS params_by_run ON params (run_id);
+CREATE INDEX IF NOT EXISTS metrics_by_dataset_value ON metrics (dataset, name, value);
+CREATE INDEX IF NOT EXISTS metrics_by_value ON metrics (name, value);
+CREATE INDEX IF NOT EXISTS metrics_by_run ON metrics (run_id);
+CREATE INDEX IF NOT EXISTS fold_scores_by_run ON fold_scores (run_id, name);
+CREATE INDEX IF NOT EXISTS timings_by_run ON timings (run_id);
+CREATE INDEX IF NOT EXISTS artifacts_by_run ON artifacts (run_id);
+"""
+
+def _encode_param(value):
+    """ Stores parameter values as JSON so equal values compare equal in queries; values
+    JSON can't represent (e.g. estimators) are stored by their repr """
+
+    if isinstance(value, np.generic):
+        value = value.item()
+    try:
+        return json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError):
+        return json.dumps(repr(value))
+
+def _float_or_none(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+class ExperimentStore(object):
+    """ SQLite-backed store of experiment runs. A run is a dict with any of the keys 'params'
+    (name -> value), 'metrics' (name -> score), 'fold_scores' (name -> one score per fold),
+    'timings' (phase -> seconds), 'artifacts' (name -> path), 'dataset' and 'experiment'
+
+    Arguments:
+        path {str} -- database file, created if missing (':memory:' for a temporary store)
+
+    Keyword Arguments:
+        dataset {str} -- dataset recorded with runs that don't name their own (default: {None})
+        experiment {str} -- experiment recorded with runs that don't name their own (default: {None})
+    """
+
+    def __init__(self, path, dataset=None, experiment=None):
+        self.path = path
+        self.dataset = dataset
+        self.experiment = experiment
+        self.connection = sqlite3.connect(path)
+        if path != ':memory:':
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        """ Closes the database connection """
+
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def log_runs(self, runs):
+        """ Writes many runs in a single transaction
+
+        Arguments:
+            runs {iterable(dict)} -- runs, see :class:`ExperimentStore`
+
+        Returns:
+            list(int) -- ids of the new runs, in order
+        """
+
+        runs = list(runs)
+        created = time.time()
+        with self.connection:
+            cursor = self.connection.cursor()
+            run_ids = []
+            for run in runs:
+                cursor.execute("INSERT INTO runs (experiment, dataset, created) VALUES (?, ?, ?)",
+                               (run.get('experiment', self.experiment), run.get('dataset', self.dataset), created))
+                run_ids.append(cursor.lastrowid)
+
+            params, metrics, fold_scores, timings, artifacts = [], [], [], [], []
+            for run_id, run in zip(run_ids, runs):
+                dataset = run.get('dataset', self.dataset)
+                params.extend((run_id, name, _encode_param(value)) for name, value in run.get('params', {}).items())
+                metrics.extend((run_id, dataset, name, _float_or_none(value))
+                               for name, value in run.get('metrics', {}).items())
+                for name, scores in run.get('fold_scores', {}).items():
+                    fold_scores.extend((run_id, name, fold, _float_or_none(score)) for fold, score in enumerate(scores))
+                timings.extend((run_id, phase, float(seconds)) for phase, seconds in run.get('timings', {}).items())
+                artifacts.extend((run_id, name, path) for name, path in run.get('artifacts', {}).items())
+
+            cursor.executemany("INSERT INTO params VALUES (?, ?, ?)", params)
+            cursor.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?)", metrics)
+            cursor.executemany("INSERT INTO fold_scores VALUES (?, ?, ?, ?)", fold_scores)
+            cursor.executemany("INSERT INTO timings VALUES (?, ?, ?)", timings)
+            cursor.executemany("INSERT INTO artifacts VALUES (?, ?, ?)", artifacts)
+        return run_ids
+
+    def log_run(self, **run):
+        """ Writes one run, see :class:`ExperimentStore` for the keyword arguments
+
+        Returns:
+            int -- id of the new run
+        """
+
+        return self.log_runs([run])[0]
+
+    def log_search(self, search, scoring='score', dataset=None, experiment=None):
+        """ Writes every candidate of a fitted search (`GridSearchCV` or a :mod:`mlexp.search` result)
+        as a run, with its per-fold scores, mean fit/score times and its mean and std score as the metrics
+        'cv_<scoring>' and 'cv_<scoring>_std', apart from holdout scores of the same metric
+
+        Arguments:
+            search {fitted search} -- search with `cv_results_`
+
+        Keyword Arguments:
+            scoring {str} -- metric name the scores are stored under (default: {'score'})
+            dataset {str} -- dataset of the runs (default: {None} - the store's)
+            experiment {str} -- experiment of the runs (default: {None} - the store's)
+
+        Returns:
+            list(int) -- ids of the new runs, in candidate order
+        """
+
+        cv_results = search.cv_results_
+        n_splits = len([key for key in cv_results if key.startswith('split') and key.endswith('_test_score')])
+        runs = []
+        for candidate, params in enumerate(cv_results['params']):
+            run = {'params': params,
+                   'metrics': {'cv_%s' % scoring: cv_results['mean_test_score'][candidate],
+                               'cv_%s_std' % scoring: cv_results['std_test_score'][candidate]},
+                   'fold_scores': {scoring: [cv_results['split%d_test_score' % split][candidate]
+                                             for split in range(n_splits)]},
+                   'timings': {phase: cv_results['mean_%s_time' % phase][candidate]
+                               for phase in ('fit', 'score') if 'mean_%s_time' % phase in cv_results},
+                   'dataset': dataset if dataset is not None else self.dataset,
+                   'experiment': experiment if experiment is not None else self.experiment}
+            runs.append(run)
+        return self.log_runs(runs)
+
+    def params(self, run_id):
+        """ Returns the parameters of a run as a dict """
+
+        rows = self.connection.execute("SELECT name, value FROM params WHERE run_id = ?", (run_id,))
+        return {name: json.loads(value) for name, value in rows}
+
+    def run(self, run_id):
+        """ Reads back everything stored for a run
+
+        Arguments:
+            run_id {int} -- id of the run
+
+        Returns:
+            dict -- run in the form it is logged in, plus 'id' and 'created'
+        """
+
+        experiment, dataset, created = self.connection.execute(
+            "SELECT experiment, dataset, created FROM runs WHERE id = ?", (run_id,)).fetchone()
+        fold_scores = {}
+        for name, score in self.connection.execute(
+                "SELECT name, value FROM fold_scores WHERE run_id = ? ORDER BY name, fold", (run_id,)):
+            fold_scores.setdefault(name, []).append(score)
+        return {
+            'id': run_id, 'experiment': experiment, 'dataset': dataset, 'created': created,
+            'params': self.params(run_id),
+            'metrics': dict(self.connection.execute("SELECT name, value FROM metrics WHERE run_id = ?", (run_id,))),
+            'fold_scores': fold_scores,
+            'timings': dict(self.connection.execute("SELECT phase, seconds FROM timings WHERE run_id = ?", (run_id,))),
+            'artifacts': dict(self.connection.execute("SELECT name, path FROM artifacts WHERE run_id = ?", (run_id,))),
+        }
+
+    def top_runs(self, metric, dataset=None, n=20, ascending=False):
+        """ Ranks runs by a metric, using the (dataset, metric, value) index
+
+        Arguments:
+            metric {str} -- metric name, e.g. 'weighted_sensitivity'
+
+        Keyword Arguments:
+            dataset {str} -- only rank runs on this dataset (default: {None} - the store's, or all runs if it has none)
+            n {int} -- number of runs to return (default: {20})
+            ascending {bool} -- rank the lowest values first, e.g. for losses (default: {False})
+
+        Returns:
+            list(dict) -- 'id', the metric and 'params' of the best runs, best first
+        """
+
+        dataset = dataset if dataset is not None else self.dataset
+        order = 'ASC' if ascending else 'DESC'
+        if dataset is None:
+            rows = self.connection.execute(
+                "SELECT run_id, value FROM metrics WHERE name = ? AND value IS NOT NULL ORDER BY value %s LIMIT ?" % order,
+                (metric, n))
+        else:
+            rows = self.connection.execute(
+                "SELECT run_id, value FROM metrics WHERE dataset = ? AND name = ? AND value IS NOT NULL "
+                "ORDER BY value %s LIMIT ?" % order, (dataset, metric, n))
+        return [{'id': run_id, metric: value, 'params': self.params(run_id)} for run_id, value in rows.fetchall()]
+
+    def runs_with_params(self, **params):
+        """ Finds the runs that used all of the given parameter values, e.g. `runs_with_params(classifier__C=1.0)`
+
+        Returns:
+            list(int) -- ids of the matching runs
+        """
+
+        run_ids = None
+        for name, value in params.items():
+            rows = self.connection.execute("SELECT run_id FROM params WHERE name = ? AND value = ?",
+                                           (name, _encode_param(value)))
+            matching = set(run_id for run_id, in rows)
+            run_ids = matching if run_ids is None else run_ids & matching
+        return sorted(run_ids or [])
+
+@contextlib.contextmanager
+def opened_store(store):
+    """ Yields an :class:`ExperimentStore`, opening (and afterwards closing) one if given a path
+
+    Arguments:
+        store {ExperimentStore or str} -- store, or its database file
+    """
+
+    if isinstance(store, ExperimentStore):
+        yield store
+        return
+    opened = ExperimentStore(store)
+    try:
+        yield opened
+    finally:
+        opened.close()
+
+def loggable_params(estimator):
+    """ Returns the parameters of an estimator that are plain values (numbers, strings, booleans and None),
+    leaving out nested estimators and other objects
+
+    Arguments:
+        estimator {sklearn estimator} -- estimator or pipeline
+
+    Returns:
+        dict -- parameter name -> value
+    """
+
+    params = estimator.get_params(deep=True) if hasattr(estimator, 'get_params') else {}
+    return {name: value for name, value in params.items()
+            if value is None or isinstance(value, (bool, int, float, str, np.generic))}
@@ -16,6 +16,9 @@ setup(
     url="https://github.com/jtbricker/mlexp/",
     packages=find_packages(),
     install_requires=requirements,
+    entry_points={
+        "console_scripts": ["mlexp=mlexp.mlexp:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3.6",
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
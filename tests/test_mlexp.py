@@ -1,5 +1,14 @@
 """Tests for `mlexp` package."""
+import json
+import os
+import socket
+import threading
+
+import numpy as np
 import pytest
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+
 from mlexp import mlexp
 
 
@@ -7,4 +16,160 @@ def test_mirror(capsys):
     """Correct reverse name prints"""
     mlexp.mirror("Justin")
     captured = capsys.readouterr()
-    assert "nitsuJ" in captured.out
\ No newline at end of file
+    assert "nitsuJ" in captured.out
+
+def _post(url, path, instances):
+    from urllib.request import urlopen
+    body = json.dumps({'instances': instances}).encode('utf-8')
+    with urlopen(url + path, data=body) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+@pytest.fixture
+def model():
+    X, y = make_classification(random_state=0)
+    return LogisticRegression().fit(X, y), X
+
+
+@pytest.fixture
+def server(model):
+    server = mlexp.make_server(model[0], port=0, max_batch_size=64, max_latency=0.05)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server, 'http://127.0.0.1:%d' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+    thread.join()
+
+
+def test_micro_batcher_coalesces_concurrent_requests(model):
+    """Concurrent single-row requests share model calls"""
+    clf, X = model
+    batcher = mlexp.MicroBatcher(clf, max_batch_size=20, max_latency=0.2)
+    results = [None] * 40
+
+    def score(i):
+        results[i] = batcher.submit('predict_proba', X[i:i + 1])
+    threads = [threading.Thread(target=score, args=(i,)) for i in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = batcher.stats()
+    batcher.close()
+
+    assert np.allclose(np.vstack(results), clf.predict_proba(X[:40]))
+    assert stats['requests'] == 40
+    assert stats['batches'] < 40
+    assert stats['latency_p99_ms'] >= stats['latency_p50_ms'] > 0
+
+
+def test_micro_batcher_isolates_failing_request(model):
+    """A request the model rejects fails on its own, not the valid requests batched with it"""
+    clf, X = model
+    batcher = mlexp.MicroBatcher(clf, max_batch_size=6, max_latency=0.5)
+    bad_rows = np.full((1, X.shape[1]), np.nan)
+    results, errors = [None] * 6, [None] * 6
+
+    def score(i):
+        try:
+            results[i] = batcher.submit('predict', bad_rows if i == 5 else X[i:i + 1])
+        except ValueError as error:
+            errors[i] = error
+    threads = [threading.Thread(target=score, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = batcher.stats()
+    batcher.close()
+
+    assert np.array_equal(np.concatenate(results[:5]), clf.predict(X[:5]))
+    assert errors[:5] == [None] * 5
+    assert errors[5] is not None
+    assert stats['batches'] < 6
+
+
+def test_micro_batcher_rejects_wrong_width_before_batching(model):
+    clf, X = model
+    batcher = mlexp.MicroBatcher(clf)
+
+    with pytest.raises(ValueError):
+        batcher.submit('predict', X[:1, :3])
+    with pytest.raises(ValueError):
+        batcher.submit('predict', X[0])
+    stats = batcher.stats()
+    batcher.close()
+
+    assert stats['requests'] == 0
+
+
+def test_server_predicts_over_http(server, model):
+    """Concurrent HTTP requests are answered with the model's predictions"""
+    (_, url), (clf, X) = server, model
+    responses = [None] * 16
+
+    def request(i):
+        responses[i] = _post(url, '/predict', X[i * 2:(i + 1) * 2].tolist())
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum((response['predictions'] for response in responses), []) == clf.predict(X[:32]).tolist()
+    assert np.allclose(_post(url, '/predict_proba', X[:3].tolist())['predictions'], clf.predict_proba(X[:3]))
+
+
+def test_server_reports_stats_and_errors(server):
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+    _, url = server
+
+    _post(url, '/predict', [[0.0] * 20])
+    with urlopen(url + '/stats') as response:
+        stats = json.loads(response.read().decode('utf-8'))
+    with urlopen(url + '/health') as response:
+        assert json.loads(response.read().decode('utf-8')) == {'status': 'ok'}
+
+    assert stats['rows'] == 1 and stats['throughput'] > 0
+    with pytest.raises(HTTPError) as error:
+        _post(url, '/predict', [[0.0] * 3])
+    assert error.value.code == 400
+    with pytest.raises(HTTPError) as error:
+        _post(url, '/predict', [0.0] * 20)
+    assert error.value.code == 400
+    with pytest.raises(HTTPError) as error:
+        _post(url, '/predict', [[float('nan')] * 20])
+    assert error.value.code == 500
+    with pytest.raises(HTTPError) as error:
+        _post(url, '/transform', [[0.0] * 20])
+    assert error.value.code == 404
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix sockets")
+def test_server_predicts_over_unix_socket(model, tmpdir):
+    import http.client
+    clf, X = model
+    path = os.path.join(str(tmpdir), 'mlexp.sock')
+    server = mlexp.make_server(clf, unix_socket=path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    class UnixConnection(http.client.HTTPConnection):
+        def connect(self):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+    try:
+        connection = UnixConnection('localhost')
+        connection.request('POST', '/predict', json.dumps({'instances': X[:5].tolist()}))
+        predictions = json.loads(connection.getresponse().read().decode('utf-8'))['predictions']
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
+        thread.join()
+
+    assert predictions == clf.predict(X[:5]).tolist()
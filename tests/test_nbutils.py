@@ -1,4 +1,8 @@
 """Tests for `nbutils` package."""
+import os
+import subprocess
+import sys
+
 import pytest
 from mock import patch
 
@@ -7,8 +11,10 @@ import numpy as np
 from sklearn.dummy import DummyClassifier
 from sklearn.datasets import make_classification
 from imblearn.pipeline import Pipeline
-from sklearn.metrics import make_scorer, accuracy_score
+from imblearn.under_sampling import RandomUnderSampler
+from sklearn.metrics import make_scorer, accuracy_score, confusion_matrix, get_scorer, roc_auc_score
 from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
 
 from mlexp import nbutils
 from helpers import get_sample_data
@@ -226,4 +232,688 @@ def test_grid_search_optimization_no_errors():
     clf = Pipeline([('classifier', LogisticRegression())])
     X, y  = make_classification()
 
-    nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True)
\ No newline at end of file
+    nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True)
+
+def test_get_confusion_matrix_matches_sklearn():
+    """Single-pass confusion matrix is identical to sklearn's"""
+    rng = np.random.RandomState(0)
+    true = rng.randint(-2, 3, size=500)
+    pred = rng.randint(0, 5, size=500)
+
+    assert np.array_equal(nbutils.get_confusion_matrix(true, pred), confusion_matrix(true, pred))
+
+def test_specificity_and_npv_multiclass_match_baseline():
+    """Multi-class specificity and NPV still use the first row and column of the full matrix"""
+    true = [0, 0, 0, 1, 1, 2, 2, 2]
+    pred = [0, 2, 2, 1, 0, 2, 0, 1]
+    cm = confusion_matrix(true, pred)
+
+    assert nbutils.specificity(true, pred) == pytest.approx(cm[0,0] / cm[0,:].sum())
+    assert nbutils.negative_predictive_value(true, pred) == pytest.approx(cm[0,0] / cm[:,0].sum())
+    assert nbutils.specificity(true, pred) == pytest.approx(1 / 3.)
+
+def test_specificity_and_npv_single_class_match_baseline():
+    """A single class gives a 1x1 matrix instead of an IndexError"""
+    assert nbutils.specificity([0, 0, 0], [0, 0, 0]) == 1.0
+    assert nbutils.negative_predictive_value([0, 0, 0], [0, 0, 0]) == 1.0
+
+def test_confusion_stats_counts_rejects_multiclass():
+    """Binary counts of a KxK matrix raise instead of reading its top-left block"""
+    stats = nbutils.ConfusionStats.from_predictions([0, 1, 2], [0, 1, 2])
+
+    with pytest.raises(ValueError, match='multiclass_scores'):
+        stats.counts
+    with pytest.raises(ValueError, match='2x2'):
+        nbutils.weighted_accuracy([0, 1, 2], [0, 1, 2])
+
+def test_get_confusion_matrix_string_labels():
+    """Non-integer labels are encoded by sorting"""
+    true = ['b', 'a', 'c', 'a']
+    pred = ['a', 'a', 'c', 'b']
+
+    assert np.array_equal(nbutils.get_confusion_matrix(true, pred), confusion_matrix(true, pred))
+
+def test_confusion_stats_scores_match_metric_functions():
+    """Every metric derived from the cached counts matches the standalone function"""
+    true, pred = get_sample_data(135,53,2,11)
+
+    scores = nbutils.ConfusionStats.from_predictions(true, pred).scores()
+
+    assert scores['specificity'] == nbutils.specificity(true, pred)
+    assert scores['weighted_npv'] == nbutils.weighted_npv(true, pred)
+    assert len(scores) == 8
+
+def test_confusion_stats_unknown_metric_value_error():
+    """Metrics that need more than the confusion matrix are rejected"""
+    stats = nbutils.ConfusionStats([[1,2],[3,4]])
+
+    with pytest.raises(ValueError):
+        stats.score(accuracy_score)
+
+def test_batch_scores_match_per_set_metrics():
+    """Batch scores equal the metric functions applied to each prediction set"""
+    rng = np.random.RandomState(0)
+    true = rng.randint(0, 2, size=100)
+    preds = rng.randint(0, 2, size=(5, 100))
+
+    scores = nbutils.batch_scores(true, preds)
+
+    for i, pred in enumerate(preds):
+        assert scores['weighted_accuracy'][i] == pytest.approx(nbutils.weighted_accuracy(true, pred))
+        assert scores['specificity'][i] == pytest.approx(nbutils.specificity(true, pred))
+
+def test_batch_scores_undefined_scores_nan(capsys):
+    """Sets without any negative predictions give NaN and can still be summarized"""
+    true = np.array([[0,1,0,1], [0,1,0,1]])
+    preds = np.array([[1,1,1,1], [0,1,0,1]])
+
+    scores = nbutils.batch_scores(true, preds, metrics=[nbutils.negative_predictive_value])
+
+    assert np.isnan(scores['negative_predictive_value'][0])
+    nbutils.print_score_summaries(scores)
+    assert "negative_predictive_value\t1.0\t0.0" in capsys.readouterr().out
+
+def test_get_batch_confusion_matrices_more_than_two_labels_value_error():
+    with pytest.raises(ValueError):
+        nbutils.get_batch_confusion_matrices([0,1,2], [[0,1,1]])
+
+def test_bootstrap_scores_seeded_and_chunked_reproducible():
+    """The same seed gives the same replicates, whether or not they are drawn in chunks"""
+    true, pred = get_sample_data(135,53,2,11)
+
+    whole = nbutils.bootstrap_scores(true, pred, n_bootstraps=100, random_state=3)
+    chunked = nbutils.bootstrap_scores(true, pred, n_bootstraps=100, random_state=3, chunk_size=30)
+
+    assert len(whole['weighted_ppv']) == 100
+    assert np.array_equal(whole['weighted_ppv'], chunked['weighted_ppv'])
+
+def test_bootstrap_confidence_intervals_contain_score():
+    """The interval brackets the score calculated on the original data"""
+    true, pred = get_sample_data(135,53,2,11)
+
+    intervals = nbutils.bootstrap_confidence_intervals(true, pred, metrics=['specificity'], n_bootstraps=500, random_state=0)
+
+    score, lower, upper = intervals['specificity']
+    assert score == nbutils.specificity(true, pred)
+    assert lower <= score <= upper
+
+def test_bootstrap_confidence_intervals_threshold_scores():
+    """Scores are turned into predictions with the threshold"""
+    true = [0,0,1,1]
+    scores = [0.1,0.6,0.4,0.9]
+
+    intervals = nbutils.bootstrap_confidence_intervals(true, scores, metrics=['specificity'], threshold=0.5, n_bootstraps=10)
+
+    assert intervals['specificity'][0] == 0.5
+
+def test_bootstrap_confidence_intervals_threshold_single_class_value_error():
+    with pytest.raises(ValueError, match='two classes'):
+        nbutils.bootstrap_confidence_intervals([1,1,1], [0.2,0.6,0.9], threshold=0.5, n_bootstraps=10)
+
+def test_get_metrics_predicts_once_for_all_scorers():
+    """Scorers share a single predict call"""
+    X, y = make_classification(random_state=0)
+    model = LogisticRegression().fit(X, y)
+    scoring_list = {'accuracy':make_scorer(accuracy_score), 'specificity':make_scorer(nbutils.specificity),
+                    'roc_auc':get_scorer('roc_auc')}
+
+    with patch.object(model, 'predict', wraps=model.predict) as predict:
+        metrics = nbutils.get_metrics(model, X, y, scoring_list)
+
+    assert predict.call_count == 1
+    assert metrics['accuracy'] == accuracy_score(y, model.predict(X))
+    assert metrics['roc_auc'] == get_scorer('roc_auc')(model, X, y)
+
+def test_plot_roc_shares_cache_with_get_metrics():
+    """Predictions made for get_metrics are reused by plot_roc"""
+    X, y = make_classification(random_state=0)
+    model = LogisticRegression().fit(X, y)
+    cache = nbutils.PredictionCache()
+
+    nbutils.get_metrics(model, X, y, cache=cache)
+    nbutils.plot_roc(model, X, y, show_plot=False, cache=cache)
+
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+def test_prediction_cache_evicts_least_recently_used():
+    """The cache never holds more than maxsize outputs"""
+    X, y = make_classification(random_state=0)
+    model = LogisticRegression().fit(X, y)
+    cache = nbutils.PredictionCache(maxsize=2)
+
+    for rows in (X[:10], X[:20], X[:30]):
+        cache.get(model, 'predict', rows)
+    cache.get(model, 'predict', X[:10])
+
+    assert len(cache) == 2
+    assert cache.misses == 4
+
+def test_metric_accumulator_merged_chunks_match_full_data():
+    """Accumulating chunks on separate accumulators and merging gives the full-data metrics"""
+    true, pred = get_sample_data(135,53,2,11)
+    first = nbutils.MetricAccumulator().update(true[:100], pred[:100])
+    second = nbutils.MetricAccumulator().update(true[100:], pred[100:])
+
+    scores = first.merge(second).scores()
+
+    assert scores['weighted_accuracy'] == nbutils.weighted_accuracy(true, pred)
+    assert scores['accuracy'] == accuracy_score(true, pred)
+
+def test_metric_accumulator_roc_auc_close_to_exact():
+    """Binned auc is close to sklearn's exact auc"""
+    rng = np.random.RandomState(0)
+    true = rng.randint(0, 2, size=2000)
+    scores = np.clip(true * 0.3 + rng.rand(2000) * 0.7, 0, 1)
+
+    accumulator = nbutils.MetricAccumulator().update(true, y_score=scores)
+
+    assert accumulator.roc_auc() == pytest.approx(roc_auc_score(true, scores), abs=1e-3)
+
+def test_metric_accumulator_unknown_label_value_error():
+    with pytest.raises(ValueError):
+        nbutils.MetricAccumulator(labels=(0, 1)).update([0, 2], [0, 1])
+
+def test_get_streaming_metrics_matches_in_memory_metrics():
+    """Metrics from chunks of data equal the metrics on the whole data"""
+    X, y = make_classification(random_state=0)
+    model = LogisticRegression().fit(X, y)
+    batches = ((X[i:i+30], y[i:i+30]) for i in range(0, len(y), 30))
+
+    metrics = nbutils.get_streaming_metrics(model, batches, metrics=['accuracy', nbutils.specificity, 'roc_auc'])
+
+    assert metrics['accuracy'] == pytest.approx(accuracy_score(y, model.predict(X)))
+    assert metrics['specificity'] == pytest.approx(nbutils.specificity(y, model.predict(X)))
+    assert metrics['roc_auc'] == pytest.approx(roc_auc_score(y, model.predict_proba(X)[:,1]), abs=1e-2)
+
+def test_metric_accumulator_multiclass_scores():
+    """Three classes give the overall accuracy and macro one-vs-rest averages, not the top-left 2x2 block"""
+    true = [0, 0, 0, 1, 1, 2, 2, 2]
+    pred = [0, 2, 2, 1, 0, 2, 0, 1]
+
+    scores = nbutils.MetricAccumulator(labels=(0, 1, 2)).update(true, pred).scores()
+
+    assert scores['accuracy'] == pytest.approx(accuracy_score(true, pred))
+    assert scores['specificity'] == pytest.approx(
+        nbutils.multiclass_scores(true, pred, metrics=['specificity'], average='macro')['specificity'])
+
+def test_get_streaming_metrics_multiclass_accuracy():
+    """Streaming accuracy over three classes equals the in-memory accuracy"""
+    X, y = make_classification(n_classes=3, n_informative=4, random_state=0)
+    model = LogisticRegression().fit(X, y)
+    batches = ((X[i:i+30], y[i:i+30]) for i in range(0, len(y), 30))
+
+    metrics = nbutils.get_streaming_metrics(model, batches, metrics=['accuracy'], labels=(0, 1, 2))
+
+    assert metrics['accuracy'] == pytest.approx(accuracy_score(y, model.predict(X)))
+
+def test_get_threshold_table_matches_thresholded_metrics():
+    """Every row equals the metrics of the predictions thresholded at that row"""
+    rng = np.random.RandomState(0)
+    true = rng.randint(0, 2, size=200)
+    scores = np.round(true * 0.3 + rng.rand(200) * 0.7, 2)
+
+    table = nbutils.get_threshold_table(true, scores)
+
+    for i in range(1, len(table['threshold']), 17):
+        pred = (scores >= table['threshold'][i]).astype(int)
+        assert table['weighted_sensitivity'][i] == pytest.approx(nbutils.weighted_sensitivity(true, pred))
+        assert table['weighted_npv'][i] == pytest.approx(nbutils.weighted_npv(true, pred))
+
+def test_get_threshold_table_grid_matches_distinct_thresholds():
+    """A requested grid gives the same counts as the distinct-score table"""
+    true = [0,0,1,1,0,1]
+    scores = [0.1,0.4,0.35,0.8,0.7,0.9]
+
+    table = nbutils.get_threshold_table(true, scores, thresholds=[0.35, 0.7])
+
+    assert list(table['tp']) == [3, 2]
+    assert list(table['fp']) == [2, 1]
+
+def test_get_threshold_table_single_class_counts():
+    """Without negatives the counts stay valid and only the undefined metrics are NaN"""
+    scores = [0.2, 0.5, 0.9]
+
+    table = nbutils.get_threshold_table([1, 1, 1], scores)
+
+    assert list(table['threshold']) == [np.inf, 0.9, 0.5, 0.2]
+    assert list(table['tp']) == [0, 1, 2, 3]
+    assert list(table['fp']) == [0, 0, 0, 0]
+    assert list(table['fn']) == [3, 2, 1, 0]
+    assert np.all(np.isnan(table['specificity']))
+
+def test_optimize_threshold_finds_perfect_split():
+    """If a threshold separates the classes, it is chosen"""
+    true = [0,0,0,1,1,1]
+    scores = [0.1,0.2,0.3,0.6,0.7,0.8]
+
+    threshold, score = nbutils.optimize_threshold(true, scores, metric='weighted_accuracy')
+
+    assert threshold == 0.6
+    assert score == 1.0
+
+def test_grid_search_optimization_halving_no_errors():
+    """ Runs a budgeted optimization with the same report without error """
+    param_grid = {'classifier__C': [0.1, 1.0, 10.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification()
+
+    nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True, search='halving', factor=2)
+
+def test_grid_search_optimization_unknown_search_value_error():
+    with pytest.raises(ValueError):
+        nbutils.grid_search_optimization(Pipeline([('classifier', LogisticRegression())]), {}, [[0]], [0], [[0]], [0], search='random')
+
+def test_grid_search_optimization_cache_no_errors(tmpdir):
+    """ Runs an optimization backed by an on-disk cache without error """
+    param_grid = {'classifier__C': [0.1, 1.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification()
+
+    nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True, cache=str(tmpdir))
+
+    assert len(tmpdir.listdir()) == 4
+
+def test_import_is_lazy_and_silent():
+    """Importing nbutils doesn't print or load the plotting and model selection dependencies"""
+    code = ("import sys; import mlexp.nbutils; "
+            "print([m for m in ('matplotlib', 'sklearn', 'joblib') if m in sys.modules])")
+    env = dict(os.environ, DISPLAY='')
+
+    output = subprocess.check_output([sys.executable, '-c', code], env=env, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+    assert output.decode().strip() == "[]"
+
+def test_reassign_classes_other_columns_untouched():
+    """Values in other columns that equal a class label are not reassigned"""
+    data = pd.DataFrame([{'class':0,'data':1},{'class':1,'data':0},{'class':2,'data':1}])
+    new_data = nbutils.reassign_classes(data, {0:1, 1:0}, 'class')
+
+    assert list(new_data['class']) == [1, 0]
+    assert list(new_data['data']) == [1, 0]
+
+def test_reassign_classes_chunked_input():
+    """Chunks of data are regrouped one by one"""
+    data = pd.DataFrame([{'class':0,'data':100},{'class':1,'data':200},{'class':2,'data':500},{'class':0,'data':400}])
+    chunks = (data.iloc[i:i+2] for i in range(0, 4, 2))
+
+    new_chunks = list(nbutils.reassign_classes(chunks, {0:'a', 2:'b'}, 'class'))
+
+    assert [list(chunk['class']) for chunk in new_chunks] == [['a'], ['b', 'a']]
+
+def test_reassign_classes_integer_column_label_leaves_input_unchanged():
+    """Non-string column labels work, and the input frame keeps its labels"""
+    data = pd.DataFrame({0: [0, 1, 2, 1], 1: [10, 20, 30, 40]})
+
+    all_rows = nbutils.reassign_classes(data, {0:1, 1:0, 2:1}, 0)
+    some_rows = nbutils.reassign_classes(data, {1:0}, 0)
+
+    assert list(all_rows[0]) == [1, 0, 1, 0]
+    assert list(some_rows[0]) == [0, 0]
+    assert list(some_rows[1]) == [20, 40]
+    assert list(data[0]) == [0, 1, 2, 1]
+
+def test_multiclass_scores_match_one_vs_rest_relabelling():
+    """Per-class scores equal the binary metrics on data relabelled as one class vs the rest"""
+    rng = np.random.RandomState(0)
+    true = rng.randint(0, 4, size=300)
+    pred = np.where(rng.rand(300) < 0.7, true, rng.randint(0, 4, size=300))
+
+    scores = nbutils.multiclass_scores(true, pred)
+
+    for k in range(4):
+        assert scores['specificity'][k] == pytest.approx(nbutils.specificity(true == k, pred == k))
+        assert scores['weighted_npv'][k] == pytest.approx(nbutils.weighted_npv(true == k, pred == k))
+
+def test_multiclass_scores_binary_positive_class_matches_binary_metrics():
+    """The second class of a binary problem gives the usual binary scores"""
+    true, pred = get_sample_data(135,53,2,11)
+
+    scores = nbutils.multiclass_scores(true, pred)
+
+    assert scores['weighted_accuracy'][1] == pytest.approx(nbutils.weighted_accuracy(true, pred))
+
+def test_multiclass_scores_averages():
+    """Macro is the plain mean of the classes and weighted follows the class sizes"""
+    true = [0,0,0,0,1,1,2,2]
+    pred = [0,0,0,0,1,0,2,1]
+
+    per_class = nbutils.multiclass_scores(true, pred, metrics=['specificity'])['specificity']
+    macro = nbutils.multiclass_scores(true, pred, metrics=['specificity'], average='macro')['specificity']
+    weighted = nbutils.multiclass_scores(true, pred, metrics=['specificity'], average='weighted')['specificity']
+
+    assert macro == pytest.approx(per_class.mean())
+    assert weighted == pytest.approx(np.average(per_class, weights=[4, 2, 2]))
+
+def test_evaluate_models_matches_get_metrics():
+    """One row per model, in order, with the same scores as get_metrics"""
+    X, y = make_classification(random_state=0)
+    models = {'weak': LogisticRegression(C=1e-4).fit(X, y), 'strong': LogisticRegression().fit(X, y)}
+    scoring_list = {'accuracy':make_scorer(accuracy_score), 'specificity':make_scorer(nbutils.specificity)}
+
+    table = nbutils.evaluate_models(models, X, y, scoring_list, n_jobs=2)
+
+    assert list(table.index) == ['weak', 'strong']
+    assert list(table.columns) == ['accuracy', 'specificity']
+    assert table.loc['strong', 'specificity'] == nbutils.get_metrics(models['strong'], X, y, scoring_list)['specificity']
+
+def test_grid_search_optimization_shared_data_reports_worker_rss(capsys):
+    """ Workers read memory-mapped data and report their peak memory """
+    param_grid = {'classifier__C': [0.1, 1.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification()
+
+    result = nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=2, shared_data=True)
+
+    assert len(result.worker_peak_rss_) >= 1
+    assert all(rss > 0 for rss in result.worker_peak_rss_.values())
+    assert "Peak RSS per worker" in capsys.readouterr().out
+
+def test_grid_search_optimization_shared_data_result_scores_after_search(tmpdir):
+    """ The result scores without the removed RSS reports, and cached searches with shared data hit the cache """
+    param_grid = {'classifier__C': [0.1, 1.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification(random_state=0)
+
+    for _ in range(2):
+        result = nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, shared_data=True,
+                                                  cache=str(tmpdir))
+
+    assert result.score(X, y) == accuracy_score(y, result.predict(X))
+    assert len(tmpdir.listdir()) == 4
+
+def test_grid_search_optimization_path_no_errors():
+    """ Runs a warm-started path optimization with the same report without error """
+    param_grid = {'classifier__C': [0.1, 1.0, 10.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification()
+
+    nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True, search='path')
+
+def test_grid_search_optimization_path_cache_value_error(tmpdir):
+    X, y  = make_classification()
+
+    with pytest.raises(ValueError, match='path'):
+        nbutils.grid_search_optimization(Pipeline([('classifier', LogisticRegression())]), {'classifier__C': [0.1, 1.0]},
+                                         X, y, X, y, cv=2, n_jobs=1, search='path', cache=str(tmpdir))
+
+def test_grid_search_optimization_transformer_cache_no_errors():
+    """ Runs an imbalanced-learn pipeline with cached transformers, and the result doesn't keep the cache """
+    param_grid = {'classifier__C': [0.1, 1.0]}
+    clf = Pipeline([('scaler', StandardScaler()), ('sampler', RandomUnderSampler(random_state=0)),
+                    ('classifier', LogisticRegression())])
+    X, y  = make_classification(weights=[0.8])
+
+    result = nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True,
+                                              transformer_cache=True)
+
+    assert result.best_estimator_.memory is None
+
+def test_grid_search_optimization_transformer_cache_hits_search_cache(tmpdir):
+    """ The temporary transformer memo isn't part of the search cache keys, so a repeated search loads every score """
+    param_grid = {'classifier__C': [0.1, 1.0]}
+    clf = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())])
+    X, y  = make_classification(random_state=0)
+    cache_dir = tmpdir.mkdir('scores')
+
+    for _ in range(2):
+        nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, cache=str(cache_dir),
+                                         transformer_cache=True)
+
+    assert len(cache_dir.listdir()) == 4
+
+def test_cross_validate_metrics_matches_cross_validate():
+    """ Fold scores derived from the out-of-fold predictions match one sklearn scorer per metric """
+    from sklearn.model_selection import cross_validate
+    X, y = make_classification(random_state=0)
+    clf = LogisticRegression()
+
+    predictions = nbutils.cross_validate_metrics(clf, X, y, cv=3, n_jobs=2)
+    scores = predictions.fold_scores()
+    expected = cross_validate(clf, X, y, cv=3, scoring={'specificity': make_scorer(nbutils.specificity),
+                                                        'weighted_ppv': make_scorer(nbutils.weighted_ppv),
+                                                        'roc_auc': get_scorer('roc_auc')})
+
+    assert np.allclose(scores['specificity'], expected['test_specificity'])
+    assert np.allclose(scores['weighted_ppv'], expected['test_weighted_ppv'])
+    assert np.allclose(scores['roc_auc'], expected['test_roc_auc'])
+    assert predictions.pred_codes.dtype == np.uint8
+    assert predictions.scores.dtype == np.float32
+    fpr, tpr, _ = predictions.roc_curve()
+    assert fpr[0] == 0 and tpr[-1] == 1
+
+def test_cross_validate_metrics_predicts_once_per_fold(capsys):
+    X, y = make_classification(random_state=0)
+
+    with patch.object(LogisticRegression, 'predict', autospec=True, side_effect=LogisticRegression.predict) as predict:
+        nbutils.cross_validate_metrics(LogisticRegression(), X, y, cv=4, n_jobs=1)
+
+    assert predict.call_count == 4
+    assert "weighted_accuracy" in capsys.readouterr().out
+
+def test_cross_validate_metrics_multiclass_macro_averages():
+    X, y = make_classification(n_classes=3, n_informative=4, random_state=0)
+
+    predictions = nbutils.cross_validate_metrics(LogisticRegression(), X, y, metrics=['specificity'], cv=3, n_jobs=1)
+    cms = predictions.fold_confusion_matrices()
+
+    assert cms.shape == (3, 3, 3)
+    assert cms.sum() == len(y)
+    assert list(predictions.fold_scores()) == list(nbutils.ConfusionStats(cms[0]).averaged_scores())
+    assert np.allclose(predictions.fold_scores(['specificity'])['specificity'][0],
+                       nbutils.ConfusionStats(cms[0]).averaged_scores(['specificity'])['specificity'])
+    assert np.allclose(predictions.fold_scores(['accuracy'])['accuracy'],
+                       [np.trace(cm) / float(cm.sum()) for cm in cms])
+
+def test_plot_roc_output_writes_tables(tmpdir):
+    """ The probabilities and ROC points are returned and written in bulk """
+    X, y = make_classification(random_state=0)
+    model = LogisticRegression().fit(X, y)
+    path = os.path.join(str(tmpdir), 'roc.csv')
+
+    results = nbutils.plot_roc(model, X, y, show_plot=False, output=path)
+
+    probabilities = pd.read_csv(os.path.join(str(tmpdir), 'roc_probabilities.csv'))
+    roc = pd.read_csv(os.path.join(str(tmpdir), 'roc_roc.csv'))
+    assert list(probabilities.columns) == ['y_true', 'y_pred', 'y_score']
+    assert np.allclose(probabilities['y_score'], model.predict_proba(X)[:,1])
+    assert np.allclose(roc['tpr'], results['roc']['tpr'])
+
+def test_write_results_npz_keeps_tables(tmpdir):
+    path = os.path.join(str(tmpdir), 'results.npz')
+    results = {'roc': {'fpr': np.array([0.0, 1.0])}, 'scores': {'accuracy': np.array([0.5, 0.7, 0.9])}}
+
+    nbutils.write_results(results, path)
+
+    archive = np.load(path)
+    assert np.array_equal(archive['roc/fpr'], [0.0, 1.0])
+    assert np.array_equal(archive['scores/accuracy'], [0.5, 0.7, 0.9])
+
+def test_write_results_unknown_format_value_error(tmpdir):
+    with pytest.raises(ValueError):
+        nbutils.write_results({'a': [1]}, os.path.join(str(tmpdir), 'results.txt'))
+
+def test_print_score_summaries_returns_summary_table(tmpdir, capsys):
+    path = os.path.join(str(tmpdir), 'summary.csv')
+
+    summary = nbutils.print_score_summaries({'ppv': np.array([0.5, 1.0]), 'npv': np.array([1.0, np.nan])}, output=path)
+
+    assert list(summary['score']) == ['ppv', 'npv']
+    assert np.allclose(summary['mean'], [0.75, 1.0])
+    assert pd.read_csv(path)['score'].tolist() == ['ppv', 'npv']
+    assert capsys.readouterr().out == "ppv\t0.75\t0.25\nnpv\t1.0\t0.0\n"
+
+def test_grid_search_optimization_output_writes_grid_scores(tmpdir):
+    param_grid = {'classifier__C': [0.1, 1.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification()
+
+    nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, output=os.path.join(str(tmpdir), 'search.npz'))
+
+    archive = np.load(os.path.join(str(tmpdir), 'search.npz'))
+    assert len(archive['grid_scores/mean_test_score']) == 2
+    assert len(archive['training_probabilities/y_score']) == len(y)
+
+def test_top_coefficients_matches_full_sort():
+    coef = np.random.RandomState(0).randn(1, 1000)
+
+    indices, values = nbutils.top_coefficients(coef, top_features=5)
+
+    order = np.argsort(coef.ravel())
+    assert np.array_equal(indices, np.hstack([order[:5], order[-5:]]))
+    assert np.array_equal(values, coef.ravel()[indices])
+
+def test_top_coefficients_sparse_matches_dense():
+    """ Sparse coefficients rank the same as their dense form, implicit zeros included """
+    from scipy import sparse
+    dense = np.zeros(50)
+    dense[[3, 7, 20]] = [-2.0, 1.0, 3.0]
+
+    indices, values = nbutils.top_coefficients(sparse.csr_matrix(dense), top_features=3)
+
+    assert np.array_equal(values, [-2.0, 0.0, 0.0, 0.0, 1.0, 3.0])
+    assert indices[0] == 3 and list(indices[-2:]) == [7, 20]
+    assert np.all(dense[indices] == values)
+
+def test_per_class_top_coefficients_ranks_every_class():
+    X, y = make_classification(n_classes=3, n_informative=4, random_state=0)
+    model = LogisticRegression().fit(X, y)
+
+    rankings = nbutils.per_class_top_coefficients(model, top_features=2)
+
+    assert len(rankings) == 3
+    for class_index, (indices, values) in enumerate(rankings):
+        assert values[-1] == model.coef_[class_index].max()
+        assert values[0] == model.coef_[class_index].min()
+
+def test_top_coefficients_multiclass_without_class_index_value_error():
+    with pytest.raises(ValueError):
+        nbutils.top_coefficients(np.ones((3, 10)))
+
+def test_plot_coefficients_accepts_coefficients_and_feeds_print_feature_importance(capsys):
+    names = np.array(['f%d' % i for i in range(10)])
+    coef = np.arange(10) - 4.5
+
+    indices, values = nbutils.plot_coefficients(coef, names, top_features=2, show_plot=False)
+    nbutils.print_feature_importance(names[indices], values)
+
+    assert capsys.readouterr().out.splitlines() == ['f0\t-4.5', 'f1\t-3.5', 'f8\t3.5', 'f9\t4.5']
+
+def test_permutation_test_null_matches_shuffled_labels():
+    """ Hypergeometric null scores have the distribution of scores of shuffled predictions """
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 2, 500)
+    pred = np.where(rng.rand(500) < 0.7, y, 1 - y)
+    shuffled = [nbutils.specificity(y, rng.permutation(pred)) for _ in range(2000)]
+
+    null = nbutils._label_permutation_chunk(0, 20000, nbutils.get_confusion_matrix(y, pred), ['specificity'])['specificity']
+
+    assert np.mean(null) == pytest.approx(np.mean(shuffled), abs=0.002)
+    assert np.std(null) == pytest.approx(np.std(shuffled), rel=0.1)
+
+def test_permutation_test_good_predictions_significant():
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 2, 500)
+    good = np.where(rng.rand(500) < 0.8, y, 1 - y)
+
+    significant = nbutils.permutation_test(y, good, ['weighted_accuracy'], n_permutations=2000, random_state=0)
+    chance = nbutils.permutation_test(y, rng.randint(0, 2, 500), ['weighted_accuracy'], n_permutations=2000,
+                                      random_state=0)
+
+    assert significant['weighted_accuracy'] == (nbutils.weighted_accuracy(y, good), pytest.approx(1 / 2001.0))
+    assert chance['weighted_accuracy'][1] > 0.01
+
+def test_permutation_test_undefined_score_has_undefined_p_value():
+    """An undefined observed score (no negative predictions) is not reported as significant"""
+    y = np.array([0, 1] * 50)
+
+    result = nbutils.permutation_test(y, np.ones(100), ['negative_predictive_value', 'accuracy'], n_permutations=999,
+                                      random_state=0)
+
+    assert np.isnan(result['negative_predictive_value'][0])
+    assert np.isnan(result['negative_predictive_value'][1])
+    assert not np.isnan(result['accuracy'][1])
+
+def test_paired_permutation_test_null_matches_swapped_predictions():
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 2, 500)
+    a = np.where(rng.rand(500) < 0.8, y, 1 - y)
+    b = np.where(rng.rand(500) < 0.75, y, 1 - y)
+    swapped = []
+    for _ in range(2000):
+        swap = rng.rand(500) < 0.5
+        swapped.append(nbutils.weighted_ppv(y, np.where(swap, b, a)) - nbutils.weighted_ppv(y, np.where(swap, a, b)))
+
+    null = nbutils._paired_swap_chunk(0, 20000, nbutils._paired_counts(y, a, b), ['weighted_ppv'])['weighted_ppv']
+    result = nbutils.paired_permutation_test(y, a, b, ['weighted_ppv'], n_permutations=1000, random_state=0)
+
+    assert np.mean(null) == pytest.approx(0, abs=0.002)
+    assert np.std(null) == pytest.approx(np.std(swapped), rel=0.1)
+    assert result['weighted_ppv'][0] == pytest.approx(nbutils.weighted_ppv(y, a) - nbutils.weighted_ppv(y, b))
+
+def test_permutation_tests_deterministic_across_jobs():
+    rng = np.random.RandomState(0)
+    y, a, b = rng.randint(0, 2, (3, 300))
+
+    serial = nbutils.paired_permutation_test(y, a, b, n_permutations=1000, random_state=7, chunk_size=250)
+    parallel = nbutils.paired_permutation_test(y, a, b, n_permutations=1000, random_state=7, chunk_size=250, n_jobs=2)
+
+    assert serial == parallel
+
+def test_paired_permutation_test_multiclass_value_error():
+    with pytest.raises(ValueError):
+        nbutils.paired_permutation_test([0, 1, 2], [0, 1, 1], [0, 2, 2])
+
+def test_permutation_importance_matches_manual_permutations():
+    """ Batched in-place permutations score like permuting a copy of X per feature """
+    X, y = make_classification(n_samples=200, n_features=4, n_informative=2, n_redundant=0, random_state=0)
+    model = LogisticRegression().fit(X, y)
+    scorer = make_scorer(nbutils.weighted_accuracy)
+
+    result = nbutils.permutation_importance(model, X, y, scoring=scorer, n_repeats=3, n_jobs=1, batch_size=5,
+                                            random_state=0)
+
+    seeds = np.random.RandomState(0).randint(np.iinfo(np.int32).max, size=4)
+    for feature in range(4):
+        rng = np.random.RandomState(seeds[feature])
+        for repeat in range(3):
+            X_permuted = X.copy()
+            X_permuted[:, feature] = X[rng.permutation(len(y)), feature]
+            expected = scorer(model, X, y) - scorer(model, X_permuted, y)
+            assert result['importances'][feature, repeat] == pytest.approx(expected)
+
+def test_permutation_importance_deterministic_across_jobs_and_batches():
+    X, y = make_classification(n_samples=200, n_features=6, random_state=0)
+    model = LogisticRegression().fit(X, y)
+
+    serial = nbutils.permutation_importance(model, X, y, scoring='roc_auc', n_repeats=2, n_jobs=1, random_state=3)
+    parallel = nbutils.permutation_importance(model, X, y, scoring='roc_auc', n_repeats=2, n_jobs=2, batch_size=3,
+                                              random_state=3)
+
+    assert np.allclose(serial['importances'], parallel['importances'])
+
+def test_permutation_importance_default_buffer_fits_cell_budget():
+    """ The default number of stacked copies is bounded by cells, so wide data gets fewer copies """
+    X, y = make_classification(n_samples=100, n_features=20, random_state=0)
+    model = LogisticRegression().fit(X, y)
+    stacked = []
+
+    def stack_copies(X, n_copies):
+        stacked.append(n_copies)
+        return np.tile(X, (n_copies, 1))
+
+    with patch.object(nbutils, '_PERMUTATION_BUFFER_CELLS', 100 * 20 * 3), patch.object(nbutils, '_stack_copies', stack_copies):
+        nbutils.permutation_importance(model, X, y, n_repeats=2, n_jobs=1, random_state=0)
+
+    assert stacked == [3]
+
+def test_permutation_importance_dataframe_pipeline_feeds_print_feature_importance(capsys):
+    X, y = make_classification(n_samples=200, n_features=3, n_informative=2, n_redundant=0, random_state=0)
+    X = pd.DataFrame(X, columns=['a', 'b', 'c'])
+    model = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())]).fit(X, y)
+
+    result = nbutils.permutation_importance(model, X, y, n_repeats=2, n_jobs=1, random_state=0)
+    nbutils.print_feature_importance(list(X.columns), result['importances_mean'])
+
+    assert result['importances'].shape == (3, 2)
+    assert capsys.readouterr().out.startswith("a\t")
@@ -0,0 +1,34 @@
+"""Tests for `parallel` module."""
+import os
+
+import numpy as np
+import pandas as pd
+
+from mlexp import parallel
+
+def test_shared_arrays_memory_mapped_and_removed():
+    """Arrays are mapped read-only while in use and the files are removed afterwards"""
+    X = np.arange(12.0).reshape(4, 3)
+
+    with parallel.shared_arrays(X, [0, 1, 0, 1]) as (X_shared, y_shared):
+        assert isinstance(X_shared, np.memmap)
+        assert not X_shared.flags.writeable
+        assert np.array_equal(X_shared, X)
+        assert list(y_shared) == [0, 1, 0, 1]
+        folder = os.path.dirname(X_shared.filename)
+
+    assert not os.path.exists(folder)
+
+def test_memmap_array_keeps_data_frames(tmpdir):
+    """DataFrames are passed through so column names are kept"""
+    data = pd.DataFrame({'a': [1, 2]})
+
+    assert parallel.memmap_array(data, str(tmpdir.join('data.npy'))) is data
+
+def test_peak_rss_scorer_records_process_peak(tmpdir):
+    """The wrapped scorer's score is returned and the process peak is written"""
+    scorer = parallel.PeakRSSScorer(lambda estimator, X, y: 0.5, str(tmpdir))
+
+    assert scorer(None, None, None) == 0.5
+    peaks = parallel.read_peak_rss(str(tmpdir))
+    assert peaks[os.getpid()] == parallel.peak_rss()
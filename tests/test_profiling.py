@@ -0,0 +1,102 @@
+"""Tests for `profiling` module."""
+import time
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import make_scorer, accuracy_score
+from imblearn.pipeline import Pipeline
+
+from mlexp import nbutils, profiling, search
+
+def test_phase_without_profiler_records_nothing():
+    with profiling.phase('plot', 'roc'):
+        pass
+
+    assert profiling.active_profiler() is None
+
+def test_profiler_phase_measures_time_and_calls_hooks():
+    events = []
+
+    with profiling.profile(hooks=[events.append]) as profiler:
+        with profiling.phase('fit', 'sleep'):
+            time.sleep(0.05)
+
+    assert profiler.events == events
+    assert events[0].phase == 'fit'
+    assert events[0].wall_time >= 0.05
+    assert events[0].cpu_time < events[0].wall_time
+    assert events[0].peak_memory > 0
+    assert profiling.active_profiler() is None
+
+def test_profiler_trace_memory_measures_phase_allocations():
+    with profiling.profile(trace_memory=True) as profiler:
+        with profiling.phase('predict', 'allocate'):
+            buffer = np.ones(10**6)
+        del buffer
+
+    assert profiler.events[0].peak_memory >= 8 * 10**6
+
+def test_profiler_trace_memory_nested_phase_keeps_enclosing_peak():
+    """ A nested phase resets the traced peak, but the enclosing phase still reports its earlier peak """
+    with profiling.profile(trace_memory=True) as profiler:
+        with profiling.phase('score', 'outer'):
+            buffer = np.ones(10**6)
+            del buffer
+            with profiling.phase('predict', 'inner'):
+                small = np.ones(10)
+            with profiling.phase('predict', 'inner'):
+                small = np.ones(10)
+        del small
+
+    inner, _, outer = profiler.events
+    assert outer.name == 'outer'
+    assert outer.peak_memory >= 8 * 10**6
+    assert inner.peak_memory < 10**6
+
+def test_profiler_summary_sorts_hottest_phases_first(capsys):
+    profiler = profiling.Profiler()
+    profiler.record('score', 'accuracy', 1.0, cpu_time=1.0, peak_memory=2**20)
+    profiler.record('fit', 'C=1', 3.0)
+    profiler.record('score', 'accuracy', 2.0, cpu_time=2.0, peak_memory=2**21)
+
+    summary = profiler.summary()
+    profiler.print_summary()
+
+    assert summary['phase'] == ['score', 'fit']
+    assert summary['count'] == [2, 1]
+    assert summary['wall_time'] == [3.0, 3.0]
+    assert summary['peak_memory'][0] == 2**21
+    assert "score\taccuracy\t2\t3.0000" in capsys.readouterr().out
+
+def test_instrumented_evaluation_records_every_phase():
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+
+    with profiling.profile() as profiler:
+        model = nbutils.grid_search_optimization(clf, {'classifier__C': [0.1, 1.0]}, X, y, X, y, cv=2, n_jobs=1)
+        nbutils.get_metrics(model, X, y, {'accuracy': make_scorer(accuracy_score)})
+        nbutils.plot_roc(model, X, y, show_plot=True)
+
+    phases = set((event.phase, event.name) for event in profiler.events)
+    assert ('search', 'exhaustive') in phases
+    assert ('refit', repr(model.best_params_)) in phases
+    assert ('score', 'accuracy') in phases
+    assert ('predict', 'predict_proba') in phases
+    assert ('plot', 'roc') in phases
+    assert len([event for event in profiler.events if event.phase == 'fit']) == 2
+
+def test_record_search_halving_counts_every_fold_and_refit():
+    """ Halving rows report a mean fit time over their own number of folds, and the refit is recorded """
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+    result = search.successive_halving_search(clf, {'classifier__C': [0.1, 1.0, 10.0]}, X, y, cv=3, n_jobs=1)
+
+    with profiling.profile() as profiler:
+        profiling.record_search(result)
+
+    fits = [event.wall_time for event in profiler.events if event.phase == 'fit']
+    cv_results = result.cv_results_
+    assert sum(fits) == pytest.approx(np.sum(cv_results['mean_fit_time'] * cv_results['n_folds']))
+    assert ('refit', repr(result.best_params_)) in [(event.phase, event.name) for event in profiler.events]
@@ -0,0 +1,53 @@
+"""Tests for `render` module."""
+import os
+import threading
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from mlexp import nbutils, render
+
+def test_figure_functions_do_not_touch_pyplot():
+    """ Figures are drawn on their own canvas, without creating pyplot figures """
+    plt = nbutils._pyplot()
+    plt.close('all')
+
+    figure = render.figure_confusion_matrix(np.array([[10, 1], [3, 17]]), [0, 1])
+
+    assert isinstance(figure.canvas, FigureCanvasAgg)
+    assert plt.get_fignums() == []
+
+def test_draw_confusion_matrix_thins_annotations_of_large_matrices():
+    cm = np.arange(100 * 100).reshape(100, 100)
+
+    small = render.figure_confusion_matrix(cm[:10, :10], list(range(10)))
+    large = render.figure_confusion_matrix(cm, list(range(100)))
+
+    assert len(small.axes[0].texts) == 100
+    assert len(large.axes[0].texts) == 100
+    assert len(large.axes[0].get_xticks()) == 50
+    assert len(render.figure_confusion_matrix(np.eye(500), list(range(500))).axes[0].texts) == 0
+
+def test_render_figures_writes_png_and_svg_in_background_threads(tmpdir):
+    threads = set()
+
+    def figure_roc(fpr, tpr):
+        threads.add(threading.current_thread().name)
+        return render.figure_roc(fpr, tpr)
+
+    paths = [os.path.join(str(tmpdir), 'roc%d.%s' % (i, 'svg' if i % 2 else 'png')) for i in range(8)]
+    written = render.render_figures([(path, figure_roc, ([0, 0.5, 1], [0, 0.8, 1]), {}) for path in paths], n_workers=4)
+
+    assert written == paths
+    assert all(os.path.getsize(path) > 0 for path in paths)
+    assert threading.main_thread().name not in threads
+    with open(paths[1]) as svg:
+        assert '<svg' in svg.read()
+
+def test_plot_functions_render_to_figure_path(tmpdir):
+    paths = [os.path.join(str(tmpdir), name) for name in ('cm.png', 'coef.svg')]
+
+    nbutils.plot_confusion_matrix(np.array([[10, 1], [3, 17]]), show_plot=False, figure_path=paths[0])
+    nbutils.plot_coefficients(np.array([-1.0, 2.0, 0.5]), ['a', 'b', 'c'], 1, show_plot=False, figure_path=paths[1])
+
+    assert all(os.path.getsize(path) > 0 for path in paths)
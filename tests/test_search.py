@@ -0,0 +1,195 @@
+"""Tests for `search` module."""
+import os
+
+import pytest
+from mock import patch
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.dummy import DummyClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV
+from imblearn.pipeline import Pipeline
+
+from mlexp import search
+
+def test_successive_halving_search_finds_good_candidate():
+    """The heavily regularized candidates are eliminated"""
+    X, y = make_classification(n_samples=600, random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+    param_grid = {'classifier__C': [1e-6, 1e-5, 1e-4, 1.0, 10.0]}
+
+    result = search.successive_halving_search(clf, param_grid, X, y, cv=3, n_jobs=1, random_state=0)
+
+    assert result.best_params_['classifier__C'] >= 1.0
+    assert result.predict(X).shape == y.shape
+    assert len(result.cv_results_['params']) == len(result.cv_results_['mean_test_score'])
+
+def test_successive_halving_search_later_rounds_use_more_samples():
+    """Survivors are evaluated on more samples than in the first round"""
+    X, y = make_classification(n_samples=900, random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+    param_grid = {'classifier__C': np.logspace(-3, 2, 9)}
+
+    result = search.successive_halving_search(clf, param_grid, X, y, cv=3, n_jobs=1, prune_margin=None)
+
+    n_resources = result.cv_results_['n_resources']
+    assert n_resources.max() == 900
+    assert (result.cv_results_['iter'] == 0).sum() == 9
+    assert (n_resources == 900).sum() < 9
+
+def test_successive_halving_search_iterations_resource():
+    """A parameter can be the resource, and the refit uses its maximum"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+    param_grid = {'classifier__C': [0.1, 1.0, 10.0]}
+
+    result = search.successive_halving_search(clf, param_grid, X, y, cv=2, n_jobs=1,
+                                              resource='classifier__max_iter', max_resources=90)
+
+    assert result.best_params_['classifier__max_iter'] == 90
+
+def test_successive_halving_search_time_budget_stops_early():
+    """With no time left the search stops after the first batch of fits"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+    param_grid = {'classifier__C': [0.1, 1.0, 10.0]}
+
+    result = search.successive_halving_search(clf, param_grid, X, y, cv=3, n_jobs=1, time_budget=0)
+
+    assert (result.cv_results_['n_folds'] == 1).all()
+
+def test_successive_halving_search_parameter_resource_needs_max_value_error():
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y = make_classification(random_state=0)
+
+    with pytest.raises(ValueError):
+        search.successive_halving_search(clf, {}, X, y, resource='classifier__max_iter')
+
+def test_cached_grid_search_matches_grid_search_cv(tmpdir):
+    """Same scores as GridSearchCV"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+    param_grid = {'classifier__C': [0.01, 1.0]}
+
+    result = search.cached_grid_search(clf, param_grid, X, y, str(tmpdir), cv=3, n_jobs=1)
+    expected = GridSearchCV(clf, param_grid, cv=3).fit(X, y)
+
+    assert np.allclose(result.cv_results_['mean_test_score'], expected.cv_results_['mean_test_score'])
+    assert result.best_params_ == expected.best_params_
+
+def test_cached_grid_search_only_fits_new_candidates(tmpdir, capsys):
+    """Extending the grid loads the pairs evaluated before"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+
+    search.cached_grid_search(clf, {'classifier__C': [0.01, 1.0]}, X, y, str(tmpdir), cv=3, n_jobs=1)
+    search.cached_grid_search(clf, {'classifier__C': [0.01, 1.0, 10.0]}, X, y, str(tmpdir), cv=3, n_jobs=1, verbose=True)
+
+    assert "6 of 9 fits were loaded from the cache" in capsys.readouterr().out
+
+def test_cached_grid_search_different_data_not_loaded(tmpdir, capsys):
+    """Cached scores are only reused for the same data"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('classifier', LogisticRegression())])
+
+    search.cached_grid_search(clf, {'classifier__C': [1.0]}, X, y, str(tmpdir), cv=3, n_jobs=1)
+    search.cached_grid_search(clf, {'classifier__C': [1.0]}, X * 2, y, str(tmpdir), cv=3, n_jobs=1, verbose=True)
+
+    assert "0 of 3 fits were loaded from the cache" in capsys.readouterr().out
+
+def test_search_cache_evicts_least_recently_used(tmpdir):
+    """The store is kept under its size limit, dropping the oldest entries"""
+    cache = search.SearchCache(str(tmpdir), max_bytes=100)
+    for i in range(10):
+        cache.put('key%d' % i, {'score': 0.5, 'fit_time': 1.0})
+        os.utime(os.path.join(str(tmpdir), 'key%d.json' % i), (i, i))
+
+    cache.evict()
+
+    assert cache.size() <= 100
+    assert cache.get('key9') is not None
+    assert cache.get('key0') is None
+
+def test_regularization_path_search_matches_grid_search_cv():
+    """Warm-started path scores match cold fits and candidates keep the grid order"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression(tol=1e-8, max_iter=1000))])
+    param_grid = {'classifier__C': [10.0, 0.01, 1.0], 'scaler__with_mean': [True, False]}
+
+    result = search.regularization_path_search(clf, param_grid, X, y, cv=3, n_jobs=1)
+    expected = GridSearchCV(clf, param_grid, cv=3).fit(X, y)
+
+    assert result.cv_results_['params'] == expected.cv_results_['params']
+    assert np.allclose(result.cv_results_['mean_test_score'], expected.cv_results_['mean_test_score'])
+    assert result.best_params_ == expected.best_params_
+    assert result.best_estimator_.named_steps['classifier'].warm_start is False
+
+def test_regularization_path_search_fits_transformers_once_per_fold():
+    """Transformers are not refit along the path"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())])
+
+    with patch.object(StandardScaler, 'fit_transform', autospec=True, side_effect=StandardScaler.fit_transform) as fit_transform:
+        search.regularization_path_search(clf, {'classifier__C': [0.01, 0.1, 1.0, 10.0]}, X, y, cv=3, n_jobs=1)
+
+    # once per fold, plus once for the refit of the best candidate
+    assert fit_transform.call_count == 4
+
+def test_regularization_path_search_without_warm_start_value_error():
+    clf = Pipeline([('classifier', DummyClassifier())])
+
+    with pytest.raises(ValueError):
+        search.regularization_path_search(clf, {'classifier__strategy': ['prior']}, [[0]], [0])
+
+def test_cached_transformers_fits_transformers_once_per_fold():
+    """Candidates that only change the classifier reuse the fitted transformers of each fold"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())])
+    param_grid = {'classifier__C': [0.01, 0.1, 1.0]}
+
+    with patch.object(StandardScaler, 'fit_transform', autospec=True, side_effect=StandardScaler.fit_transform) as fit_transform:
+        with search.cached_transformers(clf) as cached_clf:
+            result = GridSearchCV(cached_clf, param_grid, cv=3, n_jobs=1).fit(X, y)
+
+    expected = GridSearchCV(clf, param_grid, cv=3, n_jobs=1).fit(X, y)
+    # once per fold, plus once for the refit of the best candidate
+    assert fit_transform.call_count == 4
+    assert np.allclose(result.cv_results_['mean_test_score'], expected.cv_results_['mean_test_score'])
+
+def test_cached_transformers_trims_kept_cache(tmpdir):
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())])
+
+    with search.cached_transformers(clf, str(tmpdir), bytes_limit=1) as cached_clf:
+        GridSearchCV(cached_clf, {'classifier__C': [0.1, 1.0]}, cv=3, n_jobs=1).fit(X, y)
+
+    sizes = [os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(str(tmpdir)) for name in names
+             if name == 'output.pkl']
+    assert sum(sizes) <= 1
+
+def test_cached_transformers_bounds_temporary_cache_during_search():
+    """The memo is trimmed after every memoized fit, not only on exit, including for a temporary location"""
+    X, y = make_classification(random_state=0)
+    clf = Pipeline([('scaler', StandardScaler()), ('classifier', LogisticRegression())])
+    reduce_memory_size = search._reduce_memory_size
+    sizes = []
+
+    def recording_reduce_memory_size(memory, bytes_limit):
+        reduce_memory_size(memory, bytes_limit)
+        sizes.append(sum(os.path.getsize(os.path.join(root, name))
+                         for root, _, names in os.walk(memory.location) for name in names if name == 'output.pkl'))
+
+    with patch.object(search, '_reduce_memory_size', recording_reduce_memory_size):
+        with search.cached_transformers(clf, bytes_limit=1) as cached_clf:
+            result = GridSearchCV(cached_clf, {'classifier__C': [0.1, 1.0]}, cv=3, n_jobs=1).fit(X, y)
+
+    assert len(sizes) >= 6
+    assert max(sizes) <= 1
+    assert result.best_estimator_.predict(X).shape == y.shape
+
+def test_cached_transformers_without_memory_value_error():
+    with pytest.raises(ValueError):
+        with search.cached_transformers(LogisticRegression()):
+            pass
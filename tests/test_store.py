@@ -0,0 +1,79 @@
+"""Tests for `store` module."""
+import os
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+from imblearn.pipeline import Pipeline
+
+from mlexp import nbutils
+from mlexp.store import ExperimentStore
+
+def test_log_run_round_trips():
+    store = ExperimentStore(':memory:', dataset='holdout')
+
+    run_id = store.log_run(params={'classifier__C': 0.1, 'penalty': 'l2', 'class_weight': None},
+                           metrics={'specificity': 0.75, 'npv': np.nan}, fold_scores={'specificity': [0.5, 1.0]},
+                           timings={'fit': 1.5}, artifacts={'roc': 'roc.png'})
+    run = store.run(run_id)
+
+    assert run['params'] == {'classifier__C': 0.1, 'penalty': 'l2', 'class_weight': None}
+    assert run['metrics'] == {'specificity': 0.75, 'npv': None}
+    assert run['fold_scores'] == {'specificity': [0.5, 1.0]}
+    assert run['timings'] == {'fit': 1.5}
+    assert run['artifacts'] == {'roc': 'roc.png'}
+    assert run['dataset'] == 'holdout'
+
+def test_top_runs_ranks_by_metric_within_dataset():
+    store = ExperimentStore(':memory:')
+    store.log_runs([{'dataset': 'a', 'params': {'C': C}, 'metrics': {'weighted_sensitivity': C / 10.0}}
+                    for C in range(10)])
+    store.log_runs([{'dataset': 'b', 'params': {'C': 99}, 'metrics': {'weighted_sensitivity': 1.0}}])
+
+    top = store.top_runs('weighted_sensitivity', dataset='a', n=3)
+
+    assert [run['params']['C'] for run in top] == [9, 8, 7]
+    assert top[0]['weighted_sensitivity'] == 0.9
+    assert store.top_runs('weighted_sensitivity', n=1)[0]['params'] == {'C': 99}
+    assert store.top_runs('weighted_sensitivity', dataset='a', n=1, ascending=True)[0]['params'] == {'C': 0}
+    assert len(store.runs_with_params(C=3)) == 1
+
+def test_top_runs_uses_index_over_many_runs(tmpdir):
+    """ Ranking within a dataset reads the (dataset, name, value) index instead of sorting the metrics """
+    rng = np.random.RandomState(0)
+    store = ExperimentStore(os.path.join(str(tmpdir), 'runs.db'))
+    store.log_runs({'dataset': 'd%d' % (i % 10), 'params': {'C': float(i)},
+                    'metrics': {'weighted_sensitivity': rng.rand(), 'specificity': rng.rand()}}
+                   for i in range(100000))
+
+    top = store.top_runs('weighted_sensitivity', dataset='d3', n=20)
+    plan = store.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT run_id, value FROM metrics WHERE dataset = ? AND name = ? AND value IS NOT NULL "
+        "ORDER BY value DESC LIMIT ?", ('d3', 'weighted_sensitivity', 20)).fetchall()
+    details = ' '.join(row[-1] for row in plan)
+
+    assert len(top) == 20
+    assert top[0]['weighted_sensitivity'] >= top[-1]['weighted_sensitivity']
+    assert 'metrics_by_dataset_value' in details
+    assert 'TEMP B-TREE' not in details
+
+def test_grid_search_optimization_logs_candidates_and_holdout(tmpdir):
+    path = os.path.join(str(tmpdir), 'runs.db')
+    param_grid = {'classifier__C': [0.1, 1.0, 10.0]}
+    clf = Pipeline([('classifier', LogisticRegression())])
+    X, y  = make_classification(random_state=0)
+
+    result = nbutils.grid_search_optimization(clf, param_grid, X, y, X, y, cv=2, n_jobs=1, verbose=True, store=path)
+    nbutils.print_score_summaries({'specificity': np.array([0.5, 1.0])}, store=path)
+
+    with ExperimentStore(path) as store:
+        best = store.top_runs('cv_accuracy', n=1)[0]
+        holdout = store.top_runs('accuracy', n=1)[0]
+        candidates = store.connection.execute("SELECT COUNT(*) FROM fold_scores WHERE name = 'accuracy'").fetchone()[0]
+        summary = store.top_runs('specificity', n=1)[0]
+
+    assert best['cv_accuracy'] == result.best_score_
+    assert best['params'] == result.best_params_
+    assert candidates == 3 * 2
+    assert holdout['params']['classifier__C'] == result.best_params_['classifier__C']
+    assert summary['specificity'] == 0.75